@@ -0,0 +1,30 @@
+"""add_content_hash_to_requirement_files
+
+Revision ID: 3c1d7e9a2b4f
+Revises: faf9a428a751
+Create Date: 2026-10-18 10:12:41.208317
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c1d7e9a2b4f'
+down_revision: Union[str, None] = 'faf9a428a751'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('requirement_files', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content_hash', sa.String(length=64), nullable=True))
+        batch_op.create_index(batch_op.f('ix_requirement_files_content_hash'), ['content_hash'], unique=False)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('requirement_files', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_requirement_files_content_hash'))
+        batch_op.drop_column('content_hash')
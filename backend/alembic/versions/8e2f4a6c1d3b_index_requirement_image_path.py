@@ -0,0 +1,25 @@
+"""index_requirement_image_path
+
+Revision ID: 8e2f4a6c1d3b
+Revises: 3c1d7e9a2b4f
+Create Date: 2026-10-18 11:03:27.551904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e2f4a6c1d3b'
+down_revision: Union[str, None] = '3c1d7e9a2b4f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(op.f('ix_requirement_images_image_path'), 'requirement_images', ['image_path'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_requirement_images_image_path'), table_name='requirement_images')
@@ -1,17 +1,23 @@
 """
 AI智能体相关API路由
 """
+import logging
 from typing import Any, List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, Query, status, BackgroundTasks
 from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
 from app.database import get_db
 from app.core.dependencies import get_current_active_user
+from app.core.logger import log_context
+from app.core.tracing import build_waterfall, load_trace, run_traced
 from app.models.user import User
 from app.services.agent_service_real import agent_service_real as agent_service
 from app.schemas.user import User as UserSchema
 
+logger = logging.getLogger(__name__)
+
 
 router = APIRouter()
 
@@ -142,6 +148,7 @@ class AsyncTaskStatusResponse(BaseModel):
     total_batches: int
     completed_batches: int
     result: Optional[dict] = None
+    result_spilled: bool = False  # 结果是否已写入文件（include_result=false 时 result 为摘要）
     error: Optional[str] = None
     message: Optional[str] = None  # 进度消息
 
@@ -248,8 +255,9 @@ async def generate_test_points_async(
         except Exception as e:
             task_manager.fail_task(task_id, str(e))
     
-    # 启动后台任务
-    asyncio_task = asyncio.create_task(run_task())
+    # 启动后台任务（任务创建时复制当前上下文，后台日志自动带上 task_id）
+    with log_context(task_id=task_id):
+        asyncio_task = asyncio.create_task(run_traced(task_id, "test_point_generation", run_task()))
     task_manager.register_running_task(task_id, asyncio_task)
     
     return AsyncTaskResponse(
@@ -262,6 +270,7 @@ async def generate_test_points_async(
 @router.get("/tasks/{task_id}/status", response_model=AsyncTaskStatusResponse)
 async def get_task_status(
     task_id: str,
+    include_result: bool = Query(True, description="是否返回完整结果，为 false 时较大的结果只返回摘要"),
     current_user: UserSchema = Depends(get_current_active_user)
 ) -> Any:
     """获取异步任务状态"""
@@ -284,9 +293,76 @@ async def get_task_status(
         )
     
     # print(f"[查询任务状态] ✅ 找到任务: {task_status}")
+    if include_result and task_status["result_spilled"]:
+        task_status["result"] = await run_in_threadpool(task_manager.get_task_result, task_id)
     return AsyncTaskStatusResponse(**task_status)
 
 
+@router.get("/tasks/{task_id}/result")
+async def get_task_result(
+    task_id: str,
+    offset: int = Query(0, ge=0, description="列表字段的起始位置"),
+    limit: int = Query(100, ge=1, le=1000, description="列表字段每页条数"),
+    field: Optional[str] = Query(None, description="只返回指定的列表字段"),
+    current_user: UserSchema = Depends(get_current_active_user)
+) -> Any:
+    """分页获取异步任务结果
+
+    结果中的列表字段（如 test_points、test_cases）按 offset / limit 截取，totals 为各列表字段的总数
+    """
+    from app.services.async_task_manager import task_manager
+
+    task = task_manager.get_task(task_id)
+    if not task:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"任务不存在: {task_id}"
+        )
+    result = await run_in_threadpool(task_manager.get_task_result, task_id)
+    if not isinstance(result, dict):
+        return {"task_id": task_id, "status": task.status.value, "result": result, "totals": {}}
+
+    if field is not None:
+        if not isinstance(result.get(field), list):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"结果中没有列表字段: {field}"
+            )
+        result = {field: result[field]}
+    totals = {key: len(value) for key, value in result.items() if isinstance(value, list)}
+    page = {
+        key: value[offset:offset + limit] if isinstance(value, list) else value
+        for key, value in result.items()
+    }
+    return {
+        "task_id": task_id,
+        "status": task.status.value,
+        "offset": offset,
+        "limit": limit,
+        "totals": totals,
+        "result": page
+    }
+
+
+@router.get("/tasks/{task_id}/trace")
+async def get_task_trace(
+    task_id: str,
+    current_user: UserSchema = Depends(get_current_active_user)
+) -> Any:
+    """获取异步任务的链路追踪
+
+    返回按时间排列的瀑布图、决定总耗时的关键路径，以及按 span 名称的耗时汇总；
+    任务运行中返回当前快照
+    """
+    data = await run_in_threadpool(load_trace, task_id)
+    if data is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"任务追踪不存在: {task_id}"
+        )
+    return build_waterfall(data)
+
+
 class CancelTaskResponse(BaseModel):
     """取消任务响应"""
     success: bool
@@ -390,16 +466,14 @@ async def design_test_cases_async(
     
     # 后台执行任务
     async def run_task():
-        from app.database import SessionLocal
+        from app.database import SessionLocal, db_write_queue
         task_db = SessionLocal()
         total_saved = 0
         saved_test_cases = []  # 保存生成的测试用例，用于后续优化
         
-        # 定义批次保存回调函数
-        def save_batch(test_cases_data: list) -> int:
-            """保存一批测试用例到数据库，返回成功保存的数量"""
-            nonlocal total_saved, saved_test_cases
-            saved_count = 0
+        def insert_batch(write_db: Session, test_cases_data: list) -> list:
+            """在写入队列中插入一批测试用例，返回已保存用例的字典数据"""
+            saved = []
             for tc_data in test_cases_data:
                 try:
                     # 从agent_service继承的属性
@@ -423,9 +497,9 @@ async def design_test_cases_async(
                         edited_by_user=False,
                         created_by=user_id
                     )
-                    task_db.add(test_case)
-                    task_db.flush()  # 获取ID
-                    saved_test_cases.append({
+                    write_db.add(test_case)
+                    write_db.flush()  # 获取ID
+                    saved.append({
                         "id": test_case.id,
                         "title": test_case.title,
                         "description": test_case.description,
@@ -433,27 +507,33 @@ async def design_test_cases_async(
                         "test_steps": test_case.test_steps,
                         "expected_result": test_case.expected_result
                     })
-                    saved_count += 1
                 except Exception as e:
-                    print(f"⚠️ 创建测试用例对象失败: {e}")
+                    logger.warning(f"⚠️ 创建测试用例对象失败: {e}")
                     continue
-            
+            return saved
+        
+        # 定义批次保存回调函数（经由写入队列串行提交）
+        async def save_batch(test_cases_data: list) -> int:
+            """保存一批测试用例到数据库，返回成功保存的数量"""
+            nonlocal total_saved
             try:
-                task_db.commit()
-                total_saved += saved_count
-                return saved_count
+                saved = await db_write_queue.run(insert_batch, test_cases_data)
             except Exception as e:
-                print(f"⚠️ 批次提交失败: {e}")
-                task_db.rollback()
+                logger.warning(f"⚠️ 批次提交失败: {e}")
                 return 0
+            saved_test_cases.extend(saved)
+            total_saved += len(saved)
+            return len(saved)
+        
+        def clear_module_cases(write_db: Session) -> int:
+            return write_db.query(TestCase).filter(TestCase.module_id == module_id).delete()
         
         try:
             service = AgentServiceReal(db=task_db)
             
             # 如果需要清空现有用例
             if clear_existing:
-                task_db.query(TestCase).filter(TestCase.module_id == module_id).delete()
-                task_db.commit()
+                await db_write_queue.run(clear_module_cases)
             
             # 阶段1：批量生成测试用例（占50%进度）
             result = await service.execute_test_case_design_batch(
@@ -473,7 +553,7 @@ async def design_test_cases_async(
             
             # 阶段2：自动优化生成的测试用例（占50%进度）
             if saved_test_cases and optimize_agent_id:
-                print(f"🔄 开始自动优化 {len(saved_test_cases)} 个测试用例...")
+                logger.info(f"🔄 开始自动优化 {len(saved_test_cases)} 个测试用例...")
                 
                 # 更新进度提示
                 task_manager.update_progress(task_id, 50, "正在优化测试用例...")
@@ -495,25 +575,29 @@ async def design_test_cases_async(
                 optimized_count = 0
                 if optimize_result.get("success") and optimize_result.get("data"):
                     optimized_results = optimize_result["data"].get("optimized_results", [])
-                    for opt_result in optimized_results:
-                        if opt_result.get("success") and opt_result.get("optimized"):
-                            original_id = opt_result.get("original", {}).get("id")
-                            if original_id:
-                                try:
-                                    optimized = opt_result["optimized"]
-                                    tc = task_db.query(TestCase).filter(TestCase.id == original_id).first()
-                                    if tc:
-                                        tc.title = optimized.get("title", tc.title)
-                                        tc.description = optimized.get("description", tc.description)
-                                        tc.preconditions = optimized.get("preconditions", tc.preconditions)
-                                        tc.test_steps = optimized.get("test_steps", tc.test_steps)
-                                        tc.expected_result = optimized.get("expected_result", tc.expected_result)
-                                        optimized_count += 1
-                                except Exception as e:
-                                    print(f"⚠️ 更新优化结果失败: {e}")
                     
-                    task_db.commit()
-                    print(f"✅ 成功优化 {optimized_count} 个测试用例")
+                    def apply_optimized(write_db: Session) -> int:
+                        applied = 0
+                        for opt_result in optimized_results:
+                            if opt_result.get("success") and opt_result.get("optimized"):
+                                original_id = opt_result.get("original", {}).get("id")
+                                if original_id:
+                                    try:
+                                        optimized = opt_result["optimized"]
+                                        tc = write_db.query(TestCase).filter(TestCase.id == original_id).first()
+                                        if tc:
+                                            tc.title = optimized.get("title", tc.title)
+                                            tc.description = optimized.get("description", tc.description)
+                                            tc.preconditions = optimized.get("preconditions", tc.preconditions)
+                                            tc.test_steps = optimized.get("test_steps", tc.test_steps)
+                                            tc.expected_result = optimized.get("expected_result", tc.expected_result)
+                                            applied += 1
+                                    except Exception as e:
+                                        logger.warning(f"⚠️ 更新优化结果失败: {e}")
+                        return applied
+                    
+                    optimized_count = await db_write_queue.run(apply_optimized)
+                    logger.info(f"✅ 成功优化 {optimized_count} 个测试用例")
             
             task_manager.complete_task(task_id, {
                 "saved_count": total_saved,
@@ -526,7 +610,8 @@ async def design_test_cases_async(
             task_db.close()
     
     # 启动后台任务
-    asyncio_task = asyncio.create_task(run_task())
+    with log_context(task_id=task_id):
+        asyncio_task = asyncio.create_task(run_traced(task_id, "test_case_design", run_task()))
     task_manager.register_running_task(task_id, asyncio_task)
     
     return AsyncTaskResponse(
@@ -652,7 +737,7 @@ async def optimize_test_cases_batch(
     # 后台执行任务
     async def run_task():
         # 创建新的数据库会话用于后台任务
-        from app.database import SessionLocal
+        from app.database import SessionLocal, db_write_queue
         task_db = SessionLocal()
         
         try:
@@ -676,39 +761,42 @@ async def optimize_test_cases_batch(
                 # 如果auto_save=True，更新数据库中的测试用例
                 updated_count = 0
                 if auto_save:
-                    for opt_result in optimized_results:
-                        if opt_result.get("success") and opt_result.get("optimized"):
-                            original = opt_result.get("original", {})
-                            optimized = opt_result.get("optimized", {})
-                            case_id = original.get("id")
-                            
-                            if case_id:
-                                try:
-                                    test_case = task_db.query(TestCase).filter(
-                                        TestCase.id == case_id
-                                    ).first()
-                                    
-                                    if test_case:
-                                        # 更新测试用例字段
-                                        if optimized.get("title"):
-                                            test_case.title = optimized["title"]
-                                        if optimized.get("description"):
-                                            test_case.description = optimized["description"]
-                                        if optimized.get("preconditions"):
-                                            test_case.preconditions = optimized["preconditions"]
-                                        if optimized.get("test_steps"):
-                                            test_case.test_steps = optimized["test_steps"]
-                                        if optimized.get("expected_result"):
-                                            test_case.expected_result = optimized["expected_result"]
+                    def save_optimized(write_db: Session) -> int:
+                        updated = 0
+                        for opt_result in optimized_results:
+                            if opt_result.get("success") and opt_result.get("optimized"):
+                                original = opt_result.get("original", {})
+                                optimized = opt_result.get("optimized", {})
+                                case_id = original.get("id")
+                                
+                                if case_id:
+                                    try:
+                                        test_case = write_db.query(TestCase).filter(
+                                            TestCase.id == case_id
+                                        ).first()
                                         
-                                        test_case.edited_by_user = True
-                                        test_case.updated_by = user_id
-                                        updated_count += 1
-                                except Exception as e:
-                                    print(f"⚠️ 更新测试用例 {case_id} 失败: {e}")
-                                    continue
+                                        if test_case:
+                                            # 更新测试用例字段
+                                            if optimized.get("title"):
+                                                test_case.title = optimized["title"]
+                                            if optimized.get("description"):
+                                                test_case.description = optimized["description"]
+                                            if optimized.get("preconditions"):
+                                                test_case.preconditions = optimized["preconditions"]
+                                            if optimized.get("test_steps"):
+                                                test_case.test_steps = optimized["test_steps"]
+                                            if optimized.get("expected_result"):
+                                                test_case.expected_result = optimized["expected_result"]
+                                            
+                                            test_case.edited_by_user = True
+                                            test_case.updated_by = user_id
+                                            updated += 1
+                                    except Exception as e:
+                                        logger.warning(f"⚠️ 更新测试用例 {case_id} 失败: {e}")
+                                        continue
+                        return updated
                     
-                    task_db.commit()
+                    updated_count = await db_write_queue.run(save_optimized)
                 
                 # 添加更新统计到结果
                 data["updated_count"] = updated_count
@@ -722,7 +810,8 @@ async def optimize_test_cases_batch(
             task_db.close()
     
     # 启动后台任务
-    asyncio_task = asyncio.create_task(run_task())
+    with log_context(task_id=task_id):
+        asyncio_task = asyncio.create_task(run_traced(task_id, "test_case_optimization", run_task()))
     task_manager.register_running_task(task_id, asyncio_task)
     
     concurrency = task_manager.max_concurrent_tasks
@@ -830,7 +919,7 @@ def get_test_types(
             ]
         }
     except Exception as e:
-        print(f"⚠️ 获取测试类型失败: {e}")
+        logger.warning(f"⚠️ 获取测试类型失败: {e}")
         # 降级返回默认列表
         return {
             "test_types": [
@@ -863,7 +952,7 @@ def get_design_methods(
             ]
         }
     except Exception as e:
-        print(f"⚠️ 获取设计方法失败: {e}")
+        logger.warning(f"⚠️ 获取设计方法失败: {e}")
         # 降级返回默认列表
         return {
             "design_methods": [
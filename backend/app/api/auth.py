@@ -17,6 +17,7 @@ from app.core.security import (
     verify_password, get_password_hash, create_access_token,
     create_refresh_token, verify_refresh_token
 )
+from app.core.auth_cache import auth_cache
 from app.core.dependencies import get_current_active_user, get_current_admin_user
 from app.config import settings
 
@@ -184,6 +185,7 @@ def update_current_user(
     
     db.commit()
     db.refresh(current_user)
+    auth_cache.invalidate_user(current_user.id)
     
     return current_user
 
@@ -205,6 +207,7 @@ def change_password(
     # 更新密码
     current_user.password_hash = get_password_hash(password_data.new_password)
     db.commit()
+    auth_cache.invalidate_user(current_user.id)
     
     return {"message": "密码修改成功"}
 
@@ -284,6 +287,7 @@ def update_user_status(
 
     user.is_active = bool(is_active)
     db.commit()
+    auth_cache.invalidate_user(user_id)
 
     return {"message": f"用户状态已更新为{'激活' if is_active else '禁用'}"}
 
@@ -312,6 +316,7 @@ def update_user_role(
 
     user.role = UserRole(role)
     db.commit()
+    auth_cache.invalidate_user(user_id)
 
     return {"message": f"用户角色已更新为{role}"}
 
@@ -398,6 +403,7 @@ def update_user(
 
     db.commit()
     db.refresh(user)
+    auth_cache.invalidate_user(user_id)
 
     return user
 
@@ -426,6 +432,7 @@ def delete_user(
     # 物理删除用户
     db.delete(user)
     db.commit()
+    auth_cache.invalidate_user(user_id)
 
     return {"message": "用户已删除"}
 
@@ -7,7 +7,6 @@ from sqlalchemy.orm import Session
 
 from app.database import get_db
 from app.models.user import User, UserRole
-from app.models.project import Project
 from app.models.module import ModulePriority
 from app.schemas.module import (
     ModuleCreate, ModuleUpdate, Module as ModuleSchema,
@@ -15,41 +14,32 @@ from app.schemas.module import (
     ModuleAssignmentCreate, ModuleAssignee, ProjectStatsResponse
 )
 from app.services.module_service import module_service
+from app.core.auth_cache import ProjectAccess, auth_cache
 from app.core.dependencies import get_current_active_user
 
 
-def check_project_access(db: Session, project_id: int, user: User) -> Project:
+def check_project_access(db: Session, project_id: int, user: User) -> ProjectAccess:
     """检查用户是否有项目访问权限"""
-    project = db.query(Project).filter(Project.id == project_id).first()
-    if not project:
+    access = auth_cache.get_project_access(db, project_id)
+    if access is None:
         raise HTTPException(status_code=404, detail="项目不存在")
     
     # 检查权限：所有者、管理员或项目成员
-    if user.role == UserRole.ADMIN or project.owner_id == user.id:
-        return project
-    
-    # 检查是否是项目成员
-    from app.models.user import ProjectMember
-    is_member = db.query(ProjectMember).filter(
-        ProjectMember.project_id == project_id,
-        ProjectMember.user_id == user.id
-    ).first()
-    
-    if not is_member:
+    if user.role != UserRole.ADMIN and access.role_of(user.id) is None:
         raise HTTPException(status_code=403, detail="无权访问该项目")
     
-    return project
+    return access
 
 
-def check_project_edit_permission(db: Session, project_id: int, user: User) -> Project:
+def check_project_edit_permission(db: Session, project_id: int, user: User) -> ProjectAccess:
     """检查用户是否有项目编辑权限"""
-    project = check_project_access(db, project_id, user)
+    access = check_project_access(db, project_id, user)
     
     # 只有所有者和管理员可以编辑
-    if user.role != UserRole.ADMIN and project.owner_id != user.id:
+    if user.role != UserRole.ADMIN and access.owner_id != user.id:
         raise HTTPException(status_code=403, detail="无权编辑该项目")
     
-    return project
+    return access
 
 
 router = APIRouter()
@@ -1,10 +1,11 @@
 from typing import List, Optional, Any, Dict
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session, joinedload
 from pydantic import BaseModel
 from datetime import datetime
 
-from app.database import get_db
+from app.database import get_db, db_executor
 from app.models.user import User
 from app.models.project import Project
 from app.models.module import Module
@@ -12,6 +13,7 @@ from app.models.testcase import TestCase, ExecutionStatus, TestCaseStatus
 from app.models.test_case_archive import ProjectArchive, ArchivedTestCase, ArchiveStatus
 from app.api.project_test_cases import check_project_access, check_project_edit_permission, export_to_xmind, export_to_csv
 from app.core.dependencies import get_current_active_user
+from app.services.export_service import export_service
 
 router = APIRouter()
 
@@ -78,7 +80,7 @@ def get_module_full_path(module: Module, all_modules_dict: Dict[int, Module]) ->
 # --- Endpoints ---
 
 @router.post("/projects/{project_id}/archives", response_model=ArchiveResponse)
-async def create_archive(
+def create_archive(
     project_id: int,
     request: ArchiveCreateRequest,
     current_user: User = Depends(get_current_active_user),
@@ -200,7 +202,7 @@ async def create_archive(
     )
 
 @router.get("/projects/{project_id}/archives", response_model=List[ArchiveResponse])
-async def list_archives(
+def list_archives(
     project_id: int,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
@@ -231,7 +233,7 @@ async def list_archives(
     return result
 
 @router.get("/archives/{archive_id}/test-cases", response_model=List[ArchivedTestCaseResponse])
-async def list_archive_cases(
+def list_archive_cases(
     archive_id: int,
     module_path: Optional[str] = None, # Filter by module path?
     status: Optional[str] = None,
@@ -276,7 +278,7 @@ async def list_archive_cases(
     ]
 
 @router.put("/archives/cases/{case_id}/execution", response_model=ArchivedTestCaseResponse)
-async def update_execution_result(
+def update_execution_result(
     case_id: int,
     request: ExecutionUpdateRequest,
     current_user: User = Depends(get_current_active_user),
@@ -324,19 +326,80 @@ async def update_execution_result(
     )
 
 @router.post("/archives/{archive_id}/export")
-async def export_archive(
+def export_archive(
     archive_id: int,
     request: ExportArchiveRequest,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    """导出归档用例和结果"""
+    """导出归档用例和结果（相同数据的导出结果已缓存时直接返回缓存文件）"""
+    archive = get_archive_with_access(archive_id, current_user, db)
+
+    artifact = export_service.get_artifact(archive_export_key(db, archive, request), "archive", archive_id)
+    if artifact:
+        return FileResponse(artifact["path"], filename=artifact["filename"], media_type=artifact["media_type"])
+
+    return build_archive_export(db, archive_id, request)
+
+@router.post("/archives/{archive_id}/export/jobs")
+async def create_archive_export_job(
+    archive_id: int,
+    request: ExportArchiveRequest,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """创建归档后台导出任务，完成后的任务结果中包含 download_url"""
+    def prepare() -> str:
+        archive = get_archive_with_access(archive_id, current_user, db)
+        return archive_export_key(db, archive, request)
+
+    key = await db_executor.run(prepare)
+    download_url = f"/api/archives/{archive_id}/export/files/{key}"
+    return export_service.start_job(
+        key, "archive", archive_id,
+        lambda task_db: build_archive_export(task_db, archive_id, request),
+        download_url,
+        task_type="archive_export"
+    )
+
+@router.get("/archives/{archive_id}/export/files/{key}")
+def download_archive_export_file(
+    archive_id: int,
+    key: str,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """下载归档导出文件（支持 Range 断点续传）"""
+    get_archive_with_access(archive_id, current_user, db)
+
+    artifact = export_service.get_artifact(key, "archive", archive_id)
+    if not artifact:
+        raise HTTPException(status_code=404, detail="导出文件不存在或已过期")
+
+    return FileResponse(artifact["path"], filename=artifact["filename"], media_type=artifact["media_type"])
+
+def get_archive_with_access(archive_id: int, user: User, db: Session) -> ProjectArchive:
     archive = db.query(ProjectArchive).filter(ProjectArchive.id == archive_id).first()
     if not archive:
         raise HTTPException(status_code=404, detail="Archive not found")
-        
-    check_project_access(archive.project_id, current_user, db)
-    
+
+    check_project_access(archive.project_id, user, db)
+    return archive
+
+def archive_export_key(db: Session, archive: ProjectArchive, request: ExportArchiveRequest) -> str:
+    # updated_at only has one-second resolution, so the data version is a hash over the archived cases' content
+    cases = db.query(*ArchivedTestCase.__table__.columns).filter(
+        ArchivedTestCase.archive_id == archive.id
+    ).order_by(ArchivedTestCase.id)
+
+    version = {"archive_name": archive.name, "cases": export_service.content_version(cases)}
+    return export_service.build_key("archive", archive.id, {}, request.format, version)
+
+def build_archive_export(db: Session, archive_id: int, request: ExportArchiveRequest):
+    archive = db.query(ProjectArchive).filter(ProjectArchive.id == archive_id).first()
+    if not archive:
+        raise HTTPException(status_code=404, detail="Archive not found")
+
     cases = db.query(ArchivedTestCase).filter(ArchivedTestCase.archive_id == archive_id).all()
     
     # Need to adapt ArchivedTestCase to what export functions expect
@@ -436,6 +499,8 @@ def export_archive_to_markdown(archive: ProjectArchive, cases: List[ArchivedTest
             "Content-Disposition": f"attachment; filename*=UTF-8''{encoded_filename}"
         }
     )
+
+def export_archive_to_csv(archive: ProjectArchive, cases: List[ArchivedTestCase]):
     from fastapi.responses import StreamingResponse
     from io import StringIO
     from urllib.parse import quote
@@ -496,7 +561,7 @@ def export_archive_to_markdown(archive: ProjectArchive, cases: List[ArchivedTest
             priority_map.get(tc.priority, tc.priority),
             tc.test_category or "",
             tc.design_method or "",
-            status_map.get(tc.execution_status, tc.execution_status),
+            status_map.get(getattr(tc.execution_status, "value", tc.execution_status), tc.execution_status),
             tc.execution_comment or ""
         ])
     
@@ -513,7 +578,7 @@ def export_archive_to_markdown(archive: ProjectArchive, cases: List[ArchivedTest
     )
 
 def export_archive_to_xmind(archive: ProjectArchive, cases: List[ArchivedTestCase]):
-    from app.lib.xmind2testcase.writer import write_xmind_zip
+    from app.lib.xmind2testcase.writer import iter_xmind_zip
     from app.lib.xmind2testcase.metadata import TestSuite as XMindTestSuite, TestCase as XMindTestCase, TestStep as XMindTestStep
     from fastapi.responses import StreamingResponse
     from urllib.parse import quote
@@ -607,7 +672,7 @@ def export_archive_to_xmind(archive: ProjectArchive, cases: List[ArchivedTestCas
             target_suite.testcase_list = []
         target_suite.testcase_list.append(case)
 
-    xmind_bytes = write_xmind_zip([root_suite])
+    xmind_bytes = iter_xmind_zip([root_suite])
     filename = f"{archive.name}_归档_{datetime.now().strftime('%Y%m%d')}.xmind"
     encoded_filename = quote(filename)
 
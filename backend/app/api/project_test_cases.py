@@ -2,21 +2,33 @@
 项目级测试用例管理API
 提供项目下所有模块测试用例的聚合查询和批量操作
 """
-from typing import Any, List, Optional
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
 from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, Form
+from fastapi.responses import FileResponse
 from sqlalchemy import or_
 from sqlalchemy.orm import Session, joinedload
 from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
 
-from app.database import get_db
-from app.models.user import User, ProjectMember, ProjectRole
+from app.database import get_db, db_executor, db_write_queue
+from app.models.user import User, ProjectRole
 from app.models.project import Project
 from app.models.module import Module
-from app.lib.xmind2testcase.writer import write_xmind_zip
+from app.lib.xmind2testcase.writer import iter_xmind_zip
 from app.lib.xmind2testcase.metadata import TestSuite as XMindTestSuite, TestCase as XMindTestCase, TestStep as XMindTestStep
 from app.models.requirement import RequirementPoint
-from app.models.testcase import TestPoint, TestCase, TestCaseStatus
+from app.models.testcase import TestPoint, TestCase
+from app.core.auth_cache import ProjectAccess, auth_cache
 from app.core.dependencies import get_current_active_user
+from app.core.logger import log_context
+from app.services.export_service import export_service
+from app.services.async_task_manager import task_manager
+from app.services.test_case_import_service import TestCaseImporter, merge_import_rows
+from app.utils.spreadsheet_reader import SpreadsheetError, cell_to_text, iter_sheet_rows
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -61,56 +73,42 @@ class BatchDeleteRequest(BaseModel):
 
 # ========== 权限检查 ==========
 
-def check_project_access(project_id: int, user: User, db: Session) -> Project:
-    """检查用户对项目的访问权限，返回项目对象"""
+def check_project_access(project_id: int, user: User, db: Session) -> ProjectAccess:
+    """检查用户对项目的访问权限，返回项目的权限信息"""
     from app.models.user import UserRole
 
-    project = db.query(Project).filter(Project.id == project_id).first()
-    if not project:
+    access = auth_cache.get_project_access(db, project_id)
+    if access is None:
         raise HTTPException(status_code=404, detail="项目不存在")
 
-    # 管理员或项目所有者
-    if user.role == UserRole.ADMIN or project.owner_id == user.id:
-        return project
-
-    # 检查是否为项目成员
-    member = db.query(ProjectMember).filter(
-        ProjectMember.project_id == project_id,
-        ProjectMember.user_id == user.id
-    ).first()
-
-    if not member:
+    # 管理员、项目所有者或项目成员
+    if user.role != UserRole.ADMIN and access.role_of(user.id) is None:
         raise HTTPException(status_code=403, detail="无权访问此项目")
 
-    return project
+    return access
 
 
-def check_project_edit_permission(project_id: int, user: User, db: Session) -> Project:
+def check_project_edit_permission(project_id: int, user: User, db: Session) -> ProjectAccess:
     """检查用户是否有编辑权限（成员或管理员）"""
     from app.models.user import UserRole
 
-    project = check_project_access(project_id, user, db)
+    access = check_project_access(project_id, user, db)
 
-    # 管理员或项目所有者
-    if user.role == UserRole.ADMIN or project.owner_id == user.id:
-        return project
+    # 管理员不受项目角色限制
+    if user.role == UserRole.ADMIN:
+        return access
 
     # 检查是否为编辑角色
-    member = db.query(ProjectMember).filter(
-        ProjectMember.project_id == project_id,
-        ProjectMember.user_id == user.id
-    ).first()
-
-    if member and member.role == ProjectRole.VIEWER:
+    if access.role_of(user.id) == ProjectRole.VIEWER:
         raise HTTPException(status_code=403, detail="查看者无编辑权限")
 
-    return project
+    return access
 
 
 # ========== API 路由 ==========
 
 @router.get("/projects/{project_id}/test-cases", response_model=List[Any])
-async def get_project_test_cases(
+def get_project_test_cases(
     project_id: int,
     view_mode: str = Query("hierarchy", regex="^(hierarchy|flat)$"),
     keyword: Optional[str] = None,
@@ -268,7 +266,7 @@ async def get_project_test_cases(
 
 
 @router.delete("/projects/{project_id}/test-cases/batch")
-async def batch_delete_test_cases(
+def batch_delete_test_cases(
     project_id: int,
     request: BatchDeleteRequest,
     current_user: User = Depends(get_current_active_user),
@@ -365,7 +363,7 @@ def verify_test_case_belongs_to_project(case_id: int, project_id: int, db: Sessi
 
 
 @router.put("/projects/{project_id}/test-cases/{case_id}")
-async def update_test_case(
+def update_test_case(
     project_id: int,
     case_id: int,
     request: TestCaseUpdateRequest,
@@ -393,7 +391,7 @@ async def update_test_case(
 
 
 @router.delete("/projects/{project_id}/test-cases/{case_id}")
-async def delete_single_test_case(
+def delete_single_test_case(
     project_id: int,
     case_id: int,
     current_user: User = Depends(get_current_active_user),
@@ -420,7 +418,7 @@ class ExportRequest(BaseModel):
 
 
 @router.post("/projects/{project_id}/test-cases/export")
-async def export_test_cases(
+def export_test_cases(
     project_id: int,
     request: ExportRequest,
     current_user: User = Depends(get_current_active_user),
@@ -430,8 +428,11 @@ async def export_test_cases(
     导出测试用例
 
     支持格式：
-    - excel: Excel表格（测试步骤和预期结果分列展示）
+    - csv: CSV文件（默认）
+    - excel / xlsx: Excel表格（测试步骤和预期结果分列展示）
     - xmind: 思维导图（按模块-用例-步骤层级展示）
+
+    CSV 与 Excel 按批读取用例并流式输出，内存占用不随用例数量增长
     Excel列格式：
     - 序号
     - 所属模块
@@ -443,158 +444,362 @@ async def export_test_cases(
     - 测试分类
     - 设计方法
     - 状态
-    """
-    from fastapi.responses import StreamingResponse
-    from io import BytesIO
-    from datetime import datetime
-    from urllib.parse import quote
 
+    相同数据的导出结果已缓存时直接返回缓存文件
+    """
     # 权限检查
     check_project_access(project_id, current_user, db)
 
+    artifact = export_service.get_artifact(project_export_key(db, project_id, request), "project", project_id)
+    if artifact:
+        return FileResponse(artifact["path"], filename=artifact["filename"], media_type=artifact["media_type"])
+
+    return build_project_export(db, project_id, request)
+
+
+@router.post("/projects/{project_id}/test-cases/export/jobs")
+async def create_export_job(
+    project_id: int,
+    request: ExportRequest,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    创建后台导出任务
+
+    返回 task_id，可通过 /api/agents/tasks/{task_id}/status 查询进度，
+    完成后的任务结果中包含 download_url。数据未变化时直接返回已缓存的文件。
+    """
+    def prepare() -> str:
+        check_project_access(project_id, current_user, db)
+        return project_export_key(db, project_id, request)
+
+    key = await db_executor.run(prepare)
+    download_url = f"/api/projects/{project_id}/test-cases/export/files/{key}"
+    return export_service.start_job(
+        key, "project", project_id,
+        lambda task_db: build_project_export(task_db, project_id, request),
+        download_url,
+        task_type="test_case_export"
+    )
+
+
+@router.get("/projects/{project_id}/test-cases/export/files/{key}")
+def download_export_file(
+    project_id: int,
+    key: str,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """下载导出文件（支持 Range 断点续传）"""
+    check_project_access(project_id, current_user, db)
+
+    artifact = export_service.get_artifact(key, "project", project_id)
+    if not artifact:
+        raise HTTPException(status_code=404, detail="导出文件不存在或已过期")
+
+    return FileResponse(artifact["path"], filename=artifact["filename"], media_type=artifact["media_type"])
+
+
+def _load_project_export_scope(db: Session, project_id: int, ids: Optional[List[int]]):
+    """加载导出范围：项目、模块及用例筛选条件"""
     # 获取项目信息
     project = db.query(Project).filter(Project.id == project_id).first()
 
     # 获取项目下所有模块
     modules = db.query(Module).filter(Module.project_id == project_id).all()
     module_ids = [m.id for m in modules]
-    module_map = {m.id: m.name for m in modules}
 
     if not module_ids:
         raise HTTPException(status_code=400, detail="项目下没有模块")
 
-    # 获取所有模块的需求点
-    requirement_points = db.query(RequirementPoint).filter(
-        RequirementPoint.module_id.in_(module_ids)
-    ).all()
-    rp_ids = [rp.id for rp in requirement_points]
-    rp_module_map = {rp.id: rp.module_id for rp in requirement_points}
-
+    # 用例筛选条件（测试点通过子查询匹配，避免把大量ID展开成SQL参数）
+    criteria = [project_case_filter(project_id, module_ids)]
 
+    # 如果指定了ID，只导出指定的用例
+    if ids:
+        criteria.append(TestCase.id.in_(ids))
 
-    # 获取所有测试点
-    test_points = db.query(TestPoint).filter(
-        TestPoint.requirement_point_id.in_(rp_ids)
-    ).all()
-    tp_ids = [tp.id for tp in test_points]
-    tp_rp_map = {tp.id: tp.requirement_point_id for tp in test_points}
+    return project, modules, criteria
 
 
+def project_export_key(db: Session, project_id: int, request: ExportRequest) -> str:
+    """
+    计算项目导出的缓存键
 
-    # 构建测试用例查询
-    query = db.query(TestCase).filter(
-        or_(
-            TestCase.test_point_id.in_(tp_ids),
-            TestCase.module_id.in_(module_ids),
-            TestCase.project_id == project_id
+    数据版本由范围内用例的全部列内容（XMind 另加需求点、测试点与模块的对应关系）
+    以及模块名称、分类/方法名称组成，任一变化都会得到新的缓存键。
+    """
+    project, modules, criteria = _load_project_export_scope(db, project_id, request.ids)
+    cases = db.query(*TestCase.__table__.columns).filter(*criteria).order_by(TestCase.id)
+
+    version = {
+        "project_name": project.name,
+        "cases": export_service.content_version(cases),
+        "modules": sorted((m.id, m.name) for m in modules),
+        "labels": load_export_label_maps(db)
+    }
+    if request.format == "xmind":
+        # XMind 按需求点 -> 模块归类用例
+        rp_query = db.query(RequirementPoint.id, RequirementPoint.module_id).filter(
+            RequirementPoint.module_id.in_([m.id for m in modules])
         )
-    )
+        tp_query = db.query(TestPoint.id, TestPoint.requirement_point_id).filter(
+            TestPoint.requirement_point_id.in_(rp_query.with_entities(RequirementPoint.id))
+        )
+        version["requirement_points"] = export_service.content_version(rp_query.order_by(RequirementPoint.id))
+        version["test_points"] = export_service.content_version(tp_query.order_by(TestPoint.id))
+    params = {"ids": sorted(request.ids) if request.ids else None}
+    return export_service.build_key("project", project_id, params, request.format, version)
 
-    # 如果指定了ID，只导出指定的用例
-    if request.ids:
-        query = query.filter(TestCase.id.in_(request.ids))
 
-    test_cases = query.order_by(TestCase.id).all()
+def build_project_export(db: Session, project_id: int, request: ExportRequest):
+    """生成项目测试用例导出响应（不含权限检查）"""
+    project, modules, criteria = _load_project_export_scope(db, project_id, request.ids)
+    module_ids = [m.id for m in modules]
+    module_map = {m.id: m.name for m in modules}
 
-    if not test_cases:
+    if not db.query(TestCase.id).filter(*criteria).first():
         raise HTTPException(status_code=400, detail="没有可导出的测试用例")
 
     # 根据格式生成不同的文件
     if request.format == "xmind":
+        # 获取所有模块的需求点
+        requirement_points = db.query(RequirementPoint).filter(
+            RequirementPoint.module_id.in_(module_ids)
+        ).all()
+        rp_ids = [rp.id for rp in requirement_points]
+        rp_module_map = {rp.id: rp.module_id for rp in requirement_points}
+
+        # 获取所有测试点
+        test_points = db.query(TestPoint).filter(
+            TestPoint.requirement_point_id.in_(rp_ids)
+        ).all()
+        tp_rp_map = {tp.id: tp.requirement_point_id for tp in test_points}
+
+        # 只查询生成 XMind 需要的列
+        test_cases = db.query(
+            TestCase.id,
+            TestCase.test_point_id,
+            TestCase.module_id,
+            TestCase.import_module_name,
+            TestCase.title,
+            TestCase.description,
+            TestCase.preconditions,
+            TestCase.priority,
+            TestCase.test_steps
+        ).filter(*criteria).order_by(TestCase.id).execution_options(yield_per=EXPORT_BATCH_SIZE)
         return export_to_xmind(project, modules, test_cases, tp_rp_map, rp_module_map)
-    else:
-        return export_to_csv(project, modules, test_cases, tp_rp_map, rp_module_map, module_map, db)
 
+    rows = iter_export_rows(criteria, module_map, *load_export_label_maps(db))
+    if request.format in ("excel", "xlsx"):
+        return export_to_xlsx(project, rows)
+    return export_to_csv(project, rows)
 
-def export_to_csv(project, modules, test_cases, tp_rp_map, rp_module_map, module_map, db: Session):
-    """导出到 CSV"""
-    from fastapi.responses import StreamingResponse
-    from io import StringIO
-    from datetime import datetime
-    from urllib.parse import quote
-    import csv
 
-    # CSV 内存流（注意：csv 用文本流）
-    output = StringIO()
-    writer = csv.writer(output)
+# 导出表头
+EXPORT_HEADERS = [
+    "序号", "所属模块", "用例名称", "前置条件",
+    "步骤", "预期", "优先级", "用例类型", "适用阶段", "状态"
+]
+# 导出时每次从数据库读取的行数
+EXPORT_BATCH_SIZE = 1000
+# 流式输出时每个数据块的大小
+EXPORT_CHUNK_SIZE = 64 * 1024
 
-    # 表头
-    headers = [
-        "序号", "所属模块", "用例名称", "前置条件",
-        "步骤", "预期", "优先级", "用例类型", "适用阶段", "状态"
-    ]
-    writer.writerow(headers)
+
+def project_case_filter(project_id: int, module_ids: List[int]):
+    """项目下测试用例的筛选条件：属于项目模块的测试点、模块或直接属于项目"""
+    from sqlalchemy import select
+
+    tp_subquery = select(TestPoint.id).join(
+        RequirementPoint, TestPoint.requirement_point_id == RequirementPoint.id
+    ).where(RequirementPoint.module_id.in_(module_ids))
+
+    return or_(
+        TestCase.test_point_id.in_(tp_subquery),
+        TestCase.module_id.in_(module_ids),
+        TestCase.project_id == project_id
+    )
+
+
+def load_export_label_maps(db: Session):
+    """加载测试分类与设计方法的显示名称"""
+    from app.models.settings import TestCategory, TestDesignMethod
+
+    categories = db.query(TestCategory.code, TestCategory.name).filter(TestCategory.is_active == True).all()
+    methods = db.query(TestDesignMethod.code, TestDesignMethod.name).filter(TestDesignMethod.is_active == True).all()
+    return {c.code: c.name for c in categories}, {m.code: m.name for m in methods}
+
+
+def iter_export_rows(criteria, module_map, category_map, method_map):
+    """
+    逐行生成导出数据
+
+    使用独立会话和 yield_per 分批读取，只查询导出需要的列，
+    内存占用与用例数量无关。生成器在响应流式输出期间执行，结束后关闭会话。
+    """
+    from app.database import SessionLocal
 
     # 映射关系
     priority_map = {"high": "高", "medium": "中", "low": "低"}
     status_map = {"draft": "草稿", "under_review": "评审中", "approved": "已通过"}
 
-    # 测试分类
-    from app.models.settings import TestCategory
-    categories = db.query(TestCategory).filter(TestCategory.is_active == True).all()
-    category_map = {c.code: c.name for c in categories}
-
-    # 设计方法
-    from app.models.settings import TestDesignMethod
-    methods = db.query(TestDesignMethod).filter(TestDesignMethod.is_active == True).all()
-    method_map = {m.code: m.name for m in methods}
+    db = SessionLocal()
+    try:
+        query = db.query(
+            TestCase.module_id,
+            TestCase.import_module_name,
+            TestCase.title,
+            TestCase.preconditions,
+            TestCase.test_steps,
+            TestCase.priority,
+            TestCase.test_category,
+            TestCase.design_method,
+            TestCase.status,
+            RequirementPoint.module_id.label("rp_module_id")
+        ).outerjoin(
+            TestPoint, TestCase.test_point_id == TestPoint.id
+        ).outerjoin(
+            RequirementPoint, TestPoint.requirement_point_id == RequirementPoint.id
+        ).filter(*criteria).order_by(TestCase.id).execution_options(yield_per=EXPORT_BATCH_SIZE)
+
+        for idx, tc in enumerate(query, 1):
+            # 模块名称解析：测试点所属需求点的模块优先，其次为用例自身的模块
+            module_id = tc.rp_module_id if tc.rp_module_id in module_map else tc.module_id
+
+            module_name = "未分类"
+            if module_id:
+                module_name = module_map.get(module_id, "未分类")
+            elif tc.import_module_name:
+                module_name = tc.import_module_name
+
+            # 步骤 / 预期（CSV 用 \n 没问题，Excel/WPS 能识别）
+            steps_text = ""
+            expected_text = ""
+            if tc.test_steps and isinstance(tc.test_steps, list):
+                steps_lines = []
+                expected_lines = []
+                for i, step in enumerate(tc.test_steps, 1):
+                    action = step.get("action", "") if isinstance(step, dict) else str(step)
+                    expected = step.get("expected", "") if isinstance(step, dict) else ""
+                    steps_lines.append(f"{i}. {action}")
+                    expected_lines.append(f"{i}. {expected}")
+                steps_text = "\n".join(steps_lines)
+                expected_text = "\n".join(expected_lines)
+
+            status_value = getattr(tc.status, "value", tc.status)
+
+            yield [
+                idx,                                                    # 序号
+                module_name,                                            # 所属模块
+                tc.title or "",                                         # 用例名称
+                tc.preconditions or "",                                 # 前置条件
+                steps_text,                                             # 步骤
+                expected_text,                                          # 预期
+                priority_map.get(tc.priority, tc.priority or ""),       # 优先级
+                category_map.get(tc.test_category, tc.test_category or ""),  # 用例类型
+                method_map.get(tc.design_method, tc.design_method or ""),    # 适用阶段
+                status_map.get(status_value, status_value or "")        # 状态
+            ]
+    finally:
+        db.close()
 
-    # 写数据
-    for idx, tc in enumerate(test_cases, 1):
 
-        # 模块名称解析逻辑（保持不变）
-        tp_id = tc.test_point_id
-        rp_id = tp_rp_map.get(tp_id) if tp_id else None
-        module_id = rp_module_map.get(rp_id) if rp_id else tc.module_id
+def _attachment_headers(filename: str) -> dict:
+    from urllib.parse import quote
+    return {"Content-Disposition": f"attachment; filename*=UTF-8''{quote(filename)}"}
 
-        module_name = "未分类"
-        if module_id:
-            module_name = module_map.get(module_id, "未分类")
-        elif tc.import_module_name:
-            module_name = tc.import_module_name
 
-        # 步骤 / 预期（CSV 用 \n 没问题，Excel/WPS 能识别）
-        steps_text = ""
-        expected_text = ""
-        if tc.test_steps and isinstance(tc.test_steps, list):
-            steps_lines = []
-            expected_lines = []
-            for i, step in enumerate(tc.test_steps, 1):
-                action = step.get("action", "") if isinstance(step, dict) else str(step)
-                expected = step.get("expected", "") if isinstance(step, dict) else ""
-                steps_lines.append(f"{i}. {action}")
-                expected_lines.append(f"{i}. {expected}")
-            steps_text = "\n".join(steps_lines)
-            expected_text = "\n".join(expected_lines)
-
-        writer.writerow([
-            idx,                                                    # 序号
-            module_name,                                            # 所属模块
-            tc.title or "",                                         # 用例名称
-            tc.preconditions or "",                                 # 前置条件
-            steps_text,                                             # 步骤
-            expected_text,                                          # 预期
-            priority_map.get(tc.priority, tc.priority or ""),       # 优先级
-            category_map.get(tc.test_category, tc.test_category or ""),  # 用例类型
-            method_map.get(tc.design_method, tc.design_method or ""),    # 适用阶段
-            status_map.get(tc.status, tc.status or "")              # 状态
-        ])
+def export_to_csv(project, rows):
+    """导出到 CSV（逐块编码输出，不在内存中拼接整个文件）"""
+    from fastapi.responses import StreamingResponse
+    from io import StringIO
+    from datetime import datetime
+    import csv
 
-    output.seek(0)
+    def generate():
+        buffer = StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_HEADERS)
+        for row in rows:
+            writer.writerow(row)
+            if buffer.tell() >= EXPORT_CHUNK_SIZE:
+                yield buffer.getvalue().encode("utf-8")
+                buffer.seek(0)
+                buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode("utf-8")
 
     # 文件名
     filename = f"{project.name}_测试用例_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-    encoded_filename = quote(filename)
 
     return StreamingResponse(
-        iter([output.getvalue()]),
+        generate(),
         media_type="text/csv; charset=utf-8",
-        headers={
-            "Content-Disposition": f"attachment; filename*=UTF-8''{encoded_filename}"
-        }
+        headers=_attachment_headers(filename)
     )
 
 
+def export_to_xlsx(project, rows):
+    """
+    导出到 Excel
+
+    使用 openpyxl 只写模式，行数据写入临时文件而不是常驻内存；
+    工作簿保存到临时文件后分块输出，输出完成后删除临时文件。
+    """
+    from fastapi.responses import StreamingResponse
+    from datetime import datetime
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Font
+    import os
+    import tempfile
+
+    def generate():
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("测试用例")
+        for col, width in zip("ABCDEFGHIJ", [8, 20, 40, 30, 50, 50, 10, 12, 12, 10]):
+            ws.column_dimensions[col].width = width
+
+        header_cells = []
+        for title in EXPORT_HEADERS:
+            cell = WriteOnlyCell(ws, value=title)
+            cell.font = Font(bold=True)
+            header_cells.append(cell)
+        ws.append(header_cells)
+
+        wrap = Alignment(wrap_text=True, vertical="top")
+        for row in rows:
+            cells = []
+            for value in row:
+                cell = WriteOnlyCell(ws, value=value)
+                cell.alignment = wrap
+                cells.append(cell)
+            ws.append(cells)
+
+        fd, tmp_path = tempfile.mkstemp(suffix=".xlsx")
+        os.close(fd)
+        try:
+            wb.save(tmp_path)
+            with open(tmp_path, "rb") as f:
+                while True:
+                    chunk = f.read(EXPORT_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    yield chunk
+        finally:
+            os.unlink(tmp_path)
+
+    # 文件名
+    filename = f"{project.name}_测试用例_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+
+    return StreamingResponse(
+        generate(),
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        headers=_attachment_headers(filename)
+    )
+
 
 def export_to_xmind(project, modules, test_cases, tp_rp_map, rp_module_map):
     """
@@ -719,8 +924,8 @@ def export_to_xmind(project, modules, test_cases, tp_rp_map, rp_module_map):
             target_suite.testcase_list = []
         target_suite.testcase_list.append(case)
 
-    # 7️⃣ 生成 XMind ZIP
-    xmind_bytes = write_xmind_zip([root_suite])
+    # 7️⃣ 生成 XMind ZIP（主题逐个序列化写入压缩流，边生成边输出）
+    xmind_bytes = iter_xmind_zip([root_suite])
 
     # 8️⃣ 下载返回
     filename = f"{project.name}_测试用例_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xmind"
@@ -735,49 +940,49 @@ def export_to_xmind(project, modules, test_cases, tp_rp_map, rp_module_map):
     )
 
 
+# Excel 导入模板的列
+IMPORT_TEMPLATE_HEADERS = [
+    "所属模块", "用例标题", "前置条件", "测试步骤", "预期结果",
+    "优先级(高/中/低)", "设计方法", "测试分类"
+]
+IMPORT_REQUIRED_COLUMNS = ["所属模块", "用例标题"]
+
+
 @router.get("/projects/{project_id}/test-cases/template")
-async def download_import_template(
+def download_import_template(
     project_id: int,
     current_user: User = Depends(get_current_active_user)
 ):
     """下载测试用例导入模板"""
-    import pandas as pd
     from io import BytesIO
     from fastapi.responses import StreamingResponse
     from urllib.parse import quote
-
-    # 定义表头
-    headers = [
-        "所属模块", "用例标题", "前置条件", "测试步骤", "预期结果",
-        "优先级(高/中/低)", "设计方法", "测试分类"
+    from openpyxl import Workbook
+
+    # 示例数据
+    example_row = [
+        "用户管理",
+        "用户登录成功",
+        "用户已注册且状态正常",
+        "1. 输入正确的用户名\n2. 输入正确的密码\n3. 点击登录按钮",
+        "1. 登录成功\n2. 跳转至首页",
+        "高",
+        "功能测试",
+        "功能测试"
     ]
 
-    # 创建示例数据
-    example_data = [
-        {
-            "所属模块": "用户管理",
-            "用例标题": "用户登录成功",
-            "前置条件": "用户已注册且状态正常",
-            "测试步骤": "1. 输入正确的用户名\n2. 输入正确的密码\n3. 点击登录按钮",
-            "预期结果": "1. 登录成功\n2. 跳转至首页",
-            "优先级(高/中/低)": "高",
-            "设计方法": "功能测试",
-            "测试分类": "功能测试"
-        }
-    ]
+    workbook = Workbook()
+    worksheet = workbook.active
+    worksheet.title = '导入模板'
+    worksheet.append(IMPORT_TEMPLATE_HEADERS)
+    worksheet.append(example_row)
 
-    df = pd.DataFrame(example_data, columns=headers)
+    # 调整列宽
+    for i, (header, value) in enumerate(zip(IMPORT_TEMPLATE_HEADERS, example_row)):
+        worksheet.column_dimensions[chr(65 + i)].width = max(len(header), len(value)) + 4
 
     output = BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='导入模板')
-
-        # 调整列宽
-        worksheet = writer.sheets['导入模板']
-        for i, col in enumerate(df.columns):
-            column_len = max(df[col].astype(str).map(len).max(), len(col)) + 4
-            worksheet.column_dimensions[chr(65 + i)].width = column_len
-
+    workbook.save(output)
     output.seek(0)
     filename = "测试用例导入模板.xlsx"
     encoded_filename = quote(filename)
@@ -800,12 +1005,9 @@ async def import_test_cases(
     db: Session = Depends(get_db)
 ):
     """从 Excel 或 XMind 导入测试用例"""
-    import pandas as pd
     import os
+    import shutil
     import tempfile
-    from io import BytesIO
-    from app.models.module import Module
-    from app.lib.xmind2testcase.utils import get_xmind_testsuites
 
     # 1️⃣ 检查权限
     check_project_edit_permission(project_id, current_user, db)
@@ -815,199 +1017,45 @@ async def import_test_cases(
         # 2️⃣ 解析数据
         imported_data = [] # List of dict: {path, title, preconditions, steps, expected, priority, method, category}
 
-        if file.filename.endswith(('.xlsx', '.xls')):
-            content = await file.read()
-            df = pd.read_excel(BytesIO(content))
-            required_columns = ["所属模块", "用例标题"]
-            if not all(col in df.columns for col in required_columns):
-                raise HTTPException(status_code=400, detail=f"文件缺少必要列: {', '.join(required_columns)}")
-            
-            for _, row in df.iterrows():
-                title = str(row.get("用例标题", "")).strip()
-                if not title or title == "nan": continue
-                
-                path = str(row.get("所属模块", "未分类")).strip()
-                if path == "nan": path = "未分类"
-                
-                imported_data.append({
-                    "path": path,
-                    "title": title,
-                    "preconditions": str(row.get("前置条件", "")) if str(row.get("前置条件", "")) != "nan" else "",
-                    "steps_raw": str(row.get("测试步骤", "")),
-                    "expected_raw": str(row.get("预期结果", "")),
-                    "priority": str(row.get("优先级(高/中/低)", "中")).strip(),
-                    "design_method": str(row.get("设计方法", "")) if str(row.get("设计方法", "")) != "nan" else "",
-                    "test_category": str(row.get("测试分类", "")) if str(row.get("测试分类", "")) != "nan" else ""
-                })
+        if file.filename.endswith(('.xlsx', '.xlsm')):
+            try:
+                imported_data = await run_in_threadpool(read_excel_import_rows, file.file)
+            except SpreadsheetError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+
+        elif file.filename.endswith('.xls'):
+            raise HTTPException(status_code=400, detail="不支持旧版 .xls 格式，请另存为 .xlsx 后导入")
 
         elif file.filename.endswith('.xmind'):
             # 保存到临时文件
             suffix = ".xmind"
             with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-                content = await file.read()
-                tmp.write(content)
+                await run_in_threadpool(shutil.copyfileobj, file.file, tmp)
                 temp_path = tmp.name
-            
-            # 解析 XMind
-            testsuites = get_xmind_testsuites(temp_path)
-            
-            def flatten_suite(suite, current_path):
-                # suite 是 metadata.TestSuite 对象
-                # current_path 是列表
-                
-                # 处理当前层级的用例
-                if suite.testcase_list:
-                    path_str = " / ".join(current_path) if current_path else "未分类"
-                    for tc in suite.testcase_list:
-                        # tc 是 metadata.TestCase 对象
-                        # 转换步骤
-                        steps = []
-                        if tc.steps:
-                            for s in tc.steps:
-                                steps.append({
-                                    "action": s.actions,
-                                    "expected": s.expectedresults
-                                })
-                        
-                        p_map = {1: "高", 2: "中", 3: "低"}
-                        imported_data.append({
-                            "path": path_str,
-                            "title": tc.name,
-                            "preconditions": tc.preconditions or "",
-                            "test_category": "functional",
-                            "test_steps": steps, # XMind 直接解析出了结构化步骤
-                            "priority": p_map.get(tc.importance, "中"),
-                            "design_method": "scenario"
-                        })
-                
-                # 递归处理子套件
-                if suite.sub_suites:
-                    for sub in suite.sub_suites:
-                        flatten_suite(sub, current_path + [sub.name])
-
-            for ts in testsuites:
-                # TS 根节点通常是文件名或画布名，如果不想要它可以直接传子节点
-                if ts.sub_suites:
-                    for sub in ts.sub_suites:
-                        flatten_suite(sub, [sub.name])
-                else:
-                    # 只有根节点下有案例的情况
-                    flatten_suite(ts, [] )
+
+            # 解析 XMind（解析器不共享全局状态，可在线程池中并发执行）
+            imported_data = await run_in_threadpool(read_xmind_import_rows, temp_path)
 
         else:
             raise HTTPException(status_code=400, detail="不支持的文件格式")
 
         # 3️⃣ 合并标题一致的用例
-        merged_map = {} # (path, title) -> data_dict
-        for item in imported_data:
-            key = (item["path"], item["title"])
-            if key not in merged_map:
-                merged_map[key] = item
-            else:
-                target = merged_map[key]
-                # 合并前置条件
-                if item.get("preconditions") and item["preconditions"] not in target["preconditions"]:
-                    target["preconditions"] += "\n" + item["preconditions"]
-                
-                # 合并步骤
-                if "test_steps" in item:
-                    if "test_steps" not in target: target["test_steps"] = []
-                    target["test_steps"].extend(item["test_steps"])
-                else:
-                    # Excel 导入的 raw 字段合并
-                    target["steps_raw"] = (target.get("steps_raw", "") + "\n" + item.get("steps_raw", "")).strip()
-                    target["expected_raw"] = (target.get("expected_raw", "") + "\n" + item.get("expected_raw", "")).strip()
-
-        # 4️⃣ 预加载/创建模块
-        existing_modules = db.query(Module).filter(Module.project_id == project_id).all()
-        module_map = {m.name: m.id for m in existing_modules}
-
-        def get_or_create_module(name):
-            name = name.strip()
-            if not name: name = "未分类"
-            if name in module_map:
-                return module_map[name]
-            
-            # 创建新模块
-            new_mod = Module(name=name, project_id=project_id)
-            db.add(new_mod)
-            db.flush() # 获取 ID
-            module_map[name] = new_mod.id
-            return new_mod.id
-
-        # 5️⃣ 写入数据库
-        imported_count = 0
-        for data in merged_map.values():
-            module_id = get_or_create_module(data["path"])
-            
-            priority_map = {"高": "high", "中": "medium", "低": "low"}
-            priority = priority_map.get(data["priority"], "medium")
-
-            # 处理步骤（针对 Excel 的解析逻辑，XMind 已在前面处理）
-            test_steps = data.get("test_steps", [])
-            if not test_steps and data.get("steps_raw"):
-                # 复用原来的 Excel 解析逻辑
-                import re
-                steps_text = str(data["steps_raw"])
-                expected_text = str(data.get("expected_raw", ""))
-                step_pattern = re.compile(r'(\d+)\.\s*')
-                step_parts = step_pattern.split(steps_text)
-                expected_parts = step_pattern.split(expected_text)
-                
-                step_dict = {}
-                for i in range(1, len(step_parts) - 1, 2):
-                    num = step_parts[i]
-                    content = step_parts[i+1].strip() if i+1 < len(step_parts) else ""
-                    step_dict[num] = content
-                
-                expected_dict = {}
-                for i in range(1, len(expected_parts) - 1, 2):
-                    num = expected_parts[i]
-                    content = expected_parts[i+1].strip() if i+1 < len(expected_parts) else ""
-                    expected_dict[num] = content
-                
-                if step_dict:
-                    for num in sorted(step_dict.keys(), key=lambda x: int(x)):
-                        test_steps.append({"action": step_dict[num], "expected": expected_dict.get(num, "")})
-                else:
-                    test_steps = [{"action": steps_text, "expected": expected_text}]
-
-            # 检查是否存在同名用例，实现覆盖逻辑
-            existing_case = db.query(TestCase).filter(
-                TestCase.project_id == project_id,
-                TestCase.module_id == module_id,
-                TestCase.title == data["title"]
-            ).first()
-
-            if existing_case:
-                # 覆盖逻辑
-                existing_case.preconditions = data.get("preconditions")
-                existing_case.test_steps = test_steps
-                existing_case.priority = priority
-                existing_case.design_method = data.get("design_method")
-                existing_case.test_category = data.get("test_category")
-                existing_case.status = TestCaseStatus.DRAFT # 覆盖后重置为草稿
-            else:
-                # 创建新用例
-                new_case = TestCase(
-                    title=data["title"],
-                    module_id=module_id,
-                    project_id=project_id,
-                    preconditions=data.get("preconditions"),
-                    test_steps=test_steps,
-                    priority=priority,
-                    design_method=data.get("design_method"),
-                    test_category=data.get("test_category"),
-                    created_by=current_user.id,
-                    status=TestCaseStatus.DRAFT
-                )
-                db.add(new_case)
-            
-            imported_count += 1
-
-        db.commit()
-        return {"success": True, "imported_count": imported_count, "message": f"成功导入 {imported_count} 条测试用例"}
+        rows = merge_import_rows(imported_data)
+
+        # 4️⃣ 批量写入数据库（大文件在后台任务中导入，通过任务管理器报告进度）
+        if len(rows) >= IMPORT_BACKGROUND_THRESHOLD:
+            return start_import_job(project_id, current_user.id, rows)
+
+        stats = await db_write_queue.run(_run_import, project_id, current_user.id, rows)
+        imported_count = stats["imported_count"]
+        return {
+            "success": True,
+            **stats,
+            "message": f"成功导入 {imported_count} 条测试用例"
+        }
 
+    except HTTPException:
+        raise
     except Exception as e:
         db.rollback()
         import traceback
@@ -1016,3 +1064,127 @@ async def import_test_cases(
     finally:
         if temp_path and os.path.exists(temp_path):
             os.remove(temp_path)
+
+
+def read_excel_import_rows(source) -> List[Dict[str, Any]]:
+    """逐行读取 Excel 导入文件，返回导入数据列表（在线程池中执行）"""
+    imported_data = []
+    for row in iter_sheet_rows(source, IMPORT_REQUIRED_COLUMNS):
+        title = cell_to_text(row.get("用例标题")).strip()
+        if not title:
+            continue
+
+        imported_data.append({
+            "path": cell_to_text(row.get("所属模块")).strip() or "未分类",
+            "title": title,
+            "preconditions": cell_to_text(row.get("前置条件")),
+            "steps_raw": cell_to_text(row.get("测试步骤")),
+            "expected_raw": cell_to_text(row.get("预期结果")),
+            "priority": cell_to_text(row.get("优先级(高/中/低)")).strip() or "中",
+            "design_method": cell_to_text(row.get("设计方法")),
+            "test_category": cell_to_text(row.get("测试分类"))
+        })
+    return imported_data
+
+
+def read_xmind_import_rows(path: str) -> List[Dict[str, Any]]:
+    """解析 XMind 导入文件，返回导入数据列表（在线程池中执行）"""
+    from app.lib.xmind2testcase.utils import get_xmind_testsuites
+
+    imported_data = []
+    testsuites = get_xmind_testsuites(path)
+
+    def flatten_suite(suite, current_path):
+        # suite 是 metadata.TestSuite 对象
+        # current_path 是列表
+        
+        # 处理当前层级的用例
+        if suite.testcase_list:
+            path_str = " / ".join(current_path) if current_path else "未分类"
+            for tc in suite.testcase_list:
+                # tc 是 metadata.TestCase 对象
+                # 转换步骤
+                steps = []
+                if tc.steps:
+                    for s in tc.steps:
+                        steps.append({
+                            "action": s.actions,
+                            "expected": s.expectedresults
+                        })
+                
+                p_map = {1: "高", 2: "中", 3: "低"}
+                imported_data.append({
+                    "path": path_str,
+                    "title": tc.name,
+                    "preconditions": tc.preconditions or "",
+                    "test_category": "functional",
+                    "test_steps": steps, # XMind 直接解析出了结构化步骤
+                    "priority": p_map.get(tc.importance, "中"),
+                    "design_method": "scenario"
+                })
+        
+        # 递归处理子套件
+        if suite.sub_suites:
+            for sub in suite.sub_suites:
+                flatten_suite(sub, current_path + [sub.name])
+
+    for ts in testsuites:
+        # TS 根节点通常是文件名或画布名，如果不想要它可以直接传子节点
+        if ts.sub_suites:
+            for sub in ts.sub_suites:
+                flatten_suite(sub, [sub.name])
+        else:
+            # 只有根节点下有案例的情况
+            flatten_suite(ts, [] )
+
+    return imported_data
+
+
+# 导入用例数达到该值时在后台任务中执行
+IMPORT_BACKGROUND_THRESHOLD = 2000
+
+# 正在执行的后台导入任务（保持引用，避免任务被回收）
+_import_jobs = set()
+
+
+def _run_import(db: Session, project_id: int, user_id: int, rows: List[Dict[str, Any]], task_id: Optional[str] = None):
+    """执行导入（在写入队列中执行，正常返回后提交）"""
+    def report_progress(done: int, total: int):
+        # 进度范围：10% ~ 95%
+        task_manager.update_progress(task_id, 10 + int(done / total * 85), f"已导入 {done}/{total} 条用例")
+
+    importer = TestCaseImporter(db, project_id, user_id, progress_callback=report_progress if task_id else None)
+    return importer.run(rows)
+
+
+def start_import_job(project_id: int, user_id: int, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """在后台任务中导入用例，返回任务ID"""
+    try:
+        task_id = task_manager.create_task("test_case_import")
+    except ValueError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+
+    async def run_job():
+        task_manager.start_task(task_id)
+        task_manager.update_progress(task_id, 5, f"开始导入 {len(rows)} 条用例...")
+        try:
+            stats = await db_write_queue.run(_run_import, project_id, user_id, rows, task_id)
+            task_manager.complete_task(task_id, stats)
+            logger.info(f"✅ [用例导入] 任务 {task_id} 完成: 新增 {stats['created_count']} 条, 覆盖 {stats['updated_count']} 条")
+        except Exception as e:
+            logger.error(f"❌ [用例导入] 任务 {task_id} 失败: {e}")
+            task_manager.fail_task(task_id, f"导入失败: {str(e)}")
+
+    with log_context(task_id=task_id):
+        job = asyncio.create_task(run_job())
+    _import_jobs.add(job)
+    job.add_done_callback(_import_jobs.discard)
+    task_manager.register_running_task(task_id, job)
+
+    return {
+        "success": True,
+        "task_id": task_id,
+        "status": "running",
+        "total_count": len(rows),
+        "message": f"正在后台导入 {len(rows)} 条测试用例"
+    }
@@ -3,7 +3,7 @@
 """
 from typing import Any, List, Optional
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, object_session
 from sqlalchemy import or_, and_
 
 from app.database import get_db
@@ -14,6 +14,7 @@ from app.schemas.project import (
     ProjectDetail, ProjectListParams, ProjectListResponse
 )
 from app.schemas.user import ProjectMemberCreate, ProjectMember as ProjectMemberSchema
+from app.core.auth_cache import auth_cache
 from app.core.dependencies import get_current_active_user, get_current_admin_user
 
 router = APIRouter()
@@ -33,13 +34,10 @@ def check_project_permission(
     if user.role == UserRole.ADMIN:
         return True
     
-    # 检查项目成员权限
+    # 检查项目成员权限（成员角色取自认证缓存）
     if required_roles:
-        member = next(
-            (m for m in project.members if m.user_id == user.id),
-            None
-        )
-        if member and member.role in required_roles:
+        access = auth_cache.get_project_access(object_session(project), project.id)
+        if access and access.role_of(user.id) in required_roles:
             return True
     
     return False
@@ -331,6 +329,7 @@ def update_project(
     
     db.commit()
     db.refresh(project)
+    auth_cache.invalidate_project(project_id)
     
     return project
 
@@ -351,6 +350,7 @@ def delete_project_admin(
 
     db.delete(project)
     db.commit()
+    auth_cache.invalidate_project(project_id)
 
     return {"message": "项目删除成功"}
 
@@ -378,6 +378,7 @@ def delete_project(
     
     db.delete(project)
     db.commit()
+    auth_cache.invalidate_project(project_id)
     
     return {"message": "项目删除成功"}
 
@@ -429,6 +430,7 @@ def add_project_member_admin(
 
     db.add(db_member)
     db.commit()
+    auth_cache.invalidate_project(project_id)
     db.refresh(db_member)
 
     return db_member
@@ -488,6 +490,7 @@ def add_project_member(
     
     db.add(db_member)
     db.commit()
+    auth_cache.invalidate_project(project_id)
     db.refresh(db_member)
     
     return db_member
@@ -565,6 +568,7 @@ def remove_project_member_admin(
 
     db.delete(member)
     db.commit()
+    auth_cache.invalidate_project(project_id)
 
     return {"message": "成员移除成功"}
 
@@ -607,5 +611,6 @@ def remove_project_member(
     
     db.delete(member)
     db.commit()
+    auth_cache.invalidate_project(project_id)
     
     return {"message": "成员移除成功"}
@@ -1,14 +1,14 @@
 """
 需求文件和模块数据管理API
 """
-from typing import Any, List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, BackgroundTasks
+from typing import Any, List, Optional, Tuple
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, BackgroundTasks, Query
 from fastapi.responses import FileResponse
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.orm import Session, object_session
 from sqlalchemy import and_
 from pydantic import BaseModel, Field
 
-from app.database import get_db
+from app.database import db_write_queue, get_db
 from app.models.user import User, UserRole, ProjectRole
 from app.models.project import Project
 from app.models.module import Module
@@ -21,10 +21,15 @@ from app.schemas.requirement import (
     RequirementPoint as RequirementPointSchema,
     RequirementImage as RequirementImageSchema
 )
+from app.core.auth_cache import auth_cache
 from app.core.dependencies import get_current_active_user
-from app.utils.file_extractor import extract_text_from_file, extract_images_from_docx
+from app.core.logger import log_context
+from app.core.tracing import start_trace
+from app.services.extraction_service import extraction_service
+from app.utils.docx_outline import build_outline_sections, read_docx_outline
+from app.utils.file_extractor import extract_text_from_file
+from app.utils.file_storage import remove_stored_file, save_upload_file, FileTooLargeError
 import os
-import uuid
 from pathlib import Path
 import logging
 
@@ -36,7 +41,7 @@ UPLOAD_DIR = Path("uploads/requirements")
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 IMAGE_UPLOAD_DIR = Path("uploads/requirement_images")
 IMAGE_UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
-ALLOWED_EXTENSIONS = {".txt", ".docx", ".md"}
+ALLOWED_EXTENSIONS = {".txt", ".docx", ".md", ".pdf", ".xlsx"}
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
 
 
@@ -66,10 +71,10 @@ def check_project_permission(project: Project, user: User, required_roles: List[
        (hasattr(user.role, 'value') and user.role.value == "admin"):
         return True
     
-    # 检查项目成员权限
-    if required_roles and project.members:
-        member = next((m for m in project.members if m.user_id == user.id), None)
-        if member and member.role in required_roles:
+    # 检查项目成员权限（成员角色取自认证缓存）
+    if required_roles:
+        access = auth_cache.get_project_access(object_session(project), project.id)
+        if access and access.role_of(user.id) in required_roles:
             return True
     
     return False
@@ -77,6 +82,23 @@ def check_project_permission(project: Project, user: User, required_roles: List[
 
 # ========== 需求文件管理 ==========
 
+def _create_file_record(db: Session, **fields: Any) -> Tuple[int, bool]:
+    """创建需求文件记录，相同内容已解析过时直接复用解析结果和图片（写入队列工作单元）
+
+    与删除文件时的图片清理在同一写入队列中串行执行，确认图片存在与写入图片记录之间不会被删除。
+
+    Returns:
+        tuple[file_id, cached]: 文件记录ID，以及是否复用了已有解析结果
+    """
+    cached = extraction_service.find_cached(db, fields["content_hash"])
+    db_file = RequirementFile(**fields, is_extracted=False)
+    db.add(db_file)
+    db.flush()
+    if cached:
+        extraction_service.apply_result(db, db_file, cached)
+    return db_file.id, bool(cached)
+
+
 @router.post("/{project_id}/modules/{module_id}/requirements/files", response_model=RequirementFileSchema)
 async def upload_requirement_file(
     project_id: int,
@@ -90,7 +112,7 @@ async def upload_requirement_file(
     if not module:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="模块不存在或不属于该项目")
     
-    project = db.query(Project).options(joinedload(Project.members)).filter(Project.id == project_id).first()
+    project = db.query(Project).filter(Project.id == project_id).first()
     if not project:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="项目不存在")
     
@@ -102,67 +124,101 @@ async def upload_requirement_file(
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, 
                           detail=f"不支持的文件类型，支持：{', '.join(ALLOWED_EXTENSIONS)}")
     
-    if file.size > MAX_FILE_SIZE:
+    # 客户端声明的大小仅用于提前拒绝，实际大小在流式写入时校验
+    if file.size is not None and file.size > MAX_FILE_SIZE:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
                           detail=f"文件大小超过限制（最大 {MAX_FILE_SIZE // 1024 // 1024}MB）")
     
-    unique_filename = f"{uuid.uuid4()}{file_ext}"
-    file_path = UPLOAD_DIR / unique_filename
-    
     try:
-        content = await file.read()
-        with open(file_path, "wb") as f:
-            f.write(content)
+        stored = await save_upload_file(file, UPLOAD_DIR, file_ext, max_size=MAX_FILE_SIZE)
+    except FileTooLargeError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"文件保存失败: {str(e)}")
+    file_path = stored.path
     
     file_type_clean = file_ext.lstrip('.')
-    extracted_content, extract_error = extract_text_from_file(str(file_path), file_type_clean)
     
-    db_file = RequirementFile(
+    # 先保存文件记录，内容解析在进程池中异步完成；相同内容已解析过时直接复用解析结果和图片
+    file_id, cached = await db_write_queue.run(
+        _create_file_record,
         project_id=project_id,
         module_id=module_id,
         filename=file.filename,
         file_path=str(file_path),
-        file_size=len(content),
+        file_size=stored.size,
         file_type=file_type_clean,
-        uploaded_by=current_user.id,
-        extracted_content=extracted_content if not extract_error else None,
-        is_extracted=not bool(extract_error),
-        extract_error=extract_error
+        content_hash=stored.content_hash,
+        uploaded_by=current_user.id
     )
+    db_file = db.query(RequirementFile).filter(RequirementFile.id == file_id).first()
+    
+    if not cached:
+        # 图片按内容哈希存放，相同内容的文件共用同一组图片
+        image_output_dir = str(IMAGE_UPLOAD_DIR / stored.content_hash) if file_type_clean in ('docx', 'pdf') else None
+        extraction_service.submit(
+            db_file.id, str(file_path), file_type_clean, image_output_dir,
+            content_hash=stored.content_hash
+        )
     
-    db.add(db_file)
-    db.commit()
-    db.refresh(db_file)
+    return db_file
+
+
+@router.get("/{project_id}/requirements/files/{file_id}/extraction")
+async def get_requirement_file_extraction(
+    project_id: int,
+    file_id: int,
+    wait: float = Query(0, ge=0, le=30, description="等待解析完成的最长时间（秒）"),
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+) -> Any:
+    """获取需求文件的解析状态，可选择等待解析完成"""
+    project = db.query(Project).filter(Project.id == project_id).first()
+    if not project:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="项目不存在")
     
-    # 对于DOCX文件，提取图片
-    if file_type_clean == 'docx':
-        try:
-            image_output_dir = IMAGE_UPLOAD_DIR / str(db_file.id)
-            images, image_error = extract_images_from_docx(str(file_path), str(image_output_dir))
-            
-            if images and not image_error:
-                for img_info in images:
-                    db_image = RequirementImage(
-                        requirement_file_id=db_file.id,
-                        image_path=img_info['path'],
-                        image_format=img_info['format'],
-                        image_size=img_info['size'],
-                        position_index=img_info['position_index'],
-                        width=img_info.get('width'),
-                        height=img_info.get('height')
-                    )
-                    db.add(db_image)
-                
-                db_file.has_images = True
-                db_file.image_count = len(images)
-                db.commit()
-                db.refresh(db_file)
-        except Exception as e:
-            logger.error(f"处理DOCX图片时发生异常: {str(e)}")
+    if not check_project_permission(project, current_user, [ProjectRole.VIEWER, ProjectRole.MEMBER, ProjectRole.OWNER]):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="无权查看需求文件")
     
-    return db_file
+    exists = db.query(RequirementFile.id).filter(
+        RequirementFile.id == file_id,
+        RequirementFile.project_id == project_id
+    ).first()
+    if not exists:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="需求文件不存在")
+    
+    if wait > 0:
+        # 等待期间不占用连接和读事务：结束当前事务，连接归还连接池
+        db.rollback()
+        await extraction_service.wait(file_id, timeout=wait)
+    
+    # 解析结果由写入队列提交，重新查询以获得最新状态
+    db.expire_all()
+    req_file = db.query(RequirementFile).filter(RequirementFile.id == file_id).first()
+    if not req_file:
+        # 等待期间文件被删除
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="需求文件不存在")
+    
+    if req_file.is_extracted:
+        extraction_status = "completed"
+    elif req_file.extract_error:
+        extraction_status = "failed"
+    elif extraction_service.is_pending(file_id):
+        extraction_status = "processing"
+    else:
+        # 服务重启等原因导致解析任务丢失
+        extraction_status = "pending"
+    
+    return {
+        "file_id": file_id,
+        "status": extraction_status,
+        "is_extracted": req_file.is_extracted,
+        "extract_error": req_file.extract_error,
+        "has_images": req_file.has_images,
+        "image_count": req_file.image_count,
+        # 分页解析的 PDF 返回页数进度，其余为 None
+        "progress": extraction_service.get_progress(file_id)
+    }
 
 
 @router.get("/{project_id}/modules/{module_id}/requirements/files", response_model=List[RequirementFileSchema])
@@ -177,7 +233,7 @@ def list_requirement_files(
     if not module:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="模块不存在或不属于该项目")
     
-    project = db.query(Project).options(joinedload(Project.members)).filter(Project.id == project_id).first()
+    project = db.query(Project).filter(Project.id == project_id).first()
     if not project:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="项目不存在")
     
@@ -192,6 +248,13 @@ def list_requirement_files(
     return files
 
 
+def _release_stored_file(db: Session, file_path: str) -> None:
+    """删除不再被任何需求文件记录引用的存储文件（写入队列工作单元）"""
+    referenced = db.query(RequirementFile.id).filter(RequirementFile.file_path == file_path).first()
+    if not referenced:
+        remove_stored_file(Path(file_path))
+
+
 @router.delete("/{project_id}/modules/{module_id}/requirements/files/{file_id}")
 def delete_requirement_file(
     project_id: int,
@@ -216,14 +279,7 @@ def delete_requirement_file(
     if not req_file:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="需求文件不存在")
     
-    # 删除物理文件
-    try:
-        if os.path.exists(req_file.file_path):
-            os.remove(req_file.file_path)
-    except Exception as e:
-        logger.warning(f"删除物理文件失败: {e}")
-    
-    # 删除关联的图片文件和目录
+    # 删除旧版按文件ID存放的图片目录
     try:
         image_dir = IMAGE_UPLOAD_DIR / str(req_file.id)
         if image_dir.exists():
@@ -232,9 +288,18 @@ def delete_requirement_file(
     except Exception as e:
         logger.warning(f"删除图片目录失败: {e}")
     
+    image_paths = [img.image_path for img in req_file.images]
+    file_path = req_file.file_path
+    
     db.delete(req_file)
     db.commit()
     
+    # 记录删除提交后再删除物理文件：相同内容的文件共用存储，在写入队列中重新确认没有其他记录引用
+    db_write_queue.run_sync(_release_stored_file, file_path)
+    
+    # 删除不再被其他文件引用的共享图片，与上传时写入图片记录在同一写入队列中串行执行
+    db_write_queue.run_sync(extraction_service.release_images, image_paths)
+    
     return {"message": "需求文件删除成功"}
 
 
@@ -358,8 +423,8 @@ def get_requirement_file_content(
     if not req_file:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="需求文件不存在")
     
-    # 如果文件内容未提取，尝试重新提取
-    if not req_file.is_extracted and not req_file.extract_error:
+    # 如果文件内容未提取且没有正在进行的解析任务，尝试重新提取
+    if not req_file.is_extracted and not req_file.extract_error and not extraction_service.is_pending(file_id):
         if os.path.exists(req_file.file_path):
             file_ext = Path(req_file.filename).suffix.lower().lstrip('.')
             extracted_content, extract_error = extract_text_from_file(req_file.file_path, file_ext)
@@ -395,6 +460,48 @@ def get_requirement_file_content(
     )
 
 
+@router.get("/{project_id}/requirements/files/{file_id}/outline")
+def get_requirement_file_outline(
+    project_id: int,
+    file_id: int,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+) -> Any:
+    """获取 DOCX 需求文件的章节大纲
+
+    按文档顺序返回各章节的编号、标题、级别、直属内容及引用的图片序号，
+    图片序号与文件图片的 position_index + 1 对应。
+    """
+    project = db.query(Project).filter(Project.id == project_id).first()
+    if not project:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="项目不存在")
+    
+    if not check_project_permission(project, current_user, [ProjectRole.VIEWER, ProjectRole.MEMBER, ProjectRole.OWNER]):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="无权查看需求文件内容")
+    
+    req_file = db.query(RequirementFile).filter(
+        RequirementFile.id == file_id,
+        RequirementFile.project_id == project_id
+    ).first()
+    
+    if not req_file:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="需求文件不存在")
+    if req_file.file_type != 'docx':
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="仅支持 DOCX 文件的章节大纲")
+    if not os.path.exists(req_file.file_path):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="需求文件已被删除")
+    
+    try:
+        sections = build_outline_sections(read_docx_outline(req_file.file_path))
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"读取DOCX文件失败: {str(e)}")
+    
+    return {
+        "file_id": file_id,
+        "sections": sections
+    }
+
+
 
 # ========== 按模块管理需求点 ==========
 
@@ -747,12 +854,7 @@ async def generate_all_test_artifacts(
     task_id = task_manager.create_task("one_click_generation", total_batches=100)
     task_manager.start_task(task_id)
     
-    print(f"\n{'='*60}")
-    print(f"[一键生成] 任务已创建: {task_id}")
-    print(f"[一键生成] task_manager 实例 ID: {id(task_manager)}")
-    print(f"[一键生成] 当前所有任务: {list(task_manager._tasks.keys())}")
-    print(f"[一键生成] 任务数量: {len(task_manager._tasks)}")
-    print(f"{'='*60}\n")
+    logger.info("[一键生成] 任务已创建: %s", task_id)
     
     # 异步执行完整流程
     async def execute_pipeline():
@@ -760,21 +862,20 @@ async def generate_all_test_artifacts(
         from app.database import SessionLocal
         db_session = SessionLocal()
         try:
-            print(f"[一键生成] 开始执行后台任务: {task_id}")
-            service = AgentServiceReal(db=db_session)
-            await service.execute_full_generation_pipeline(
-                requirement_content=requirement_content,
-                file_id=file_id,
-                module_id=module_id,
-                user_id=current_user.id,
-                agent_ids=agent_ids,
-                image_paths=image_paths,
-                task_id=task_id
-            )
-        except Exception as e:
-            print(f"[一键生成] 后台任务执行失败: {e}")
-            import traceback
-            traceback.print_exc()
+            with log_context(task_id=task_id), start_trace(task_id, "one_click_generation", file_id=file_id):
+                logger.info("[一键生成] 开始执行后台任务")
+                service = AgentServiceReal(db=db_session)
+                await service.execute_full_generation_pipeline(
+                    requirement_content=requirement_content,
+                    file_id=file_id,
+                    module_id=module_id,
+                    user_id=current_user.id,
+                    agent_ids=agent_ids,
+                    image_paths=image_paths,
+                    task_id=task_id
+                )
+        except Exception:
+            logger.exception("[一键生成] 后台任务执行失败: %s", task_id)
         finally:
             db_session.close()
     
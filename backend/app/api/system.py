@@ -2,7 +2,9 @@
 系统信息和健康检查API
 """
 from typing import Any
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 
@@ -11,6 +13,9 @@ from app.models.user import User, UserRole
 from app.models.project import Project
 from app.models.ai_config import AIModel, Agent
 from app.core.dependencies import get_current_admin_user
+from app.core.profiler import ProfilerBusyError, sample_stacks, snapshot_allocations, to_collapsed
+from app.core.query_profiler import query_profiler
+from app.core.startup import startup_timer
 from app.config import settings
 
 router = APIRouter()
@@ -93,6 +98,79 @@ def system_stats(
     }
 
 
+@router.get("/stats/queries")
+def query_stats(
+    limit: int = Query(20, ge=1, le=200, description="每类返回的条数"),
+    admin_user: User = Depends(get_current_admin_user)
+) -> Any:
+    """SQL 查询分析（管理员专用）
+
+    返回自启动（或上次重置）以来的慢查询、单次请求内重复执行的语句（疑似 N+1）
+    以及平均查询数最多的路由
+    """
+    return query_profiler.snapshot(limit)
+
+
+@router.delete("/stats/queries")
+def reset_query_stats(
+    admin_user: User = Depends(get_current_admin_user)
+) -> Any:
+    """重置 SQL 查询分析数据（管理员专用）"""
+    query_profiler.reset()
+    return {"message": "查询统计已重置"}
+
+
+@router.get("/stats/startup")
+def startup_stats(
+    admin_user: User = Depends(get_current_admin_user)
+) -> Any:
+    """启动耗时（管理员专用）
+
+    返回启动预算、可处理请求时的总耗时、各阶段（导入、建表、初始化数据）耗时和后台预热各项耗时
+    """
+    return startup_timer.snapshot()
+
+
+@router.get("/profile/cpu")
+async def profile_cpu(
+    seconds: float = Query(10, gt=0, le=60, description="采样时长（秒）"),
+    interval_ms: float = Query(10, ge=1, le=1000, description="采样间隔（毫秒）"),
+    include_idle: bool = Query(False, description="是否包含空闲等待中的线程栈"),
+    format: str = Query("collapsed", pattern="^(collapsed|json)$", description="输出格式"),
+    admin_user: User = Depends(get_current_admin_user)
+) -> Any:
+    """采样当前进程所有线程的调用栈（管理员专用）
+
+    覆盖事件循环线程和线程池工作线程。collapsed 格式每行为“线程;函数;...;函数 次数”，
+    可直接交给 flamegraph.pl 或 speedscope 生成火焰图；json 格式额外返回按自身采样数排序的热点函数。
+    """
+    try:
+        result = await run_in_threadpool(sample_stacks, seconds, interval_ms / 1000, include_idle)
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if format == "collapsed":
+        return PlainTextResponse(to_collapsed(result["stacks"]))
+    return result
+
+
+@router.get("/profile/memory")
+async def profile_memory(
+    seconds: float = Query(10, gt=0, le=120, description="统计时长（秒）"),
+    top: int = Query(20, ge=1, le=200, description="返回的条数"),
+    key_type: str = Query("lineno", pattern="^(lineno|filename|traceback)$", description="汇总方式"),
+    admin_user: User = Depends(get_current_admin_user)
+) -> Any:
+    """统计一段时间内的内存分配热点（管理员专用）
+
+    使用 tracemalloc 对比开始和结束时的快照，返回新增最多和占用最多的分配位置；
+    统计期间分配会变慢，请控制时长。
+    """
+    try:
+        return await run_in_threadpool(snapshot_allocations, seconds, top, key_type)
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
 @router.get("/database/tables")
 def database_tables(
     admin_user: User = Depends(get_current_admin_user),
@@ -19,7 +19,22 @@ class Settings(BaseSettings):
         default="sqlite:///./autotestcase.db",
         description="数据库连接URL"
     )
-    
+
+    # 数据库连接池配置
+    db_pool_size: int = Field(default=10, description="连接池常驻连接数")
+    db_max_overflow: int = Field(default=20, description="连接池允许的额外连接数")
+    db_pool_timeout: int = Field(default=30, description="获取连接的等待超时（秒）")
+    db_pool_recycle: int = Field(default=3600, description="连接回收时间（秒），-1 表示不回收")
+    db_executor_workers: int = Field(default=8, description="异步代码中执行数据库操作的线程数，应不大于连接池大小")
+
+    # SQLite 调优配置（仅在 SQLite 下生效）
+    sqlite_journal_mode: str = Field(default="WAL", description="日志模式：WAL 允许读写并发")
+    sqlite_synchronous: str = Field(default="NORMAL", description="同步级别：WAL 下 NORMAL 兼顾安全与性能")
+    sqlite_busy_timeout: int = Field(default=5000, description="锁等待超时（毫秒）")
+    sqlite_cache_size: int = Field(default=-64000, description="页缓存大小，负数表示 KiB（-64000 ≈ 64MB）")
+    sqlite_mmap_size: int = Field(default=256 * 1024 * 1024, description="内存映射大小（字节），0 表示禁用")
+    sqlite_single_writer: bool = Field(default=True, description="后台写入是否经由单写线程串行执行")
+
     # JWT认证配置
     secret_key: str = Field(
         default="your-secret-key-change-in-production",
@@ -27,17 +42,33 @@ class Settings(BaseSettings):
     )
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30 * 24 * 60  # 30天
+    auth_cache_ttl_seconds: int = Field(default=30, description="认证缓存（用户、项目成员角色）的有效期（秒），0 表示不缓存")
+    auth_cache_size: int = Field(default=2048, description="认证缓存的最大条目数")
     
     # 文件上传配置
     upload_dir: str = "./uploads"
     max_file_size: int = 50 * 1024 * 1024  # 50MB
     allowed_file_types: list = [".docx", ".pdf", ".xlsx", ".txt"]
+    extraction_max_workers: int = Field(default=0, description="文档解析进程数，0 表示按 CPU 核数自动设置")
+    pdf_parallel_min_pages: int = Field(default=20, description="PDF 页数达到该值时按页分块并行解析")
+    pdf_pages_per_chunk: int = Field(default=10, description="PDF 并行解析时每个分块的页数")
+    export_cache_ttl_hours: int = Field(default=24, description="导出文件缓存保留时间（小时）")
+    task_result_inline_kb: int = Field(default=64, description="任务结果超过该大小（KB）时压缩写入磁盘，内存中只保留摘要")
+    task_result_ttl_hours: int = Field(default=24, description="已结束任务及其结果的保留时间（小时）")
+    task_result_max_finished: int = Field(default=500, description="内存中最多保留的已结束任务数，超出时清理最早结束的任务")
+    task_cleanup_interval_seconds: int = Field(default=300, description="清理已结束任务的间隔（秒）")
+    image_max_edge: int = Field(default=1568, description="需求文档图片最大边长（像素），0 表示不缩放")
+    image_jpeg_quality: int = Field(default=85, description="需求文档图片重新压缩的 JPEG 质量")
     
     # AI模型配置
     default_ai_provider: str = "openai"
     default_model: str = "gpt-3.5-turbo"
     ai_request_timeout: int = 60
     max_tokens: int = 2000
+    ai_stream_include_usage: bool = Field(default=False, description="流式调用时请求返回 token 用量（需接口支持 stream_options）")
+    multimodal_image_detail: str = Field(default="high", description="多模态调用的图片精度（high/low/auto）")
+    multimodal_image_token_budget: int = Field(default=20000, description="单次多模态调用的图片 token 预算，0 表示不限制")
+    multimodal_image_cache_mb: int = Field(default=64, description="图片编码缓存上限（MB）")
     temperature: float = 0.7
 
     # OpenAI API配置
@@ -75,6 +106,23 @@ class Settings(BaseSettings):
     # 日志配置
     log_level: str = "INFO"
     log_file: Optional[str] = None
+    log_format: str = Field(default="text", description="日志格式（text/json）")
+    log_sample_every: int = Field(default=20, description="高频日志的抽样间隔（每 N 条输出 1 条）")
+    
+    # 运行指标
+    metrics_enabled: bool = Field(default=True, description="是否在 /metrics 输出运行指标")
+    tracing_enabled: bool = Field(default=True, description="是否记录后台任务的链路追踪")
+    trace_max_spans: int = Field(default=5000, description="单个任务追踪最多记录的 span 数")
+    slow_query_ms: float = Field(default=200, description="慢查询阈值（毫秒），超过时记录语句、参数和调用位置")
+    n_plus_one_threshold: int = Field(default=20, description="单次请求内同一语句执行次数达到该值时视为疑似 N+1")
+
+    # 启动
+    startup_budget_ms: int = Field(default=1000, description="启动耗时预算（毫秒），导入与初始化超过该值时输出警告")
+    startup_warmup: bool = Field(default=True, description="启动完成后是否在后台预热（导入较慢的依赖、生成接口文档）")
+    startup_preload_modules: list = Field(
+        default=["jose.jwt", "httpx", "openpyxl", "PIL.Image", "PyPDF2"],
+        description="后台预热时导入的模块"
+    )
     
     class Config:
         env_file = ".env"
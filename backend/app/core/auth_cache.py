@@ -0,0 +1,150 @@
+"""
+认证缓存
+缓存已认证用户的基本信息和项目的所有者/成员角色，命中时鉴权不再查询数据库。
+缓存只在当前进程内有效，修改用户状态、角色和项目成员的接口会主动失效对应条目；
+多进程部署时其他进程的条目最迟在 TTL 到期后刷新
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.session import make_transient_to_detached
+
+from app.config import settings
+from app.models.project import Project
+from app.models.user import ProjectMember, ProjectRole, User
+
+
+@dataclass(frozen=True)
+class ProjectAccess:
+    """项目的权限信息：所有者和各成员的角色"""
+    project_id: int
+    owner_id: int
+    roles: Dict[int, ProjectRole] = field(default_factory=dict)
+
+    def role_of(self, user_id: int) -> Optional[ProjectRole]:
+        """用户在项目中的角色，所有者返回 OWNER，非成员返回 None"""
+        if self.owner_id == user_id:
+            return ProjectRole.OWNER
+        return self.roles.get(user_id)
+
+
+class TTLCache:
+    """带过期时间的 LRU 缓存"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._entries: "OrderedDict[Any, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Any) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: Any, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self._ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+
+    def pop(self, key: Any) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def discard_if(self, predicate: Callable[[Any], bool]) -> None:
+        """删除值满足条件的条目"""
+        with self._lock:
+            for key in [key for key, (_, value) in self._entries.items() if predicate(value)]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class AuthCache:
+    """用户与项目权限缓存
+
+    用户缓存保存列值快照，命中时构造实例并以 ``merge(load=False)`` 挂到当前会话，
+    接口中对 current_user 的修改和提交照常生效。加载期间发生失效时不写入缓存，避免旧数据回填。
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.enabled = ttl > 0
+        self._users = TTLCache(maxsize, ttl)
+        self._projects = TTLCache(maxsize, ttl)
+        self._generation = 0
+        self._columns = [column.key for column in User.__table__.columns]
+
+    def get_user(self, db: Session, user_id: int) -> Optional[User]:
+        """获取用户（不存在时返回 None）"""
+        if not self.enabled:
+            return db.query(User).filter(User.id == user_id).first()
+
+        values = self._users.get(user_id)
+        if values is not None:
+            user = User(**values)
+            make_transient_to_detached(user)
+            return db.merge(user, load=False)
+
+        generation = self._generation
+        user = db.query(User).filter(User.id == user_id).first()
+        if user is not None and generation == self._generation:
+            self._users.set(user_id, {key: getattr(user, key) for key in self._columns})
+        return user
+
+    def get_project_access(self, db: Session, project_id: int) -> Optional[ProjectAccess]:
+        """获取项目的权限信息（项目不存在时返回 None）"""
+        access = self._projects.get(project_id) if self.enabled else None
+        if access is not None:
+            return access
+
+        generation = self._generation
+        row = db.query(Project.owner_id).filter(Project.id == project_id).first()
+        if row is None:
+            return None
+        members = db.query(ProjectMember.user_id, ProjectMember.role).filter(
+            ProjectMember.project_id == project_id
+        ).all()
+        access = ProjectAccess(project_id, row.owner_id, {user_id: role for user_id, role in members})
+        if self.enabled and generation == self._generation:
+            self._projects.set(project_id, access)
+        return access
+
+    def invalidate_user(self, user_id: int) -> None:
+        """用户信息、状态或角色变化后调用；同时失效该用户所在项目的权限信息"""
+        self._generation += 1
+        self._users.pop(user_id)
+        self._projects.discard_if(lambda access: access.owner_id == user_id or user_id in access.roles)
+
+    def invalidate_project(self, project_id: int) -> None:
+        """项目所有者或成员变化、项目删除后调用"""
+        self._generation += 1
+        self._projects.pop(project_id)
+
+    def clear(self) -> None:
+        self._generation += 1
+        self._users.clear()
+        self._projects.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"users": len(self._users), "projects": len(self._projects)}
+
+
+# 全局认证缓存实例
+auth_cache = AuthCache(maxsize=settings.auth_cache_size, ttl=settings.auth_cache_ttl_seconds)
@@ -8,6 +8,7 @@ from sqlalchemy.orm import Session
 
 from app.database import get_db
 from app.models.user import User, UserRole
+from app.core.auth_cache import auth_cache
 from app.core.security import verify_token
 
 # HTTP Bearer认证
@@ -19,21 +20,20 @@ def get_current_user(
     db: Session = Depends(get_db)
 ) -> User:
     """获取当前认证用户"""
-    print(f"[DEBUG] 收到认证请求，credentials: {credentials}")
-
     token = credentials.credentials
-    print(f"[DEBUG] 提取的token: {token[:20]}..." if token else "[DEBUG] token为空")
 
     payload = verify_token(token)
 
-    user_id: int = payload.get("sub")
-    if user_id is None:
+    user_id = payload.get("sub")
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="无效的认证令牌",
         )
 
-    user = db.query(User).filter(User.id == user_id).first()
+    user = auth_cache.get_user(db, user_id)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -84,16 +84,13 @@ def get_optional_current_user(
     try:
         token = credentials.credentials
         payload = verify_token(token)
-        user_id: int = payload.get("sub")
-        
-        if user_id is None:
-            return None
+        user_id = int(payload.get("sub"))
         
-        user = db.query(User).filter(User.id == user_id).first()
+        user = auth_cache.get_user(db, user_id)
         if user and user.is_active:
             return user
         
-    except HTTPException:
+    except (HTTPException, TypeError, ValueError):
         pass
     
     return None
@@ -0,0 +1,162 @@
+"""
+日志配置
+应用日志统一经由队列异步输出，调用方只负责把日志记录放入队列，
+控制台和文件写入在独立的监听线程中完成；task_id/batch_id 等上下文通过 contextvars 传递
+"""
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional
+
+from app.config import settings
+
+
+# 应用日志器名称，各模块使用 logging.getLogger(__name__) 即可归入其下
+APP_LOGGER_NAME = "app"
+
+# 当前日志上下文（如 task_id、batch_id），随协程和 asyncio 任务自动传递
+_log_context: ContextVar[Dict[str, Any]] = ContextVar("log_context", default={})
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_setup_lock = threading.Lock()
+
+
+@contextmanager
+def log_context(**fields: Any) -> Iterator[None]:
+    """在代码块内为日志附加上下文字段，嵌套时合并外层字段
+
+    用法::
+
+        with log_context(task_id=task_id):
+            logger.info("开始执行")
+    """
+    token = _log_context.set({**_log_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _log_context.reset(token)
+
+
+def get_log_context() -> Dict[str, Any]:
+    """获取当前日志上下文"""
+    return dict(_log_context.get())
+
+
+class ContextFilter(logging.Filter):
+    """把当前日志上下文写入日志记录（在调用方线程中执行）"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = _log_context.get()
+        record.context = context
+        record.context_text = "".join(f" {key}={value}" for key, value in context.items())
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出为一行 JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            **getattr(record, "context", {}),
+        }
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+TEXT_FORMAT = "%(asctime)s %(levelname)-7s %(name)s - %(message)s%(context_text)s"
+
+
+class _Sampler:
+    """按键计数，每 N 次放行一次"""
+
+    def __init__(self):
+        self._counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def should_log(self, key: str, every: int) -> bool:
+        if every <= 1:
+            return True
+        with self._lock:
+            count = self._counts.get(key, 0)
+            self._counts[key] = count + 1
+        return count % every == 0
+
+
+_sampler = _Sampler()
+
+
+def log_sampled(logger: logging.Logger, level: int, key: str, msg: str, *args: Any, every: Optional[int] = None) -> None:
+    """抽样输出高频日志（如逐条用例的进度），同一 key 每 every 条输出一条，第一条总会输出
+
+    Args:
+        logger: 日志器
+        level: 日志级别
+        key: 抽样计数的键
+        msg: 日志消息（%-格式）
+        every: 抽样间隔，默认使用配置 ``log_sample_every``
+    """
+    if not logger.isEnabledFor(level):
+        return
+    if _sampler.should_log(key, every if every is not None else settings.log_sample_every):
+        logger.log(level, msg, *args, stacklevel=2)
+
+
+def _build_formatter() -> logging.Formatter:
+    if settings.log_format.lower() == "json":
+        return JsonFormatter()
+    return logging.Formatter(TEXT_FORMAT)
+
+
+def setup_logging() -> None:
+    """配置应用日志（幂等）
+
+    ``app`` 日志器的级别取自 ``settings.log_level``，日志记录经 QueueHandler 放入队列，
+    由 QueueListener 线程写到标准输出，配置了 ``settings.log_file`` 时同时写入滚动日志文件。
+    """
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return
+
+        formatter = _build_formatter()
+        handlers = []
+        console = logging.StreamHandler(sys.stdout)
+        console.setFormatter(formatter)
+        handlers.append(console)
+        if settings.log_file:
+            file_handler = logging.handlers.RotatingFileHandler(
+                settings.log_file, maxBytes=20 * 1024 * 1024, backupCount=5, encoding="utf-8"
+            )
+            file_handler.setFormatter(formatter)
+            handlers.append(file_handler)
+
+        log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        queue_handler = logging.handlers.QueueHandler(log_queue)
+        queue_handler.addFilter(ContextFilter())
+
+        app_logger = logging.getLogger(APP_LOGGER_NAME)
+        app_logger.setLevel(settings.log_level.upper())
+        app_logger.handlers = [queue_handler]
+        app_logger.propagate = False
+
+        _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+
+
+def shutdown_logging() -> None:
+    """停止日志监听线程，输出队列中剩余的日志"""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
@@ -0,0 +1,302 @@
+"""
+运行指标
+轻量的计数器、仪表盘和直方图实现，以 Prometheus 文本格式在 /metrics 输出，
+覆盖 AI 调用、异步任务、HTTP 请求和数据库访问
+"""
+import math
+import threading
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+# 当前 AI 调用所属的智能体名称，由智能体服务设置，AI 服务记录指标时读取
+current_agent: ContextVar[str] = ContextVar("current_agent", default="")
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    """指标基类，按标签值组合保存样本"""
+
+    metric_type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"指标 {self.name} 的标签应为 {self.labelnames}，实际为 {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.metric_type}",
+        ]
+        lines.extend(self._samples())
+        return lines
+
+
+class Counter(_Metric):
+    """只增计数器"""
+
+    metric_type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        if amount < 0:
+            raise ValueError("计数器只能增加")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> Iterable[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Gauge(_Metric):
+    """可增可减的仪表盘，也可以设置取值函数在输出时读取当前值"""
+
+    metric_type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """设置取值函数（仅用于无标签的仪表盘）"""
+        self._function = function
+
+    def _samples(self) -> Iterable[str]:
+        if self._function is not None:
+            try:
+                value = float(self._function())
+            except Exception:
+                value = math.nan
+            yield f"{self.name} {_format_value(value)}"
+            return
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    """直方图，按桶统计观测值的分布"""
+
+    metric_type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # 标签值 -> [各桶计数（非累计）, 总和, 总数]
+        self._values: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = next(i for i, bound in enumerate(self.buckets) if value <= bound)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _samples(self) -> Iterable[str]:
+        with self._lock:
+            items = sorted((key, ([*state[0]], state[1], state[2])) for key, state in self._values.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {count}"
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"指标 {metric.name} 已注册")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = ()) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """以 Prometheus 文本格式输出全部指标"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# 全局指标注册表
+registry = MetricsRegistry()
+
+# Prometheus 文本格式的 Content-Type
+CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+LLM_BUCKETS = (0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+TTFT_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60)
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+TASK_BUCKETS = (1, 5, 10, 30, 60, 120, 300, 600, 1200, 1800, 3600)
+
+# AI 调用
+LLM_REQUESTS = registry.counter(
+    "llm_requests_total", "AI 调用次数（单次调用，不含重试）", ("model", "agent", "status"))
+LLM_REQUEST_DURATION = registry.histogram(
+    "llm_request_duration_seconds", "AI 单次调用耗时", ("model", "agent"), LLM_BUCKETS)
+LLM_TTFT = registry.histogram(
+    "llm_time_to_first_token_seconds", "AI 流式调用首个内容块的等待时间", ("model", "agent"), TTFT_BUCKETS)
+LLM_RETRIES = registry.counter(
+    "llm_retries_total", "AI 调用重试次数", ("agent", "reason"))
+LLM_TIMEOUTS = registry.counter(
+    "llm_timeouts_total", "AI 调用超时次数", ("agent",))
+LLM_JSON_PARSE_FAILURES = registry.counter(
+    "llm_json_parse_failures_total", "AI 响应 JSON 解析失败次数", ("agent",))
+LLM_TOKENS = registry.counter(
+    "llm_tokens_total", "AI 调用消耗的 token 数（仅统计接口返回 usage 的调用）", ("model", "agent", "direction"))
+
+# 异步任务
+TASK_QUEUE_DEPTH = registry.gauge("task_queue_depth", "等待执行的异步任务数")
+TASKS_RUNNING = registry.gauge("tasks_running", "正在执行的异步任务数")
+TASKS_FINISHED = registry.counter(
+    "tasks_finished_total", "结束的异步任务数", ("task_type", "status"))
+TASK_DURATION = registry.histogram(
+    "task_duration_seconds", "异步任务从开始到结束的耗时", ("task_type", "status"), TASK_BUCKETS)
+
+# HTTP 请求
+HTTP_REQUESTS = registry.counter(
+    "http_requests_total", "HTTP 请求数", ("method", "route", "status"))
+HTTP_REQUEST_DURATION = registry.histogram(
+    "http_request_duration_seconds", "HTTP 请求耗时", ("method", "route"), HTTP_BUCKETS)
+
+# 数据库
+DB_QUERY_DURATION = registry.histogram(
+    "db_query_duration_seconds", "SQL 语句执行耗时", ("operation",), DB_BUCKETS)
+DB_WRITE_QUEUE_PENDING = registry.gauge("db_write_queue_pending", "写入队列中等待或正在执行的工作单元数")
+
+
+def route_template(scope) -> str:
+    """请求匹配到的路由模板（如 ``/api/projects/{project_id}``），未匹配任何路由时返回 ``unmatched``
+
+    模板取自路由匹配时写入的 ``scope["route"].path_format``。较新版本的 FastAPI 中，
+    include_router 注册的路由模板不含路由前缀，此时前缀取自请求路径中模板匹配部分之前的固定段
+    （本项目的路由前缀都不含路径参数），标签值不会随路径参数变化。
+    """
+    route = scope.get("route")
+    template = getattr(route, "path_format", None)
+    if template is None:
+        return "unmatched"
+    path = scope.get("path", "")
+    regex = getattr(route, "path_regex", None)
+    if regex is None or regex.match(path):
+        return template
+    segments = path.split("/")
+    for index in range(2, len(segments) + 1):
+        # 前缀下的根路由（如 ``/api/projects``）模板为空，匹配空后缀
+        suffix = "/" + "/".join(segments[index:]) if index < len(segments) else ""
+        if regex.match(suffix):
+            return "/".join(segments[:index]) + template
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """记录每个请求的耗时和状态码
+
+    路由标签使用路由模板，避免标签值随路径参数膨胀。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = route_template(scope)
+            method = scope.get("method", "")
+            HTTP_REQUESTS.inc(method=method, route=route, status=str(status_code))
+            HTTP_REQUEST_DURATION.observe(time.perf_counter() - started, method=method, route=route)
@@ -0,0 +1,163 @@
+"""
+运行时性能剖析
+在不重启进程的情况下采样各线程（事件循环线程、线程池工作线程等）的调用栈，
+输出可直接生成火焰图的折叠栈（collapsed stack）格式；并用 tracemalloc 统计一段时间内的内存分配热点
+"""
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 同一时刻只允许一个剖析任务，避免叠加开销
+_profile_lock = threading.Lock()
+
+# 栈顶为这些函数时视为线程空闲（等待事件、锁或队列），默认不计入结果
+_IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+    ("socket.py", "accept"),
+    ("handlers.py", "dequeue"),
+}
+
+
+class ProfilerBusyError(RuntimeError):
+    """已有剖析任务在运行"""
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _is_idle(frame) -> bool:
+    return (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in _IDLE_LEAVES
+
+
+def _collapse(frame, thread_name: str, max_depth: int) -> str:
+    labels = []
+    while frame is not None and len(labels) < max_depth:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.append(thread_name)
+    labels.reverse()
+    return ";".join(labels)
+
+
+def _sample_loop(duration: float, interval: float, include_idle: bool, max_depth: int) -> Tuple[Counter, int]:
+    own_ident = threading.get_ident()
+    stacks: Counter = Counter()
+    samples = 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident or (not include_idle and _is_idle(frame)):
+                continue
+            stacks[_collapse(frame, names.get(ident, f"thread-{ident}"), max_depth)] += 1
+        samples += 1
+        time.sleep(interval)
+    return stacks, samples
+
+
+def sample_stacks(
+    duration: float,
+    interval: float = 0.01,
+    include_idle: bool = False,
+    max_depth: int = 64
+) -> Dict[str, Any]:
+    """在当前线程中按固定间隔采样所有线程的调用栈（阻塞 duration 秒，应在线程池中调用）
+
+    Args:
+        duration: 采样时长（秒）
+        interval: 采样间隔（秒）
+        include_idle: 是否包含空闲（等待中）的线程栈
+        max_depth: 每个栈最多保留的帧数（从栈顶算起）
+
+    Returns:
+        包含 samples、stacks（折叠栈 -> 次数）和 top_functions（按自身采样数）的字典
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusyError("已有剖析任务在运行")
+    try:
+        started = time.perf_counter()
+        stacks, samples = _sample_loop(duration, interval, include_idle, max_depth)
+        elapsed = time.perf_counter() - started
+    finally:
+        _profile_lock.release()
+
+    self_counts: Counter = Counter()
+    for stack, count in stacks.items():
+        self_counts[stack.rsplit(";", 1)[-1]] += count
+    logger.info(f"🔬 调用栈采样完成: {samples} 次采样，{len(stacks)} 个不同调用栈，耗时 {elapsed:.1f}s")
+    return {
+        "duration": round(elapsed, 3),
+        "interval": interval,
+        "samples": samples,
+        "stacks": dict(stacks.most_common()),
+        "top_functions": [{"function": name, "samples": count} for name, count in self_counts.most_common(30)],
+    }
+
+
+def to_collapsed(stacks: Dict[str, int]) -> str:
+    """转为折叠栈文本（每行“栈 次数”），可直接交给 flamegraph.pl / speedscope"""
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.items())
+
+
+def _format_stat(stat, trace_frames: int) -> Dict[str, Any]:
+    size_diff = getattr(stat, "size_diff", None)
+    item = {
+        "location": [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback[:trace_frames]],
+        "size_kb": round(stat.size / 1024, 1),
+        "count": stat.count,
+    }
+    if size_diff is not None:
+        item["size_diff_kb"] = round(size_diff / 1024, 1)
+        item["count_diff"] = stat.count_diff
+    return item
+
+
+def snapshot_allocations(duration: float, top: int = 20, key_type: str = "lineno", nframe: int = 10) -> Dict[str, Any]:
+    """统计 duration 秒内的内存分配热点（阻塞调用，应在线程池中调用）
+
+    tracemalloc 未开启时临时开启，结束后关闭；返回期间新增最多的分配位置和当前占用最多的位置。
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusyError("已有剖析任务在运行")
+    started_here = not tracemalloc.is_tracing()
+    try:
+        if started_here:
+            tracemalloc.start(nframe)
+        filters = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ]
+        before = tracemalloc.take_snapshot().filter_traces(filters)
+        time.sleep(duration)
+        after = tracemalloc.take_snapshot().filter_traces(filters)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        if started_here:
+            tracemalloc.stop()
+        _profile_lock.release()
+
+    trace_frames = nframe if key_type == "traceback" else 1
+    growth = [stat for stat in after.compare_to(before, key_type) if stat.size_diff > 0]
+    logger.info(f"🔬 内存分配采样完成: {duration:.1f}s，{len(growth)} 处分配增长")
+    return {
+        "duration": duration,
+        "key_type": key_type,
+        "tracing_started_for_snapshot": started_here,
+        "traced_current_mb": round(current / 1024 / 1024, 2),
+        "traced_peak_mb": round(peak / 1024 / 1024, 2),
+        "growth": [_format_stat(stat, trace_frames) for stat in growth[:top]],
+        "largest": [_format_stat(stat, trace_frames) for stat in after.statistics(key_type)[:top]],
+    }
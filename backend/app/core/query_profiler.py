@@ -0,0 +1,220 @@
+"""
+SQL 查询分析
+按请求统计 SQL 查询数和数据库耗时，记录慢查询（含绑定参数和调用位置），
+并汇总慢查询、单次请求内重复执行的语句（N+1）以及查询数最多的路由，供管理员接口查看
+"""
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+from app.config import settings
+from app.core.metrics import route_template
+
+logger = logging.getLogger(__name__)
+
+# 调用位置只取应用代码，跳过数据库层和本模块的帧
+_APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_SKIP_FILES = {
+    os.path.join(_APP_DIR, "database.py"),
+    os.path.abspath(__file__),
+}
+
+# 各汇总表最多保留的条目数
+MAX_ENTRIES = 500
+
+_WHITESPACE = re.compile(r"\s+")
+_IN_LIST = re.compile(r"\((?:\s*\?\s*,)+\s*\?\s*\)")
+
+
+def normalize_statement(statement: str) -> str:
+    """归一化 SQL 语句：压缩空白，IN 列表的占位符合并为一个，便于按语句汇总"""
+    return _IN_LIST.sub("(?...)", _WHITESPACE.sub(" ", statement).strip())
+
+
+def _call_site() -> str:
+    """返回触发查询的应用代码位置（文件:行号 函数名）"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(_APP_DIR) and filename not in _SKIP_FILES:
+            return f"{os.path.relpath(filename, os.path.dirname(_APP_DIR))}:{frame.f_lineno} {frame.f_code.co_name}"
+        frame = frame.f_back
+    return "unknown"
+
+
+def _format_parameters(parameters: Any, executemany: bool) -> str:
+    if executemany and isinstance(parameters, (list, tuple)):
+        text = f"{len(parameters)} 组参数，首组 {parameters[0]!r}" if parameters else "[]"
+    else:
+        text = repr(parameters)
+    return text if len(text) <= 300 else text[:300] + "..."
+
+
+class RequestQueryStats:
+    """单个请求内的查询统计"""
+
+    __slots__ = ("count", "db_ms", "statements")
+
+    def __init__(self):
+        self.count = 0
+        self.db_ms = 0.0
+        self.statements: Dict[str, int] = {}
+
+
+_request_stats: ContextVar[Optional[RequestQueryStats]] = ContextVar("request_query_stats", default=None)
+
+
+class QueryProfiler:
+    """查询统计汇总
+
+    数据库引擎的 after_cursor_execute 事件调用 ``record``；请求内的统计保存在 contextvars 中，
+    同步接口在线程池中执行时也会复制请求上下文，因此查询会计入发起它的请求。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._slow: Dict[str, Dict[str, Any]] = {}      # 语句 + 调用位置 -> 慢查询汇总
+        self._repeated: Dict[str, Dict[str, Any]] = {}  # 路由 + 语句 -> 单次请求内重复执行的汇总
+        self._routes: Dict[str, Dict[str, Any]] = {}    # 路由 -> 查询数汇总
+        self.started_at = time.time()
+
+    def record(self, statement: str, parameters: Any, duration: float, executemany: bool) -> None:
+        duration_ms = duration * 1000
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.count += 1
+            stats.db_ms += duration_ms
+            key = normalize_statement(statement)
+            stats.statements[key] = stats.statements.get(key, 0) + 1
+        if duration_ms >= settings.slow_query_ms:
+            self._record_slow(statement, parameters, duration_ms, executemany)
+
+    def _record_slow(self, statement: str, parameters: Any, duration_ms: float, executemany: bool) -> None:
+        site = _call_site()
+        params = _format_parameters(parameters, executemany)
+        normalized = normalize_statement(statement)
+        logger.warning(f"🐢 慢查询 {duration_ms:.1f}ms @ {site}: {normalized[:500]} | 参数: {params}")
+        with self._lock:
+            item = self._slow.get(normalized + site)
+            if item is None:
+                if len(self._slow) >= MAX_ENTRIES:
+                    self._evict(self._slow, "total_ms")
+                item = self._slow[normalized + site] = {
+                    "statement": normalized, "call_site": site,
+                    "count": 0, "total_ms": 0.0, "max_ms": 0.0, "last_parameters": params,
+                }
+            item["count"] += 1
+            item["total_ms"] += duration_ms
+            if duration_ms >= item["max_ms"]:
+                item["max_ms"] = duration_ms
+                item["last_parameters"] = params
+
+    def record_request(self, route: str, stats: RequestQueryStats) -> None:
+        """请求结束时汇总路由的查询数，并记录单次请求内重复执行的语句"""
+        repeated = [(statement, count) for statement, count in stats.statements.items()
+                    if count >= settings.n_plus_one_threshold]
+        with self._lock:
+            item = self._routes.get(route)
+            if item is None:
+                if len(self._routes) >= MAX_ENTRIES:
+                    self._evict(self._routes, "total_queries")
+                item = self._routes[route] = {
+                    "route": route, "requests": 0, "total_queries": 0, "max_queries": 0, "total_db_ms": 0.0,
+                }
+            item["requests"] += 1
+            item["total_queries"] += stats.count
+            item["max_queries"] = max(item["max_queries"], stats.count)
+            item["total_db_ms"] += stats.db_ms
+
+            for statement, count in repeated:
+                entry = self._repeated.get(route + statement)
+                if entry is None:
+                    if len(self._repeated) >= MAX_ENTRIES:
+                        self._evict(self._repeated, "max_per_request")
+                    entry = self._repeated[route + statement] = {
+                        "route": route, "statement": statement, "requests": 0, "max_per_request": 0,
+                    }
+                entry["requests"] += 1
+                entry["max_per_request"] = max(entry["max_per_request"], count)
+
+        for statement, count in repeated:
+            logger.warning(f"🔁 疑似 N+1: {route} 单次请求执行同一语句 {count} 次: {statement[:300]}")
+
+    @staticmethod
+    def _evict(table: Dict[str, Dict[str, Any]], field: str) -> None:
+        del table[min(table, key=lambda k: table[k][field])]
+
+    def snapshot(self, limit: int = 20) -> Dict[str, Any]:
+        """按总耗时、重复次数和查询数排序的前 limit 项"""
+        with self._lock:
+            slow = [dict(item) for item in self._slow.values()]
+            repeated = [dict(item) for item in self._repeated.values()]
+            routes = [dict(item) for item in self._routes.values()]
+
+        for item in slow:
+            item["avg_ms"] = round(item["total_ms"] / item["count"], 2)
+            item["total_ms"] = round(item["total_ms"], 2)
+            item["max_ms"] = round(item["max_ms"], 2)
+        for item in routes:
+            item["avg_queries"] = round(item["total_queries"] / item["requests"], 1)
+            item["avg_db_ms"] = round(item["total_db_ms"] / item["requests"], 2)
+            item["total_db_ms"] = round(item["total_db_ms"], 2)
+
+        return {
+            "since": self.started_at,
+            "slow_query_ms": settings.slow_query_ms,
+            "n_plus_one_threshold": settings.n_plus_one_threshold,
+            "slow_queries": sorted(slow, key=lambda i: i["total_ms"], reverse=True)[:limit],
+            "repeated_statements": sorted(repeated, key=lambda i: i["max_per_request"], reverse=True)[:limit],
+            "routes": sorted(routes, key=lambda i: i["avg_queries"], reverse=True)[:limit],
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._slow.clear()
+            self._repeated.clear()
+            self._routes.clear()
+            self.started_at = time.time()
+
+
+class QueryProfilerMiddleware:
+    """为每个请求统计 SQL 查询数和数据库耗时
+
+    调试模式下以 X-DB-Query-Count / X-DB-Time-Ms 响应头返回；流式响应在发送响应头之后执行的查询
+    不计入响应头，但计入汇总。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestQueryStats()
+        token = _request_stats.set(stats)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and settings.debug:
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-query-count", str(stats.count).encode()))
+                headers.append((b"x-db-time-ms", f"{stats.db_ms:.1f}".encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_stats.reset(token)
+            if stats.count:
+                query_profiler.record_request(f"{scope.get('method', '')} {route_template(scope)}", stats)
+
+
+# 全局查询统计实例
+query_profiler = QueryProfiler()
@@ -0,0 +1,95 @@
+"""
+启动耗时与后台预热
+记录从导入应用到可以处理请求的各阶段耗时，超过启动预算时输出警告；
+启动完成后在后台线程中导入较慢的依赖、配置 ORM 映射并生成接口文档，首个请求不再承担这些开销
+"""
+import asyncio
+import importlib
+import logging
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTimer:
+    """启动各阶段耗时（毫秒）"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._last = self.started
+        self.phases: Dict[str, float] = {}
+        self.ready_ms: Optional[float] = None
+        self.warmup: Dict[str, float] = {}
+
+    def mark(self, phase: str) -> float:
+        """记录从上一阶段结束到现在的耗时"""
+        now = time.perf_counter()
+        self.phases[phase] = round((now - self._last) * 1000, 1)
+        self._last = now
+        return self.phases[phase]
+
+    def ready(self) -> float:
+        """应用可以处理请求，返回总启动耗时并与预算比较"""
+        from app.config import settings
+
+        self.ready_ms = round((time.perf_counter() - self.started) * 1000, 1)
+        if settings.startup_budget_ms and self.ready_ms > settings.startup_budget_ms:
+            slowest = max(self.phases, key=self.phases.get) if self.phases else "-"
+            logger.warning(
+                f"⏱️ 启动耗时 {self.ready_ms:.0f}ms 超过预算 {settings.startup_budget_ms}ms，"
+                f"最慢阶段: {slowest}（{self.phases.get(slowest, 0):.0f}ms）"
+            )
+        return self.ready_ms
+
+    def snapshot(self) -> Dict[str, Any]:
+        from app.config import settings
+
+        return {
+            "budget_ms": settings.startup_budget_ms,
+            "ready_ms": self.ready_ms,
+            "phases": dict(self.phases),
+            "warmup": dict(self.warmup),
+        }
+
+
+# 导入 app.main 时最先创建，包含应用自身的导入耗时
+startup_timer = StartupTimer()
+
+
+def warmup(app) -> Dict[str, float]:
+    """预热（阻塞调用，应在线程中执行），返回各项耗时（毫秒）
+
+    导入配置中列出的模块，配置 ORM 映射，建立一个数据库连接放入连接池，并生成 OpenAPI 文档。
+    各项互不依赖，单项失败只记录日志。
+    """
+    from sqlalchemy.orm import configure_mappers
+
+    from app.config import settings
+    from app.database import engine
+
+    steps = [(f"import {name}", lambda name=name: importlib.import_module(name))
+             for name in settings.startup_preload_modules]
+    steps += [
+        ("orm_mappers", configure_mappers),
+        ("db_connection", lambda: engine.connect().close()),
+        ("openapi", app.openapi),
+    ]
+
+    timings = {}
+    for name, step in steps:
+        started = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            logger.warning(f"⚠️ [预热] {name} 失败: {e}")
+            continue
+        timings[name] = round((time.perf_counter() - started) * 1000, 1)
+    return timings
+
+
+async def run_warmup(app) -> None:
+    """在后台线程中预热，不阻塞启动和请求处理"""
+    started = time.perf_counter()
+    startup_timer.warmup = await asyncio.to_thread(warmup, app)
+    logger.info(f"🔥 后台预热完成，耗时 {(time.perf_counter() - started) * 1000:.0f}ms")
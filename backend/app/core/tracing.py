@@ -0,0 +1,310 @@
+"""
+任务链路追踪
+以任务为单位记录各阶段、批次、AI 调用尝试、JSON 解析和数据库写入的耗时区间（span），
+任务结束后保存为紧凑的 JSON 时间线，可还原为瀑布图并计算关键路径
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Dict, Iterator, List, Optional, TypeVar
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# 追踪文件保存目录
+TRACE_DIR = Path(settings.upload_dir) / "traces"
+
+# 保存格式中每个 span 的字段顺序
+SPAN_FIELDS = ["id", "parent_id", "name", "start_ms", "end_ms", "status", "attributes"]
+
+_current_trace: ContextVar[Optional["Trace"]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+# 正在进行的追踪，任务运行中也可以查看
+_active_traces: Dict[str, "Trace"] = {}
+_active_lock = threading.Lock()
+
+
+class Span:
+    """一个耗时区间，时间为相对追踪开始的毫秒数"""
+
+    __slots__ = ("id", "parent_id", "name", "start_ms", "end_ms", "status", "attributes")
+
+    def __init__(self, span_id: int, parent_id: Optional[int], name: str, start_ms: float, attributes: Dict[str, Any]):
+        self.id = span_id
+        self.parent_id = parent_id
+        self.name = name
+        self.start_ms = start_ms
+        self.end_ms: Optional[float] = None
+        self.status = "ok"
+        self.attributes = attributes
+
+    def set(self, **attributes: Any) -> None:
+        """附加属性（如 token 数、重试原因）"""
+        self.attributes.update(attributes)
+
+    def to_row(self, now_ms: Optional[float] = None) -> List[Any]:
+        end_ms = self.end_ms if self.end_ms is not None else now_ms
+        status = self.status if self.end_ms is not None else "running"
+        return [self.id, self.parent_id, self.name, self.start_ms, end_ms, status, self.attributes]
+
+
+class Trace:
+    """一个任务的全部 span"""
+
+    def __init__(self, trace_id: str, name: str, max_spans: int):
+        self.trace_id = trace_id
+        self.name = name
+        self.started_at = datetime.now()
+        self._origin = time.perf_counter()
+        self._max_spans = max_spans
+        self._spans: List[Span] = []
+        self._lock = threading.Lock()
+        self.dropped_spans = 0
+
+    def now_ms(self) -> float:
+        return round((time.perf_counter() - self._origin) * 1000, 1)
+
+    def start_span(self, name: str, parent: Optional[Span], attributes: Dict[str, Any]) -> Optional[Span]:
+        with self._lock:
+            if len(self._spans) >= self._max_spans:
+                self.dropped_spans += 1
+                return None
+            span = Span(len(self._spans) + 1, parent.id if parent else None, name, self.now_ms(), attributes)
+            self._spans.append(span)
+        return span
+
+    def end_span(self, span: Span, status: str) -> None:
+        span.status = status
+        span.end_ms = self.now_ms()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """导出为紧凑格式，未结束的 span 以当前时间作为结束时间"""
+        now_ms = self.now_ms()
+        with self._lock:
+            rows = [span.to_row(now_ms) for span in self._spans]
+        root = rows[0] if rows else None
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "started_at": self.started_at.isoformat(),
+            "status": root[5] if root else "ok",
+            "duration_ms": root[4] if root else 0,
+            "dropped_spans": self.dropped_spans,
+            "fields": SPAN_FIELDS,
+            "spans": rows,
+        }
+
+
+def _status_of(exc: BaseException) -> str:
+    return "cancelled" if isinstance(exc, asyncio.CancelledError) else "error"
+
+
+@contextmanager
+def trace_span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """在当前追踪中记录一个 span，不在追踪中时不做任何事
+
+    span 的父级为当前上下文中的 span；asyncio 任务创建时会复制上下文，
+    因此并发执行的批次会挂在创建它们的 span 之下。
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+    span = trace.start_span(name, _current_span.get(), attributes)
+    if span is None:
+        yield None
+        return
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.set(error=type(e).__name__)
+        trace.end_span(span, _status_of(e))
+        raise
+    else:
+        trace.end_span(span, "ok")
+    finally:
+        _current_span.reset(token)
+
+
+def set_span_attributes(**attributes: Any) -> None:
+    """为当前 span 附加属性"""
+    span = _current_span.get()
+    if span is not None:
+        span.set(**attributes)
+
+
+@asynccontextmanager
+async def traced_semaphore(semaphore, name: str = "semaphore_wait") -> AsyncIterator[None]:
+    """获取信号量并把等待时间记录为 span，用法同 ``async with semaphore``"""
+    with trace_span(name):
+        await semaphore.acquire()
+    try:
+        yield
+    finally:
+        semaphore.release()
+
+
+@contextmanager
+def start_trace(trace_id: str, name: str, **attributes: Any) -> Iterator[Optional[Trace]]:
+    """开始一个任务的追踪，结束时保存到追踪文件
+
+    代码块本身记录为根 span；未启用追踪时不做任何事。
+    """
+    if not settings.tracing_enabled:
+        yield None
+        return
+    trace = Trace(trace_id, name, settings.trace_max_spans)
+    trace_token = _current_trace.set(trace)
+    span_token = _current_span.set(None)
+    with _active_lock:
+        _active_traces[trace_id] = trace
+    try:
+        with trace_span(name, **attributes):
+            yield trace
+    finally:
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+        try:
+            save_trace(trace)
+        except Exception as e:
+            logger.warning(f"⚠️ 保存任务追踪失败 {trace_id}: {e}")
+        finally:
+            with _active_lock:
+                _active_traces.pop(trace_id, None)
+
+
+async def run_traced(trace_id: str, name: str, coro: Awaitable[T]) -> T:
+    """在追踪中执行协程，用于包装后台任务"""
+    with start_trace(trace_id, name):
+        return await coro
+
+
+def _trace_path(trace_id: str) -> Path:
+    # 任务ID为 uuid，这里仍过滤掉路径字符
+    safe_id = "".join(c for c in trace_id if c.isalnum() or c in "-_")
+    return TRACE_DIR / f"{safe_id}.json"
+
+
+def save_trace(trace: Trace) -> None:
+    TRACE_DIR.mkdir(parents=True, exist_ok=True)
+    path = _trace_path(trace.trace_id)
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(trace.to_dict(), ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+def load_trace(trace_id: str) -> Optional[Dict[str, Any]]:
+    """读取追踪数据，任务仍在运行时返回当前快照"""
+    with _active_lock:
+        trace = _active_traces.get(trace_id)
+    if trace is not None:
+        data = trace.to_dict()
+        data["running"] = True
+        return data
+    path = _trace_path(trace_id)
+    if not path.exists():
+        return None
+    data = json.loads(path.read_text(encoding="utf-8"))
+    data["running"] = False
+    return data
+
+
+def _critical_path(span: Dict[str, Any], children: Dict[int, List[Dict[str, Any]]], path: List[Dict[str, Any]]) -> None:
+    """从 span 的结束时间向前回溯，依次选取在游标之前最晚结束的子 span
+
+    选中的子 span 首尾相接地决定了 span 的结束时间；未被子 span 覆盖的时间记为 self_ms。
+    """
+    cursor = span["end_ms"]
+    chosen = []
+    for child in sorted(children.get(span["id"], []), key=lambda c: c["end_ms"], reverse=True):
+        if child["end_ms"] <= cursor and child["start_ms"] >= span["start_ms"]:
+            chosen.append(child)
+            cursor = child["start_ms"]
+    chosen.reverse()
+    self_ms = span["duration_ms"] - sum(child["duration_ms"] for child in chosen)
+    path.append({
+        "id": span["id"],
+        "name": span["name"],
+        "start_ms": span["start_ms"],
+        "duration_ms": span["duration_ms"],
+        "self_ms": round(max(self_ms, 0), 1),
+        "attributes": span["attributes"],
+    })
+    for child in chosen:
+        _critical_path(child, children, path)
+
+
+def build_waterfall(data: Dict[str, Any]) -> Dict[str, Any]:
+    """把追踪数据还原为瀑布图、关键路径和按名称的耗时汇总
+
+    Returns:
+        - waterfall：按开始时间排序的 span 列表，带层级 depth
+        - critical_path：决定任务总耗时的 span 链，self_ms 为该 span 自身（不含链上子 span）的耗时
+        - summary：按 span 名称汇总的次数、总耗时和在关键路径上的自身耗时，按后者降序
+    """
+    fields = data.get("fields", SPAN_FIELDS)
+    spans = []
+    for row in data.get("spans", []):
+        span = dict(zip(fields, row))
+        span["duration_ms"] = round(span["end_ms"] - span["start_ms"], 1)
+        spans.append(span)
+
+    by_id = {span["id"]: span for span in spans}
+    children: Dict[int, List[Dict[str, Any]]] = {}
+    roots = []
+    for span in spans:
+        if span["parent_id"] in by_id:
+            children.setdefault(span["parent_id"], []).append(span)
+        else:
+            roots.append(span)
+
+    waterfall = []
+
+    def walk(span: Dict[str, Any], depth: int) -> None:
+        waterfall.append({**span, "depth": depth})
+        for child in sorted(children.get(span["id"], []), key=lambda c: c["start_ms"]):
+            walk(child, depth + 1)
+
+    for root in sorted(roots, key=lambda s: s["start_ms"]):
+        walk(root, 0)
+
+    critical_path: List[Dict[str, Any]] = []
+    if roots:
+        _critical_path(max(roots, key=lambda s: s["end_ms"]), children, critical_path)
+
+    summary: Dict[str, Dict[str, Any]] = {}
+    for span in spans:
+        item = summary.setdefault(span["name"], {"name": span["name"], "count": 0, "total_ms": 0.0, "critical_ms": 0.0})
+        item["count"] += 1
+        item["total_ms"] += span["duration_ms"]
+    for span in critical_path:
+        summary[span["name"]]["critical_ms"] += span["self_ms"]
+    for item in summary.values():
+        item["total_ms"] = round(item["total_ms"], 1)
+        item["critical_ms"] = round(item["critical_ms"], 1)
+
+    return {
+        "trace_id": data.get("trace_id"),
+        "name": data.get("name"),
+        "started_at": data.get("started_at"),
+        "status": data.get("status"),
+        "running": data.get("running", False),
+        "duration_ms": data.get("duration_ms"),
+        "span_count": len(spans),
+        "dropped_spans": data.get("dropped_spans", 0),
+        "waterfall": waterfall,
+        "critical_path": critical_path,
+        "summary": sorted(summary.values(), key=lambda item: item["critical_ms"], reverse=True),
+    }
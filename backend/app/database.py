@@ -1,29 +1,86 @@
 """
 数据库连接和会话管理
 """
-from typing import Generator
-from sqlalchemy import create_engine, event
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Generator, Optional
+from sqlalchemy import create_engine, event, inspect
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.ext.declarative import declarative_base
 
 from app.config import settings
+from app.core.metrics import DB_QUERY_DURATION, DB_WRITE_QUEUE_PENDING
+from app.core.query_profiler import query_profiler
+
+is_sqlite = "sqlite" in settings.database_url
+is_sqlite_memory = is_sqlite and (":memory:" in settings.database_url or settings.database_url.rstrip("/") == "sqlite:")
+
+
+def _build_engine_kwargs() -> dict:
+    """根据数据库类型构建引擎参数"""
+    kwargs = {
+        #"echo": settings.debug,  # 开发模式下显示SQL语句
+        "echo": False,  # 临时关闭SQL日志，方便调试
+    }
+
+    if is_sqlite:
+        # timeout 为 sqlite3 驱动层的锁等待时间（秒），与 PRAGMA busy_timeout 保持一致
+        kwargs["connect_args"] = {
+            "check_same_thread": False,
+            "timeout": settings.sqlite_busy_timeout / 1000,
+        }
+
+    # 内存数据库使用单连接池，不支持连接池尺寸参数
+    if not is_sqlite_memory:
+        kwargs.update(
+            pool_size=settings.db_pool_size,
+            max_overflow=settings.db_max_overflow,
+            pool_timeout=settings.db_pool_timeout,
+            pool_recycle=settings.db_pool_recycle,
+        )
+
+    return kwargs
+
 
 # 创建数据库引擎
-engine = create_engine(
-    settings.database_url,
-    #echo=settings.debug,  # 开发模式下显示SQL语句
-    echo=False,  # 临时关闭SQL日志，方便调试
-    connect_args={"check_same_thread": False} if "sqlite" in settings.database_url else {}
-)
-
-# 为 SQLite 启用外键约束
-if "sqlite" in settings.database_url:
+engine = create_engine(settings.database_url, **_build_engine_kwargs())
+
+# 为 SQLite 启用外键约束及性能相关 PRAGMA
+if is_sqlite:
     @event.listens_for(engine, "connect")
     def set_sqlite_pragma(dbapi_conn, connection_record):
         cursor = dbapi_conn.cursor()
         cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.execute(f"PRAGMA busy_timeout={int(settings.sqlite_busy_timeout)}")
+        if not is_sqlite_memory:
+            # WAL 模式下读者不阻塞写者，写者也不阻塞读者
+            cursor.execute(f"PRAGMA journal_mode={settings.sqlite_journal_mode}")
+            cursor.execute(f"PRAGMA mmap_size={int(settings.sqlite_mmap_size)}")
+        cursor.execute(f"PRAGMA synchronous={settings.sqlite_synchronous}")
+        cursor.execute(f"PRAGMA cache_size={int(settings.sqlite_cache_size)}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
         cursor.close()
 
+
+@event.listens_for(engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+@event.listens_for(engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - conn.info["query_start_time"].pop()
+    operation = statement.lstrip().split(None, 1)[0].lower() if statement.strip() else "other"
+    if operation not in ("select", "insert", "update", "delete"):
+        operation = "other"
+    DB_QUERY_DURATION.observe(duration, operation=operation)
+    query_profiler.record(statement, parameters, duration, executemany)
+
+
 # 创建会话工厂
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -31,6 +88,145 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 
+class DatabaseExecutor:
+    """事件循环外的数据库执行器
+
+    同步 SQLAlchemy 调用会阻塞事件循环，协程中的数据库操作应通过这里提交到
+    有界线程池执行。线程数由 ``db_executor_workers`` 控制，避免耗尽连接池。
+
+    注意：同一个 Session 不是线程安全的，调用方需要保证同一会话上的操作串行执行。
+    """
+
+    def __init__(self, max_workers: int):
+        self._max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self._max_workers,
+                    thread_name_prefix="db-executor"
+                )
+            return self._executor
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """在线程池中执行 ``fn(*args, **kwargs)`` 并等待结果"""
+        loop = asyncio.get_running_loop()
+        # run_in_executor 不会复制上下文，显式复制以保留请求的查询统计和日志上下文
+        ctx = contextvars.copy_context()
+        return await loop.run_in_executor(
+            self._get_executor(),
+            functools.partial(ctx.run, fn, *args, **kwargs)
+        )
+
+    async def run_session(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """在线程池中以独立会话执行只读操作 ``fn(session, *args, **kwargs)``
+
+        会话在返回前关闭，返回值应为普通数据而不是 ORM 对象。
+        """
+        def _run() -> Any:
+            db = SessionLocal()
+            try:
+                return fn(db, *args, **kwargs)
+            finally:
+                db.close()
+
+        return await self.run(_run)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """关闭线程池"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
+
+
+# 全局数据库执行器
+db_executor = DatabaseExecutor(max_workers=settings.db_executor_workers)
+
+
+class DatabaseWriteQueue:
+    """后台写入队列
+
+    SQLite 同一时刻只允许一个写事务。后台流水线把写操作封装成独立的工作单元提交到这里，
+    由单个写线程串行执行并立即提交：写事务不会跨越 AI 调用长期持有写锁，
+    多个后台写者也不会在事件循环线程上互相等待 busy_timeout。
+
+    工作单元签名为 ``fn(session, *args, **kwargs)``，会在独立会话中执行，
+    正常返回后提交、异常时回滚。由于会话随后关闭，返回值应为普通数据（ID、字典等），
+    而不是 ORM 对象。
+    """
+
+    def __init__(self, session_factory: Callable[[], Session], enabled: bool = True):
+        self._session_factory = session_factory
+        self._enabled = enabled
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        """是否启用单写线程"""
+        return self._enabled
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+            return self._executor
+
+    def _run_unit(self, fn: Callable[..., Any], args: tuple, kwargs: dict) -> Any:
+        db = self._session_factory()
+        try:
+            result = fn(db, *args, **kwargs)
+            db.commit()
+            return result
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """在写线程中执行工作单元并等待结果（供协程调用）"""
+        DB_WRITE_QUEUE_PENDING.inc()
+        try:
+            if not self._enabled:
+                # 未启用单写线程时仍在事件循环外执行，多个工作单元可以并行写入
+                return await db_executor.run(self._run_unit, fn, args, kwargs)
+            loop = asyncio.get_running_loop()
+            ctx = contextvars.copy_context()
+            return await loop.run_in_executor(
+                self._get_executor(),
+                functools.partial(ctx.run, self._run_unit, fn, args, kwargs)
+            )
+        finally:
+            DB_WRITE_QUEUE_PENDING.dec()
+
+    def run_sync(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """在写线程中执行工作单元并阻塞等待结果（供普通线程调用）"""
+        DB_WRITE_QUEUE_PENDING.inc()
+        try:
+            if not self._enabled:
+                return self._run_unit(fn, args, kwargs)
+            ctx = contextvars.copy_context()
+            return self._get_executor().submit(ctx.run, self._run_unit, fn, args, kwargs).result()
+        finally:
+            DB_WRITE_QUEUE_PENDING.dec()
+
+    def shutdown(self, wait: bool = True) -> None:
+        """关闭写线程，等待已提交的写入完成"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
+
+
+# 全局后台写入队列（仅 SQLite 需要串行化写入）
+db_write_queue = DatabaseWriteQueue(SessionLocal, enabled=is_sqlite and settings.sqlite_single_writer)
+
+
 def get_db() -> Generator[Session, None, None]:
     """
     获取数据库会话（用于FastAPI依赖注入）
@@ -42,11 +238,22 @@ def get_db() -> Generator[Session, None, None]:
         db.close()
 
 
-def create_tables():
+def create_tables() -> bool:
     """
     创建所有数据库表
+
+    create_all 会逐表检查是否存在；所有模型表都已存在时只用一次查询确认并跳过，
+    减少启动时与数据库的往返。
+
+    Returns:
+        是否执行了建表
     """
+    with engine.connect() as conn:
+        existing = set(inspect(conn).get_table_names())
+    if set(Base.metadata.tables) <= existing:
+        return False
     Base.metadata.create_all(bind=engine)
+    return True
 
 
 def drop_tables():
@@ -12,8 +12,17 @@ config = {'sep': ' ',
           }
 
 
+def _debug_enabled():
+    """avoid serializing suites and cases for debug messages that would be discarded"""
+    return logging.getLogger().isEnabledFor(logging.DEBUG)
+
+
 def xmind_to_testsuites(xmind_content_dict):
-    """convert xmind file to `xmind2testcase.metadata.TestSuite` list"""
+    """convert xmind file to `xmind2testcase.metadata.TestSuite` list
+
+    `xmind_content_dict` can be a list or an iterator of sheets, an iterator is consumed
+    one sheet at a time.
+    """
     suites = []
 
     for sheet in xmind_content_dict:
@@ -28,7 +37,8 @@ def xmind_to_testsuites(xmind_content_dict):
             continue
         suite = sheet_to_suite(root_topic)
         # suite.sheet_name = sheet['title']  # root testsuite has a sheet_name attribute
-        logging.debug('sheet(%s) parsing complete: %s', sheet['title'], suite.to_dict())
+        if _debug_enabled():
+            logging.debug('sheet(%s) parsing complete: %s', sheet['title'], suite.to_dict())
         suites.append(suite)
 
     return suites
@@ -36,18 +46,25 @@ def xmind_to_testsuites(xmind_content_dict):
 
 def filter_empty_or_ignore_topic(topics):
     """filter blank or start with config.ignore_char topic"""
-    result = [topic for topic in topics if not(
-            topic['title'] is None or
-            topic['title'].strip() == '' or
-            topic['title'][0] in config['ignore_char'])]
+    result = _filter_topics(topics)
 
-    for topic in result:
-        sub_topics = topic.get('topics', [])
-        topic['topics'] = filter_empty_or_ignore_topic(sub_topics)
+    # walk the tree with an explicit stack, deep mind maps must not hit the recursion limit
+    stack = list(result)
+    while stack:
+        topic = stack.pop()
+        topic['topics'] = _filter_topics(topic.get('topics', []))
+        stack.extend(topic['topics'])
 
     return result
 
 
+def _filter_topics(topics):
+    return [topic for topic in topics if not(
+            topic['title'] is None or
+            topic['title'].strip() == '' or
+            topic['title'][0] in config['ignore_char'])]
+
+
 def filter_empty_or_ignore_element(values):
     """Filter all empty or ignore XMind elements, especially notes、comments、labels element"""
     result = []
@@ -68,24 +85,26 @@ def sheet_to_suite(root_topic):
     root_title = root_topic['title']
     separator = root_title[-1]
 
+    # the separator is kept per sheet instead of in the shared config,
+    # so that concurrent parses do not overwrite each other's separator
     if separator in config['valid_sep']:
         logging.debug('find a valid separator for connecting testcase title: %s', separator)
-        config['sep'] = separator  # set the separator for the testcase's title
+        sep = separator  # set the separator for the testcase's title
         root_title = root_title[:-1]
     else:
-        config['sep'] = ' - '
+        sep = ' - '
 
     suite.name = root_title
     suite.details = root_topic['note']
     suite.sub_suites = []
 
     for suite_dict in root_topic['topics']:
-        suite.sub_suites.append(parse_testsuite(suite_dict))
+        suite.sub_suites.append(parse_testsuite(suite_dict, sep))
 
     return suite
 
 
-def parse_testsuite(suite_dict):
+def parse_testsuite(suite_dict, sep=None):
     testsuite = TestSuite()
     testsuite.name = suite_dict['title']
     testsuite.details = suite_dict['note']
@@ -93,28 +112,33 @@ def parse_testsuite(suite_dict):
     logging.debug('start to parse a testsuite: %s', testsuite.name)
 
     for cases_dict in suite_dict.get('topics', []):
-        for case in recurse_parse_testcase(cases_dict):
+        for case in recurse_parse_testcase(cases_dict, sep=sep):
             testsuite.testcase_list.append(case)
 
-    logging.debug('testsuite(%s) parsing complete: %s', testsuite.name, testsuite.to_dict())
+    if _debug_enabled():
+        logging.debug('testsuite(%s) parsing complete: %s', testsuite.name, testsuite.to_dict())
     return testsuite
 
 
-def recurse_parse_testcase(case_dict, parent=None):
-    if is_testcase_topic(case_dict):
-        case = parse_a_testcase(case_dict, parent)
-        yield case
-    else:
-        if not parent:
-            parent = []
+def recurse_parse_testcase(case_dict, parent=None, sep=None):
+    """yield the testcases under a topic in document order.
 
-        parent.append(case_dict)
+    Uses an explicit stack instead of recursion, `path` holds the non-testcase ancestors
+    of the topic being visited.
+    """
+    path = list(parent) if parent else []
+    stack = [(case_dict, len(path))]
 
-        for child_dict in case_dict.get('topics', []):
-            for case in recurse_parse_testcase(child_dict, parent):
-                yield case
+    while stack:
+        topic, depth = stack.pop()
+        del path[depth:]
 
-        parent.pop()
+        if is_testcase_topic(topic):
+            yield parse_a_testcase(topic, path, sep)
+        else:
+            path.append(topic)
+            for child_dict in reversed(topic.get('topics', [])):
+                stack.append((child_dict, depth + 1))
 
 
 def is_testcase_topic(case_dict):
@@ -131,17 +155,20 @@ def is_testcase_topic(case_dict):
 
 def get_max_depth(topic_dict):
     """Calculate the maximum depth of the topic tree. Leaf = 0."""
-    children = topic_dict.get('topics', [])
-    if not children:
-        return 0
-    return 1 + max(get_max_depth(child) for child in children)
+    max_depth = 0
+    stack = [(topic_dict, 0)]
+    while stack:
+        topic, depth = stack.pop()
+        max_depth = max(max_depth, depth)
+        stack.extend((child, depth + 1) for child in topic.get('topics', []))
+    return max_depth
 
 
-def parse_a_testcase(case_dict, parent):
+def parse_a_testcase(case_dict, parent, sep=None):
     testcase = TestCase()
     topics = parent + [case_dict] if parent else [case_dict]
 
-    testcase.name = gen_testcase_title(topics)
+    testcase.name = gen_testcase_title(topics, sep)
 
     preconditions = gen_testcase_preconditions(topics)
     testcase.preconditions = preconditions if preconditions else '无'
@@ -171,7 +198,8 @@ def parse_a_testcase(case_dict, parent):
 
             testcase.result = step.result  # there is no need to judge where test step are ignored
 
-    logging.debug('finds a testcase: %s', testcase.to_dict())
+    if _debug_enabled():
+        logging.debug('finds a testcase: %s', testcase.to_dict())
     return testcase
 
 def get_execution_type(topics):
@@ -217,13 +245,13 @@ def get_priority(case_dict):
                 return int(marker[-1])
 
 
-def gen_testcase_title(topics):
+def gen_testcase_title(topics, sep=None):
     """Link all topic's title as testcase title"""
     titles = [topic['title'] for topic in topics]
     titles = filter_empty_or_ignore_element(titles)
 
     # when separator is not blank, will add space around separator, e.g. '/' will be changed to ' / '
-    separator = config['sep']
+    separator = sep if sep is not None else config['sep']
     if separator != ' ':
         separator = ' {} '.format(separator)
 
@@ -267,7 +295,8 @@ def parse_a_test_step(step_dict):
         markers = step_dict['markers']
         test_step.result = get_test_result(markers)
 
-    logging.debug('finds a teststep: %s', test_step.to_dict())
+    if _debug_enabled():
+        logging.debug('finds a teststep: %s', test_step.to_dict())
     return test_step
 
 
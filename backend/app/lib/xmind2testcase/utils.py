@@ -2,10 +2,11 @@
 # _*_ coding:utf-8 _*_
 import json
 import os
-import xmind
 import logging
+from zipfile import ZipFile
 from .parser import xmind_to_testsuites
-from ..xmindparser import is_xmind_zen,xmind_to_dict
+from ..xmindparser import is_zen_archive, archive_to_dict
+from ..xmindparser.xreader import iterparse_sheets
 
 
 def get_absolute_path(path):
@@ -23,25 +24,28 @@ def get_absolute_path(path):
     return os.path.join(fp, fn)
 
 
-def get_xmind_testsuites(xmind_file):22
-    """Load the XMind file and parse to `xmind2testcase.metadata.TestSuite` list"""
+def get_xmind_testsuites(xmind_file):
+    """Load the XMind file and parse to `xmind2testcase.metadata.TestSuite` list
+
+    The zip file is opened only once and no module-level state is shared between calls,
+    so several files can be parsed concurrently in a thread or process pool.
+    """
     xmind_file = get_absolute_path(xmind_file)
-    '''
-        适配xmind高版本
-    '''
-    if is_xmind_zen(xmind_file):
-        xmind_content_dict = xmind_to_dict(xmind_file)
-    else:
-        workbook = xmind.load(xmind_file)
-        xmind_content_dict = workbook.getData()
-    logging.debug("loading XMind file(%s) dict data: %s", xmind_file, xmind_content_dict)
-
-    if xmind_content_dict:
-        testsuites = xmind_to_testsuites(xmind_content_dict)
-        return testsuites
-    else:
+    with ZipFile(xmind_file) as xmind_zip:
+        '''
+            适配xmind高版本
+        '''
+        if is_zen_archive(xmind_zip):
+            xmind_content_dict = archive_to_dict(xmind_zip)
+            logging.debug("loading XMind file(%s) dict data: %s", xmind_file, xmind_content_dict)
+            testsuites = xmind_to_testsuites(xmind_content_dict)
+        else:
+            # legacy content.xml is streamed sheet by sheet, each sheet is converted as soon as it is read
+            testsuites = xmind_to_testsuites(iterparse_sheets(xmind_zip))
+
+    if not testsuites:
         logging.error('Invalid XMind file(%s): it is empty!', xmind_file)
-        return []
+    return testsuites
 
 
 def get_xmind_testsuite_list(xmind_file):
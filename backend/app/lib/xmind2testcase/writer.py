@@ -1,9 +1,20 @@
 import json
 import uuid
 from io import BytesIO
+from itertools import chain
 from zipfile import ZipFile, ZIP_DEFLATED
 from .metadata import TestSuite, TestCase, TestStep
 
+# size of the encoded content.json pieces handed to the zip entry at once
+CONTENT_CHUNK_SIZE = 64 * 1024
+
+MANIFEST = {
+    "file-entries": {
+        "content.json": {},
+        "metadata.json": {}
+    }
+}
+
 def gen_id():
     return str(uuid.uuid4())
 
@@ -140,29 +151,175 @@ def step_to_topic(step):
         
     return topic
 
+def _suite_fields(suite, is_root=False):
+    fields = {"id": gen_id(), "title": suite.name}
+    if suite.details:
+        fields["note"] = suite.details
+    if is_root:
+        fields["structureClass"] = "org.xmind.ui.logic.right"
+    return fields
+
+
+def _case_fields(case):
+    fields = {"id": gen_id(), "title": case.name}
+    if case.preconditions:
+        fields["note"] = case.preconditions
+    if case.summary:
+        fields["comment"] = case.summary
+    if case.importance:
+        try:
+            fields["markers"] = [{"markerId": f"priority-{int(case.importance)}"}]
+        except (TypeError, ValueError):
+            pass
+
+    labels = []
+    if case.tc_id:
+        labels.append(case.tc_id)
+    if case.execution_type == 2:
+        labels.append("自动")
+    elif case.execution_type == 1:
+        labels.append("手动")
+    if labels:
+        fields["labels"] = labels
+    return fields
+
+
+def _topic_of(node):
+    """Return the own fields and the (lazy) attached children of a node.
+
+    Produces the same topics as `suite_to_topic` / `case_to_topic` / `step_to_topic`.
+    """
+    kind, obj = node
+    if kind in ("root", "suite"):
+        children = chain(
+            (("suite", sub) for sub in obj.sub_suites or []),
+            (("case", case) for case in obj.testcase_list or [])
+        )
+        return _suite_fields(obj, is_root=(kind == "root")), children
+    if kind == "case":
+        return _case_fields(obj), (("step", step) for step in obj.steps or [])
+    if kind == "step":
+        expected = [("expected", obj.expectedresults)] if obj.expectedresults else []
+        return {"id": gen_id(), "title": obj.actions}, expected
+    return {"id": gen_id(), "title": obj}, ()
+
+
+def iter_topic_json(root_node):
+    """
+    Serialize a topic tree depth-first as JSON text pieces.
+
+    Only the topics on the current path are held in memory, the tree is walked
+    with an explicit stack so deep hierarchies do not hit the recursion limit.
+    """
+    stack = [[iter([root_node]), True]]  # [children iterator, is first child]
+    while stack:
+        level = stack[-1]
+        node = next(level[0], None)
+        if node is None:
+            stack.pop()
+            if stack:
+                yield ']}}'  # close "attached", "children" and the parent topic
+            continue
+
+        if not level[1]:
+            yield ','
+        level[1] = False
+
+        fields, children = _topic_of(node)
+        children = iter(children)
+        first_child = next(children, None)
+        head = json.dumps(fields, ensure_ascii=False)
+        if first_child is None:
+            yield head
+        else:
+            yield head[:-1] + ',"children":{"attached":['
+            stack.append([chain([first_child], children), True])
+
+
+def iter_xmind_zen_content(testsuites):
+    """Stream the content.json of `get_xmind_zen_content(testsuites)` as JSON text pieces."""
+    if len(testsuites) == 1:
+        root_suite = testsuites[0]
+    else:
+        root_suite = TestSuite()
+        root_suite.name = "Test Plan"
+        root_suite.sub_suites = testsuites
+
+    sheet = json.dumps({"id": gen_id(), "title": "Canvas 1"}, ensure_ascii=False)
+    yield '[' + sheet[:-1] + ',"rootTopic":'
+    yield from iter_topic_json(("root", root_suite))
+    yield '}]'
+
+
+def _write_xmind_entries(zf, testsuites, chunk_size=CONTENT_CHUNK_SIZE):
+    """Write the XMind entries into an open zip file, yields after every content chunk written."""
+    with zf.open('content.json', 'w') as entry:
+        buffer = []
+        size = 0
+        for piece in iter_xmind_zen_content(testsuites):
+            data = piece.encode('utf-8')
+            buffer.append(data)
+            size += len(data)
+            if size >= chunk_size:
+                entry.write(b''.join(buffer))
+                buffer.clear()
+                size = 0
+                yield
+        if buffer:
+            entry.write(b''.join(buffer))
+
+    # 'manifest.json' is required by some readers
+    zf.writestr('manifest.json', json.dumps(MANIFEST))
+    zf.writestr('metadata.json', json.dumps({}))
+    yield
+
+
+class _ChunkSink:
+    """Write-only, non-seekable target for ZipFile that hands out what was written so far."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_xmind_zip(testsuites, chunk_size=CONTENT_CHUNK_SIZE):
+    """
+    Generate XMind file bytes from testsuites as a stream of chunks.
+
+    Topics are serialized straight into the deflated zip entry, so neither the topic
+    dict tree, the JSON string nor the whole archive is held in memory.
+    """
+    sink = _ChunkSink()
+    with ZipFile(sink, 'w', ZIP_DEFLATED) as zf:
+        for _ in _write_xmind_entries(zf, testsuites, chunk_size):
+            data = sink.drain()
+            if data:
+                yield data
+
+    data = sink.drain()
+    if data:
+        yield data
+
+
 def write_xmind_zip(testsuites):
     """
     Generate XMind file bytes from testsuites.
     """
-    content = get_xmind_zen_content(testsuites)
-    json_str = json.dumps(content)
-    
-    # Create simple metadata and manifest just in case, though content.json is usually enough for Zen
-    # Actually 'manifest.json' is required by some readers.
-    manifest = {
-        "file-entries": {
-            "content.json": {},
-            "metadata.json": {}
-        }
-    }
-    
-    metadata = {}
-
     out = BytesIO()
     with ZipFile(out, 'w', ZIP_DEFLATED) as zf:
-        zf.writestr('content.json', json_str)
-        zf.writestr('manifest.json', json.dumps(manifest))
-        zf.writestr('metadata.json', json.dumps(metadata))
-        
+        for _ in _write_xmind_entries(zf, testsuites):
+            pass
+
     out.seek(0)
     return out
@@ -14,7 +14,6 @@ config = {'logName': __name__,
           'showTopicId': False,
           'hideEmptyValue': True}
 
-cache = {}
 _log_name = config['logName'] or __file__
 _log_level = config['logLevel'] or logging.WARNING
 _log_fmt = config['logFormat'] or '%(asctime)s %(levelname)-8s: %(message)s'
@@ -33,16 +32,25 @@ def set_logger_level(new_level):
 def is_xmind_zen(file_path):
     """Determine if this is a xmind zen file type."""
     with ZipFile(file_path) as xmind:
-        return 'content.json' in xmind.namelist()
+        return is_zen_archive(xmind)
+
+
+def is_zen_archive(xmind):
+    """Determine if an opened xmind zip file is a xmind zen file type."""
+    try:
+        xmind.getinfo('content.json')
+        return True
+    except KeyError:
+        return False
 
 
 def get_xmind_zen_builtin_json(file_path):
     """Read internal content.json from xmind zen file."""
     name = "content.json"
     with ZipFile(file_path) as xmind:
-        if name in xmind.namelist():
-            content = xmind.open(name).read().decode('utf-8')
-            return json.loads(content)
+        if is_zen_archive(xmind):
+            with xmind.open(name) as f:
+                return json.load(f)
 
         raise AssertionError("Not a xmind zen file type!")
 
@@ -55,19 +63,23 @@ def _get_out_file_name(xmind_file, suffix):
 
 
 def xmind_to_dict(file_path):
-    """Open and convert xmind to dict type."""
-    if is_xmind_zen(file_path):
-        from .zenreader import open_xmind, get_sheets, sheet_to_dict
-    else:
-        from .xreader import open_xmind, get_sheets, sheet_to_dict
+    """Open and convert xmind to dict type.
+
+    The zip file is opened once and all parse state is local to this call,
+    so it is safe to convert several files concurrently in threads or processes.
+    """
+    with ZipFile(file_path) as xmind:
+        return archive_to_dict(xmind)
 
-    open_xmind(file_path)
-    data = []
 
-    for s in get_sheets():
-        data.append(sheet_to_dict(s))
+def archive_to_dict(xmind):
+    """Convert an opened xmind zip file to dict type."""
+    if is_zen_archive(xmind):
+        from .zenreader import load_sheets
+    else:
+        from .xreader import load_sheets
 
-    return data
+    return list(load_sheets(xmind))
 
 
 def xmind_to_file(file_path, file_type):
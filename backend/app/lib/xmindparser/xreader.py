@@ -1,37 +1,55 @@
 import re
 from xml.etree import ElementTree as  ET
 from xml.etree.ElementTree import Element
-from zipfile import ZipFile
 
-from . import config, logger, cache
+from . import config, logger
 
 content_xml = "content.xml"
 comments_xml = "comments.xml"
 
 
-def open_xmind(file_path):
-    """open xmind as zip file and cache the content."""
-    cache.clear()
-    with ZipFile(file_path) as xmind:
-        for f in xmind.namelist():
-            for key in [content_xml, comments_xml]:
-                if f == key:
-                    cache[key] = xmind.open(f).read().decode('utf-8')
-
-
-def get_sheets():
-    """get all sheet as generator and yield."""
-    tree = xmind_content_to_etree(cache[content_xml])
+def get_sheets(xmind):
+    """parse content.xml of an opened xmind zip file and yield each sheet."""
+    with xmind.open(content_xml) as f:
+        tree = xmind_stream_to_etree(f)
     assert isinstance(tree, Element)
 
     for sheet in tree.findall('sheet'):
         yield sheet
 
 
-def sheet_to_dict(sheet):
+def get_comments(xmind):
+    """parse comments.xml of an opened xmind zip file, index comments by topic id."""
+    if comments_xml not in xmind.namelist():
+        return {}
+
+    with xmind.open(comments_xml) as f:
+        xml_root = xmind_stream_to_etree(f)
+
+    comments = {}
+    for c in xml_root.findall('comment'):
+        i = {'author': c.attrib['author'], 'content': c.find('content').text}
+
+        if config['showTopicId']:
+            i['id'] = c.attrib['object-id']
+
+        comments.setdefault(c.attrib['object-id'], []).append(i)
+
+    return comments
+
+
+def load_sheets(xmind):
+    """convert every sheet of an opened xmind zip file to dict type."""
+    comments = get_comments(xmind)
+
+    for sheet in get_sheets(xmind):
+        yield sheet_to_dict(sheet, comments)
+
+
+def sheet_to_dict(sheet, comments=None):
     """convert a sheet to dict type."""
     topic = sheet.find('topic')
-    result = {'title': title_of(sheet), 'topic': node_to_dict(topic), 'structure': get_sheet_structure(sheet)}
+    result = {'title': title_of(sheet), 'topic': node_to_dict(topic, comments), 'structure': get_sheet_structure(sheet)}
 
     if config['showTopicId']:
         result['id'] = sheet.attrib['id']
@@ -47,12 +65,12 @@ def get_sheet_structure(sheet):
     return root_topic.attrib.get('structure-class', None)
 
 
-def node_to_dict(node):
+def node_to_dict(node, comments=None):
     """parse Element to dict data type."""
     child = children_topics_of(node)
 
     d = {'title': title_of(node),
-         'comment': comments_of(node),
+         'comment': comments_of(node, comments),
          'note': note_of(node),
          'makers': maker_of(node),
          'labels': labels_of(node),
@@ -70,7 +88,7 @@ def node_to_dict(node):
     if child:
         d['topics'] = []
         for c in child:
-            d['topics'].append(node_to_dict(c))
+            d['topics'].append(node_to_dict(c, comments))
 
     if config['showTopicId']:
         d['id'] = id_of(node)
@@ -93,31 +111,35 @@ def xmind_content_to_etree(content):
     return ET.fromstring(xml_content.encode('utf-8'))
 
 
+def xmind_stream_to_etree(stream):
+    """parse xml from a binary stream and strip namespaces from tags and attributes.
+
+    Same result as :func:`xmind_content_to_etree`, without holding the whole document as a string.
+    """
+    root = ET.parse(stream).getroot()
+
+    for element in root.iter():
+        if element.tag.startswith('{'):
+            element.tag = element.tag.rpartition('}')[2]
+
+        for key in [k for k in element.attrib if k.startswith('{')]:
+            element.attrib[key.rpartition('}')[2]] = element.attrib.pop(key)
+
+    return root
+
+
 def xmind_xml_to_etree(xml_path):
     with open(xml_path) as f:
         content = f.read()
         return xmind_content_to_etree(content)
 
 
-def comments_of(node):
-    if cache.get(comments_xml, None):
+def comments_of(node, comments=None):
+    if comments:
         node_id = node.attrib.get('id', None)
 
         if node_id:
-            xml_root = xmind_content_to_etree(cache[comments_xml])
-            result = []
-
-            for c in xml_root.findall('comment'):
-
-                if c.attrib['object-id'] == node_id:
-                    i = {'author': c.attrib['author'], 'content': c.find('content').text}
-
-                    if config['showTopicId']:
-                        i['id'] = c.attrib['object-id']
-
-                    result.append(i)
-
-            return result if result else None
+            return comments.get(node_id)
 
 
 def id_of(node):
@@ -185,3 +207,130 @@ def children_topics_of(topic_node):
 
     if children is not None:
         return children.find('./topics[@type="attached"]')
+
+
+def local_name(tag):
+    """strip the namespace from an element tag or attribute name."""
+    return tag.rpartition('}')[2]
+
+
+def get_comment_contents(xmind):
+    """stream comments.xml of an opened xmind zip file, join comment contents by topic id."""
+    comments = {}
+    if comments_xml not in xmind.namelist():
+        return comments
+
+    with xmind.open(comments_xml) as f:
+        object_id = None
+        for event, element in ET.iterparse(f, events=('start', 'end')):
+            tag = local_name(element.tag)
+            if event == 'start':
+                if tag == 'comment':
+                    object_id = element.attrib.get('object-id')
+                continue
+
+            if tag == 'content' and object_id:
+                content = element.text or ''
+                if object_id in comments:
+                    comments[object_id] += '\n' + content
+                else:
+                    comments[object_id] = content
+            elif tag == 'comment':
+                element.clear()
+
+    return comments
+
+
+def _is_attached_topic(path):
+    """whether the topic that just started is the root topic of a sheet or an attached sub topic."""
+    parent_tag, parent = path[-2]
+    if parent_tag == 'sheet':
+        return True
+
+    return (parent_tag == 'topics' and parent.attrib.get('type') == 'attached'
+            and len(path) > 2 and path[-3][0] == 'children')
+
+
+def iterparse_sheets(xmind):
+    """stream content.xml of an opened xmind zip file and yield sheets one by one.
+
+    Sheets are yielded in the same shape as ``xmind.load(path).getData()`` (the format expected
+    by ``xmind2testcase.parser``): ``{'id', 'title', 'topic'}``, where every topic has ``id``, ``link``,
+    ``title``, ``note``, ``label``, ``comment``, ``markers`` and optional ``topics``.
+
+    The document is read with ``iterparse`` and an explicit stack instead of building an element tree
+    and walking it recursively: finished elements are dropped right away, so memory is bounded by the
+    topics of the current sheet and deeply nested maps cannot hit the recursion limit.
+    """
+    comments = get_comment_contents(xmind)
+
+    with xmind.open(content_xml) as f:
+        path = []  # (tag, element) of the currently open elements
+        topics = []  # topic dicts of the currently open attached topics
+        skip_depth = None  # depth of a detached topic whose whole subtree is skipped
+        sheet = None
+
+        for event, element in ET.iterparse(f, events=('start', 'end')):
+            tag = local_name(element.tag)
+
+            if event == 'start':
+                path.append((tag, element))
+                if skip_depth is not None:
+                    continue
+
+                if tag == 'sheet':
+                    sheet = {'id': element.attrib.get('id'), 'title': None, 'topic': None}
+                elif tag == 'topic':
+                    if sheet is None or not _is_attached_topic(path):
+                        skip_depth = len(path)
+                        continue
+
+                    link = None
+                    for key, value in element.attrib.items():
+                        if local_name(key) == 'href':
+                            link = value
+                    topic_id = element.attrib.get('id')
+                    topics.append({'id': topic_id,
+                                   'link': link,
+                                   'title': None,
+                                   'note': None,
+                                   'label': None,
+                                   'comment': comments.get(topic_id),
+                                   'markers': []})
+                continue
+
+            depth = len(path)
+            path.pop()
+            parent_tag, parent = path[-1] if path else (None, None)
+
+            if skip_depth is not None:
+                if depth == skip_depth:
+                    skip_depth = None
+            elif tag == 'topic':
+                topic = topics.pop()
+                if topics:
+                    topics[-1].setdefault('topics', []).append(topic)
+                else:
+                    sheet['topic'] = topic
+            elif tag == 'title':
+                if parent_tag == 'topic' and topics and topics[-1]['title'] is None:
+                    topics[-1]['title'] = element.text
+                elif parent_tag == 'sheet' and sheet is not None:
+                    sheet['title'] = element.text
+            elif tag == 'marker-ref' and parent_tag == 'marker-refs' and topics:
+                topics[-1]['markers'].append(element.attrib.get('marker-id'))
+            elif tag == 'label' and parent_tag == 'labels' and topics:
+                # one topic can have one label, the same as the xmind package
+                if topics[-1]['label'] is None:
+                    topics[-1]['label'] = element.text
+            elif tag == 'plain' and parent_tag == 'notes' and topics:
+                topics[-1]['note'] = element.text
+            elif tag == 'sheet':
+                if sheet is not None and sheet['topic'] is not None:
+                    yield sheet
+                sheet = None
+
+            # the element is fully consumed, release it and its text
+            element.clear()
+            if parent is not None and len(parent):
+                parent.remove(element)
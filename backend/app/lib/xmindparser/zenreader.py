@@ -1,27 +1,29 @@
 import json
-from zipfile import ZipFile
 
-from . import config, cache
+from . import config
 
 content_json = "content.json"
 
 
-def open_xmind(file_path):
-    """open xmind as zip file and cache the content."""
-    cache.clear()
-    with ZipFile(file_path) as xmind:
-        for f in xmind.namelist():
-            for key in [content_json]:
-                if f == key:
-                    cache[key] = xmind.open(f).read().decode('utf-8')
+def get_sheets(xmind):
+    """load content.json from an opened xmind zip file and yield each sheet.
 
+    The content is decoded straight from the zip member stream, no per-file state is kept
+    at module level, so several files can be parsed concurrently.
+    """
+    with xmind.open(content_json) as f:
+        sheets = json.load(f)
 
-def get_sheets():
-    """get all sheet as generator and yield."""
-    for sheet in json.loads(cache[content_json]):
+    for sheet in sheets:
         yield sheet
 
 
+def load_sheets(xmind):
+    """convert every sheet of an opened xmind zip file to dict type."""
+    for sheet in get_sheets(xmind):
+        yield sheet_to_dict(sheet)
+
+
 def sheet_to_dict(sheet):
     """convert a sheet to dict type."""
     topic = sheet['rootTopic']
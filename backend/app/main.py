@@ -1,22 +1,37 @@
 """
 FastAPI主应用入口
 """
+# 最先导入，启动耗时从这里开始计算
+from app.core.startup import run_warmup, startup_timer
+
 from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from contextlib import asynccontextmanager
+import asyncio
 
 from app.config import settings, get_settings
-from app.database import create_tables, SessionLocal
+from app.core.logger import setup_logging, shutdown_logging
+from app.core.metrics import CONTENT_TYPE_LATEST, MetricsMiddleware, registry as metrics_registry
+from app.core.query_profiler import QueryProfilerMiddleware
+from app.database import create_tables, SessionLocal, db_executor, db_write_queue
 from app.services.settings_service import SettingsService
 from app.services.async_task_manager import task_manager
 
+# 日志经队列异步输出，需在各模块输出日志前完成配置
+setup_logging()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """应用生命周期管理"""
-    # 启动时创建数据库表
-    create_tables()
-    print("🚀 数据库表创建完成")
+    startup_timer.mark("import")
+    
+    # 启动时创建数据库表（表已齐全时跳过）
+    if create_tables():
+        print("🚀 数据库表创建完成")
+    else:
+        print("✅ 数据库表已存在，跳过建表")
+    startup_timer.mark("create_tables")
     
     # 初始化默认设置（幂等操作，不会重复创建）
     db = SessionLocal()
@@ -46,10 +61,29 @@ async def lifespan(app: FastAPI):
         print(f"⚠️ 初始化警告: {e}")
     finally:
         db.close()
+    startup_timer.mark("init_data")
+    
+    # 定期清理已结束的任务及其结果文件
+    task_cleanup = asyncio.create_task(task_manager.run_cleanup_loop())
+    
+    ready_ms = startup_timer.ready()
+    print(f"⏱️ 启动完成，耗时 {ready_ms:.0f}ms（" + "，".join(
+        f"{phase} {ms:.0f}ms" for phase, ms in startup_timer.phases.items()) + "）")
+    
+    # 较慢的依赖和接口文档在后台预热，不计入启动耗时
+    warmup = asyncio.create_task(run_warmup(app)) if get_settings().startup_warmup else None
     
     yield
-    # 关闭时的清理工作
+    # 关闭时的清理工作：等待后台写入完成
+    task_cleanup.cancel()
+    if warmup is not None:
+        warmup.cancel()
+    from app.services.extraction_service import extraction_service
+    extraction_service.shutdown()
+    db_write_queue.shutdown()
+    db_executor.shutdown()
     print("👋 应用关闭")
+    shutdown_logging()
 
 
 # 创建FastAPI应用实例
@@ -69,6 +103,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 记录请求耗时指标
+if settings.metrics_enabled:
+    app.add_middleware(MetricsMiddleware)
+
+# 按请求统计 SQL 查询数和数据库耗时
+app.add_middleware(QueryProfilerMiddleware)
+
 
 @app.get("/")
 async def root():
@@ -90,6 +131,13 @@ async def health_check():
     }
 
 
+if settings.metrics_enabled:
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        """运行指标（Prometheus 文本格式）"""
+        return PlainTextResponse(metrics_registry.render(), media_type=CONTENT_TYPE_LATEST)
+
+
 @app.get("/config")
 async def get_config_info(config: settings = Depends(get_settings)):
     """获取配置信息（仅显示非敏感信息）"""
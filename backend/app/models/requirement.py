@@ -30,6 +30,7 @@ class RequirementFile(Base):
     file_path: Mapped[str] = mapped_column(String(500), nullable=False)
     file_size: Mapped[int] = mapped_column(Integer, nullable=False)
     file_type: Mapped[str] = mapped_column(String(50), nullable=False)
+    content_hash: Mapped[Optional[str]] = mapped_column(String(64), nullable=True, index=True)  # 文件内容SHA-256，相同内容共用存储
     uploaded_by: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
     
     # 文件内容提取
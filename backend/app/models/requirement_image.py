@@ -22,7 +22,7 @@ class RequirementImage(Base):
     )
     
     # 图片存储信息
-    image_path: Mapped[str] = mapped_column(String(500), nullable=False)
+    image_path: Mapped[str] = mapped_column(String(500), nullable=False, index=True)  # 相同内容的文件共享图片，按路径统计引用
     image_format: Mapped[str] = mapped_column(String(10), nullable=False)  # png/jpg/gif
     image_size: Mapped[int] = mapped_column(Integer, nullable=False)  # 字节大小
     
@@ -3,13 +3,19 @@
 支持重试机制、超时控制和并发配置
 """
 import json
+import logging
 import re
 import asyncio
+import inspect
 import os
 from datetime import datetime
 from typing import Dict, Any, Optional, List
 from sqlalchemy.orm import Session
 
+from app.core.logger import log_context, log_sampled
+from app.core.metrics import LLM_JSON_PARSE_FAILURES, LLM_RETRIES, LLM_TIMEOUTS, current_agent
+from app.core.tracing import trace_span, traced_semaphore
+from app.database import db_executor, db_write_queue
 from app.models.ai_config import Agent, AIModel
 from app.services.ai_service import ai_service
 from app.services.settings_service import SettingsService
@@ -21,6 +27,8 @@ from app.prompts import (
     TEST_CASE_BATCH_OPTIMIZE_USER
 )
 
+logger = logging.getLogger(__name__)
+
 
 class AgentServiceReal:
     """智能体服务类
@@ -65,6 +73,9 @@ class AgentServiceReal:
         self._task_timeout = self.DEFAULT_TASK_TIMEOUT
         self._retry_delay = self.DEFAULT_RETRY_DELAY
         self._config_loaded = False
+        # 会话不是线程安全的：同一服务实例上的数据库操作在执行器中串行执行
+        self._db_lock = asyncio.Lock()
+        self._agent_configs: Dict[int, Dict[str, Any]] = {}
     
     def _load_config(self) -> None:
         """从系统设置加载配置"""
@@ -77,9 +88,9 @@ class AgentServiceReal:
                 self._retry_count = config.retry_count
                 self._task_timeout = config.task_timeout
                 self._config_loaded = True
-                print(f"🔧 [AgentService] 已加载配置: retry_count={self._retry_count}, task_timeout={self._task_timeout}s")
+                logger.info(f"🔧 [AgentService] 已加载配置: retry_count={self._retry_count}, task_timeout={self._task_timeout}s")
         except Exception as e:
-            print(f"⚠️ [AgentService] 加载配置失败，使用默认值: {e}")
+            logger.warning(f"⚠️ [AgentService] 加载配置失败，使用默认值: {e}")
     
     def reload_config(self) -> None:
         """强制重新加载配置"""
@@ -104,11 +115,46 @@ class AgentServiceReal:
             return "- equivalence_partitioning: 等价类划分法\n- boundary_value: 边界值分析法\n- scenario: 场景法"
         return "\n".join([f"- {m.code}: {m.name}" for m in methods])
     
+    async def _run_db(self, fn, *args, **kwargs):
+        """在事件循环外执行 ``fn(self.db, *args, **kwargs)``"""
+        async with self._db_lock:
+            return await db_executor.run(fn, self.db, *args, **kwargs)
+    
+    async def _ensure_config(self) -> None:
+        """加载任务管理器与服务自身的并发配置（在事件循环外查询）"""
+        from app.services.async_task_manager import task_manager
+        
+        def load(db: Session) -> None:
+            task_manager.load_config_from_db(db)
+            self._load_config()
+        
+        if self.db:
+            await self._run_db(load)
+    
+    async def _get_prompt_options(self) -> Dict[str, str]:
+        """获取提示词中的测试类别与设计方法文本"""
+        def load(db: Optional[Session] = None) -> Dict[str, str]:
+            return {
+                "test_categories": self._get_test_categories_text(),
+                "design_methods": self._get_design_methods_text()
+            }
+        
+        if not self.db:
+            return load()
+        return await self._run_db(load)
+    
     async def _get_agent_config(self, agent_id: int) -> Dict[str, Any]:
-        """获取智能体配置"""
+        """获取智能体配置（同一服务实例内缓存，避免每次AI调用都查询数据库）"""
         if not self.db:
             raise Exception("数据库连接未初始化")
-        agent = self.db.query(Agent).filter(Agent.id == agent_id).first()
+        if agent_id not in self._agent_configs:
+            self._agent_configs[agent_id] = await self._run_db(self._query_agent_config, agent_id)
+        return self._agent_configs[agent_id]
+    
+    @staticmethod
+    def _query_agent_config(db: Session, agent_id: int) -> Dict[str, Any]:
+        """查询智能体及其AI模型配置"""
+        agent = db.query(Agent).filter(Agent.id == agent_id).first()
         if not agent:
             raise Exception(f"智能体不存在: {agent_id}")
         if not agent.is_active:
@@ -116,7 +162,7 @@ class AgentServiceReal:
         if not agent.system_prompt:
             raise Exception(f"智能体 {agent.name} 未配置系统提示词")
         
-        ai_model = self.db.query(AIModel).filter(AIModel.id == agent.ai_model_id).first()
+        ai_model = db.query(AIModel).filter(AIModel.id == agent.ai_model_id).first()
         if not ai_model:
             raise Exception("智能体关联的AI模型不存在")
         if not ai_model.api_key:
@@ -128,22 +174,28 @@ class AgentServiceReal:
             "base_url": ai_model.base_url,
             "temperature": agent.temperature,
             "max_tokens": agent.max_tokens,
-            "system_prompt": agent.system_prompt
+            "system_prompt": agent.system_prompt,
+            "agent_name": agent.name
         }
     
     async def _call_ai_once(self, config: Dict[str, Any], user_prompt: str, image_paths: Optional[List[str]] = None) -> str:
         """单次调用AI（不带重试）"""
-        if image_paths:
-            return await ai_service.call_ai_multimodal(
-                model=config["model"], text_content=user_prompt, image_paths=image_paths,
-                api_key=config["api_key"], base_url=config["base_url"],
-                system_prompt=config["system_prompt"], temperature=config["temperature"], max_tokens=config["max_tokens"]
+        # 指标按智能体区分
+        token = current_agent.set(config.get("agent_name", ""))
+        try:
+            if image_paths:
+                return await ai_service.call_ai_multimodal(
+                    model=config["model"], text_content=user_prompt, image_paths=image_paths,
+                    api_key=config["api_key"], base_url=config["base_url"],
+                    system_prompt=config["system_prompt"], temperature=config["temperature"], max_tokens=config["max_tokens"]
+                )
+            messages = [{"role": "system", "content": config["system_prompt"]}, {"role": "user", "content": user_prompt}]
+            return await ai_service.call_ai(
+                model=config["model"], messages=messages, api_key=config["api_key"],
+                base_url=config["base_url"], temperature=config["temperature"], max_tokens=config["max_tokens"]
             )
-        messages = [{"role": "system", "content": config["system_prompt"]}, {"role": "user", "content": user_prompt}]
-        return await ai_service.call_ai(
-            model=config["model"], messages=messages, api_key=config["api_key"],
-            base_url=config["base_url"], temperature=config["temperature"], max_tokens=config["max_tokens"]
-        )
+        finally:
+            current_agent.reset(token)
     
     async def _call_ai(self, config: Dict[str, Any], user_prompt: str, image_paths: Optional[List[str]] = None) -> str:
         """调用AI（带重试和超时机制）
@@ -155,35 +207,43 @@ class AgentServiceReal:
         self._load_config()
         
         last_error = None
+        retry_reason = None
+        agent_name = config.get("agent_name", "")
         max_attempts = self._retry_count + 1  # 重试次数 + 首次尝试
         
         for attempt in range(max_attempts):
             try:
                 # 使用超时控制
-                result = await asyncio.wait_for(
-                    self._call_ai_once(config, user_prompt, image_paths),
-                    timeout=self._task_timeout
-                )
+                with trace_span("llm_attempt", agent=agent_name, attempt=attempt + 1):
+                    result = await asyncio.wait_for(
+                        self._call_ai_once(config, user_prompt, image_paths),
+                        timeout=self._task_timeout
+                    )
                 
                 if attempt > 0:
-                    print(f"✅ AI调用成功 (第 {attempt + 1} 次尝试)")
+                    logger.info(f"✅ AI调用成功 (第 {attempt + 1} 次尝试)")
                 
                 return result
                 
             except asyncio.TimeoutError:
                 last_error = f"AI调用超时（超过{self._task_timeout}秒）"
-                print(f"⏱️ AI调用超时 (尝试 {attempt + 1}/{max_attempts}): {last_error}")
+                retry_reason = "timeout"
+                LLM_TIMEOUTS.inc(agent=agent_name)
+                logger.warning(f"⏱️ AI调用超时 (尝试 {attempt + 1}/{max_attempts}): {last_error}")
                 
             except Exception as e:
                 last_error = str(e)
-                print(f"❌ AI调用失败 (尝试 {attempt + 1}/{max_attempts}): {last_error}")
+                retry_reason = "error"
+                logger.error(f"❌ AI调用失败 (尝试 {attempt + 1}/{max_attempts}): {last_error}")
             
             # 如果还有重试机会，等待后重试
             if attempt < max_attempts - 1:
+                LLM_RETRIES.inc(agent=agent_name, reason=retry_reason)
                 # 指数退避：1s, 2s, 4s, 8s...
                 delay = self._retry_delay * (2 ** attempt)
-                print(f"⏳ 等待 {delay} 秒后重试...")
-                await asyncio.sleep(delay)
+                logger.info(f"⏳ 等待 {delay} 秒后重试...")
+                with trace_span("retry_backoff", reason=retry_reason, delay=delay):
+                    await asyncio.sleep(delay)
         
         # 所有重试都失败
         raise Exception(f"AI调用失败（已重试{self._retry_count}次）: {last_error}")
@@ -216,23 +276,23 @@ class AgentServiceReal:
                 result = self._parse_json(response)
                 
                 if attempt > 0:
-                    print(f"✅ AI调用并解析成功 (第 {attempt + 1} 次尝试)")
+                    logger.info(f"✅ AI调用并解析成功 (第 {attempt + 1} 次尝试)")
                 
                 return result
                 
             except asyncio.TimeoutError:
                 last_error = f"AI调用超时（超过{self._task_timeout}秒）"
-                print(f"⏱️ AI调用超时 (尝试 {attempt + 1}/{max_attempts}): {last_error}")
+                logger.warning(f"⏱️ AI调用超时 (尝试 {attempt + 1}/{max_attempts}): {last_error}")
                 
             except Exception as e:
                 last_error = str(e)
                 error_type = "JSON解析失败" if "无法解析JSON" in str(e) else "AI调用失败"
-                print(f"❌ {error_type} (尝试 {attempt + 1}/{max_attempts}): {last_error}")
+                logger.error(f"❌ {error_type} (尝试 {attempt + 1}/{max_attempts}): {last_error}")
             
             # 如果还有重试机会，等待后重试
             if attempt < max_attempts - 1:
                 delay = self._retry_delay * (2 ** attempt)
-                print(f"⏳ 等待 {delay} 秒后重试...")
+                logger.info(f"⏳ 等待 {delay} 秒后重试...")
                 await asyncio.sleep(delay)
         
         # 所有重试都失败
@@ -252,13 +312,15 @@ class AgentServiceReal:
         for attempt in range(max_attempts):
             try:
                 # 调用AI（已包含网络重试）
-                response = await self._call_ai(config, user_prompt, image_paths)
+                with trace_span("llm_call", agent=config.get("agent_name", ""), attempt=attempt + 1):
+                    response = await self._call_ai(config, user_prompt, image_paths)
                 
                 # 尝试解析JSON
-                result = self._parse_json(response)
+                with trace_span("parse_json", chars=len(response)):
+                    result = self._parse_json(response)
                 
                 if attempt > 0:
-                    print(f"✅ JSON解析成功 (第 {attempt + 1} 次尝试)")
+                    logger.info(f"✅ JSON解析成功 (第 {attempt + 1} 次尝试)")
                 
                 return result
                 
@@ -268,16 +330,19 @@ class AgentServiceReal:
                 # 判断是否是JSON解析错误
                 if "无法解析JSON" in error_msg:
                     last_error = f"JSON解析失败: {error_msg}"
-                    print(f"📝 JSON解析失败 (尝试 {attempt + 1}/{max_attempts}): AI返回格式错误")
+                    LLM_JSON_PARSE_FAILURES.inc(agent=config.get("agent_name", ""))
+                    logger.warning(f"📝 JSON解析失败 (尝试 {attempt + 1}/{max_attempts}): AI返回格式错误")
                 else:
                     # 其他错误（网络、超时等）已经在 _call_ai 中重试过了
                     raise
                 
                 # 如果还有重试机会，等待后重试
                 if attempt < max_attempts - 1:
+                    LLM_RETRIES.inc(agent=config.get("agent_name", ""), reason="json_parse")
                     delay = self._retry_delay * (2 ** attempt)
-                    print(f"⏳ 等待 {delay} 秒后重新请求AI...")
-                    await asyncio.sleep(delay)
+                    logger.info(f"⏳ 等待 {delay} 秒后重新请求AI...")
+                    with trace_span("retry_backoff", reason="json_parse", delay=delay):
+                        await asyncio.sleep(delay)
         
         # 所有重试都失败
         raise Exception(f"AI响应解析失败（已重试{self._retry_count}次）: {last_error}")
@@ -288,7 +353,7 @@ class AgentServiceReal:
         try:
             return json.loads(response)
         except Exception as e1:
-            print(f"⚠️ 直接JSON解析失败: {str(e1)[:100]}")
+            logger.warning(f"⚠️ 直接JSON解析失败: {str(e1)[:100]}")
         
         # 2. 提取 ```json ... ``` 代码块
         match = re.search(r'```json\s*([\s\S]*?)\s*```', response)
@@ -296,7 +361,7 @@ class AgentServiceReal:
             try:
                 return json.loads(match.group(1))
             except Exception as e2:
-                print(f"⚠️ 代码块JSON解析失败: {str(e2)[:100]}")
+                logger.warning(f"⚠️ 代码块JSON解析失败: {str(e2)[:100]}")
         
         # 3. 提取第一个 {...} 块
         match = re.search(r'\{[\s\S]*\}', response)
@@ -304,7 +369,7 @@ class AgentServiceReal:
             try:
                 return json.loads(match.group(0))
             except Exception as e3:
-                print(f"⚠️ 花括号块JSON解析失败: {str(e3)[:100]}")
+                logger.warning(f"⚠️ 花括号块JSON解析失败: {str(e3)[:100]}")
         
         # 保存完整响应到日志文件
         from pathlib import Path
@@ -327,22 +392,21 @@ class AgentServiceReal:
                 f"{'-'*80}\n",
                 encoding='utf-8'
             )
-            print(f"📁 完整响应已保存到: {log_file}")
+            logger.info(f"📁 完整响应已保存到: {log_file}")
         except Exception as save_err:
-            print(f"⚠️ 保存日志文件失败: {save_err}")
+            logger.warning(f"⚠️ 保存日志文件失败: {save_err}")
         
-        # 打印原始响应用于调试
-        print(f"\n{'='*80}")
-        print(f"❌ JSON解析完全失败")
-        print(f"{'='*80}")
-        print(f"响应长度: {len(response)} 字符")
-        print(f"原始响应 (前1000字符):")
-        print(response[:1000])
-        if len(response) > 1000:
-            print(f"\n... (省略 {len(response) - 1000} 字符) ...\n")
-            print(f"原始响应 (最后500字符):")
-            print(response[-500:])
-        print(f"{'='*80}\n")
+        # 原始响应只在调试级别输出
+        logger.error(f"❌ JSON解析完全失败，响应长度: {len(response)} 字符")
+        if logger.isEnabledFor(logging.DEBUG):
+            if len(response) > 1000:
+                logger.debug(
+                    f"原始响应 (前1000字符):\n{response[:1000]}\n"
+                    f"... (省略 {len(response) - 1000} 字符) ...\n"
+                    f"原始响应 (最后500字符):\n{response[-500:]}"
+                )
+            else:
+                logger.debug(f"原始响应:\n{response}")
         
         raise Exception(f"无法解析JSON: {response[:200]}...")
 
@@ -359,11 +423,12 @@ class AgentServiceReal:
     async def generate_test_points(self, agent_id: int, requirement_content: str) -> Dict[str, Any]:
         """生成测试点"""
         config = await self._get_agent_config(agent_id)
+        prompt_options = await self._get_prompt_options()
         user_prompt = render_prompt(
             TEST_POINT_USER, 
             content=requirement_content, 
-            test_categories=self._get_test_categories_text(),
-            design_methods=self._get_design_methods_text()
+            test_categories=prompt_options["test_categories"],
+            design_methods=prompt_options["design_methods"]
         )
         return await self._call_ai_with_parse(config, user_prompt)
     
@@ -424,37 +489,34 @@ class AgentServiceReal:
         )
         
         count = len(test_points)
-        print(f"\n🎯 测试用例设计: {count} 个测试点")
-        if count <= 3:
+        logger.info(f"🎯 测试用例设计: {count} 个测试点")
+        if count <= 3 and logger.isEnabledFor(logging.DEBUG):
             for tp in test_points:
                 preview = tp.get('content', '')[:40]
-                print(f"   - {preview}... (方法: {tp.get('design_method', 'N/A')})")
+                logger.debug(f"   - {preview}... (方法: {tp.get('design_method', 'N/A')})")
         
         result = await self._call_ai_with_parse(config, user_prompt)
         
-        # 打印完整原始输出
-        print(f"\n{'='*80}")
-        print(f"📋 批量生成原始输出 (测试点数量: {count})")
-        print(f"{'='*80}")
-        print(json.dumps(result, ensure_ascii=False, indent=2))
-        print(f"{'='*80}\n")
+        # 完整原始输出只在调试级别序列化和输出
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"📋 批量生成原始输出 (测试点数量: {count}):\n{json.dumps(result, ensure_ascii=False, indent=2)}")
         
         # 提取测试用例数组
         test_cases = result.get('test_cases', [])
         
         # 验证数量匹配
         if len(test_cases) != len(test_points):
-            print(f"⚠️ 警告：测试用例数量不匹配（期望{len(test_points)}，实际{len(test_cases)}）")
+            logger.warning(f"⚠️ 警告：测试用例数量不匹配（期望{len(test_points)}，实际{len(test_cases)}）")
             # 如果数量不匹配，尝试补齐或截断
             if len(test_cases) < len(test_points):
-                print(f"⚠️ 测试用例数量不足，将使用空对象补齐")
+                logger.warning(f"⚠️ 测试用例数量不足，将使用空对象补齐")
                 while len(test_cases) < len(test_points):
                     test_cases.append({})
             elif len(test_cases) > len(test_points):
-                print(f"⚠️ 测试用例数量过多，将截断")
+                logger.warning(f"⚠️ 测试用例数量过多，将截断")
                 test_cases = test_cases[:len(test_points)]
         
-        print(f"✅ 生成 {len(test_cases)} 个测试用例")
+        logger.info(f"✅ 生成 {len(test_cases)} 个测试用例")
         
         return test_cases
     
@@ -492,10 +554,7 @@ class AgentServiceReal:
         """
         try:
             # 加载配置
-            if self.db:
-                from app.services.async_task_manager import task_manager
-                task_manager.load_config_from_db(self.db)
-                self._load_config()
+            await self._ensure_config()
             
             # 调用分析方法
             result = await self.analyze_requirements(
@@ -511,7 +570,7 @@ class AgentServiceReal:
             }
             
         except Exception as e:
-            print(f"❌ 需求分析失败: {e}")
+            logger.error(f"❌ 需求分析失败: {e}")
             return {
                 "success": False,
                 "error": str(e)
@@ -539,29 +598,30 @@ class AgentServiceReal:
             progress_scale: 进度缩放比例（0-1）
         """
         from app.services.async_task_manager import task_manager
-        if self.db:
-            task_manager.load_config_from_db(self.db)
-            self._load_config()  # 同步加载配置
+        await self._ensure_config()
         
         concurrency = task_manager.max_concurrent_tasks
         
-        print(f"\n🚀 并发测试点生成: {len(requirement_points)} 个需求点")
-        print(f"🔧 配置: 并发={concurrency}, 重试={self._retry_count}次, 超时={self._task_timeout}s")
+        logger.info(f"🚀 并发测试点生成: {len(requirement_points)} 个需求点")
+        logger.info(f"🔧 配置: 并发={concurrency}, 重试={self._retry_count}次, 超时={self._task_timeout}s")
         
         # 清空这些需求点相关的旧测试点（级联删除测试用例）
         if self.db and requirement_points:
             from app.models.testcase import TestPoint
             req_point_ids = [rp.get("id") for rp in requirement_points if rp.get("id")]
             if req_point_ids:
-                old_test_points = self.db.query(TestPoint).filter(
-                    TestPoint.requirement_point_id.in_(req_point_ids)
-                ).all()
-                
-                if old_test_points:
-                    print(f"🗑️  清空 {len(old_test_points)} 个旧测试点（及其关联的测试用例）")
+                def clear_old_test_points(db: Session) -> int:
+                    old_test_points = db.query(TestPoint).filter(
+                        TestPoint.requirement_point_id.in_(req_point_ids)
+                    ).all()
                     for tp in old_test_points:
-                        self.db.delete(tp)
-                    self.db.flush()
+                        db.delete(tp)
+                    return len(old_test_points)
+                
+                # 经由写入队列立即提交，避免写事务跨越 AI 调用持有写锁
+                deleted_count = await db_write_queue.run(clear_old_test_points)
+                if deleted_count:
+                    logger.info(f"🗑️  清空 {deleted_count} 个旧测试点（及其关联的测试用例）")
         
         try:
             all_points = []
@@ -573,49 +633,50 @@ class AgentServiceReal:
                 """处理单个需求点"""
                 nonlocal completed
                 
-                async with semaphore:  # 控制并发
-                    try:
-                        # 单个需求点生成测试点
-                        result = await self.generate_test_points(agent_id, req_point.get('content', str(req_point)))
+                with log_context(batch_id=idx + 1), trace_span("test_point_batch", batch_id=idx + 1):
+                    async with traced_semaphore(semaphore):  # 控制并发
+                        try:
+                            # 单个需求点生成测试点
+                            result = await self.generate_test_points(agent_id, req_point.get('content', str(req_point)))
                         
-                        test_points = result.get("test_points", [])
-                        # 关联需求点ID
-                        for tp in test_points:
-                            tp["requirement_point_id"] = req_point.get("id")
+                            test_points = result.get("test_points", [])
+                            # 关联需求点ID
+                            for tp in test_points:
+                                tp["requirement_point_id"] = req_point.get("id")
                         
-                        print(f"✅ [{idx+1}/{len(requirement_points)}] 需求点生成 {len(test_points)} 个测试点")
+                            logger.info(f"✅ [{idx+1}/{len(requirement_points)}] 需求点生成 {len(test_points)} 个测试点")
                         
-                        # 更新进度（线程安全）
-                        async with lock:
-                            completed += 1
-                            all_points.extend(test_points)
-                            if task_id:
-                                raw_progress = (completed / len(requirement_points)) * 100
-                                scaled_progress = progress_offset + raw_progress * progress_scale
-                                task_manager.update_progress(task_id, int(scaled_progress))
+                            # 更新进度（线程安全）
+                            async with lock:
+                                completed += 1
+                                all_points.extend(test_points)
+                                if task_id:
+                                    raw_progress = (completed / len(requirement_points)) * 100
+                                    scaled_progress = progress_offset + raw_progress * progress_scale
+                                    task_manager.update_progress(task_id, int(scaled_progress))
                         
-                        return test_points
+                            return test_points
                         
-                    except Exception as e:
-                        print(f"❌ [{idx+1}/{len(requirement_points)}] 需求点生成失败: {e}")
-                        # 更新进度（即使失败也要更新）
-                        async with lock:
-                            completed += 1
-                            if task_id:
-                                raw_progress = (completed / len(requirement_points)) * 100
-                                scaled_progress = progress_offset + raw_progress * progress_scale
-                                task_manager.update_progress(task_id, int(scaled_progress))
-                        return []
+                        except Exception as e:
+                            logger.error(f"❌ [{idx+1}/{len(requirement_points)}] 需求点生成失败: {e}")
+                            # 更新进度（即使失败也要更新）
+                            async with lock:
+                                completed += 1
+                                if task_id:
+                                    raw_progress = (completed / len(requirement_points)) * 100
+                                    scaled_progress = progress_offset + raw_progress * progress_scale
+                                    task_manager.update_progress(task_id, int(scaled_progress))
+                            return []
             
             # 并发处理所有需求点
             await asyncio.gather(*[process_requirement(rp, i) for i, rp in enumerate(requirement_points)])
             
-            print(f"🎉 测试点生成完成, 共生成 {len(all_points)} 个测试点")
+            logger.info(f"🎉 测试点生成完成, 共生成 {len(all_points)} 个测试点")
             
             return {"success": True, "data": {"test_points": all_points}}
             
         except Exception as e:
-            print(f"❌ 测试点生成失败: {e}")
+            logger.error(f"❌ 测试点生成失败: {e}")
             return {"success": False, "error": str(e)}
     
 
@@ -639,41 +700,42 @@ class AgentServiceReal:
             user_id: 用户ID
             agent_id: 智能体ID
             task_id: 任务ID（用于进度更新）
-            on_batch_complete: 批次完成回调函数，签名: (test_cases: List[dict]) -> int
+            on_batch_complete: 批次完成回调函数，签名: (test_cases: List[dict]) -> int，也可以是返回 int 的协程函数
             progress_offset: 进度偏移量（用于多阶段任务）
             progress_scale: 进度缩放比例（用于多阶段任务）
         """
         from app.services.async_task_manager import task_manager
         from app.models.requirement import RequirementFile
         
-        if self.db:
-            task_manager.load_config_from_db(self.db)
-            self._load_config()  # 同步加载配置
+        await self._ensure_config()
         concurrency = task_manager.max_concurrent_tasks
         
-        print(f"\n🚀 批量测试用例设计: {len(test_points)} 个测试点 (批次生成)")
-        print(f"🔧 配置: 并发={concurrency}, 重试={self._retry_count}次, 超时={self._task_timeout}s")
+        logger.info(f"🚀 批量测试用例设计: {len(test_points)} 个测试点 (批次生成)")
+        logger.info(f"🔧 配置: 并发={concurrency}, 重试={self._retry_count}次, 超时={self._task_timeout}s")
         
         # 查询该模块的所有需求文档
         requirement_content = ""
         if self.db:
             try:
-                requirement_files = self.db.query(RequirementFile).filter(
-                    RequirementFile.module_id == module_id,
-                    RequirementFile.is_extracted == True
-                ).all()
+                def load_requirement_files(db: Session) -> List[tuple]:
+                    return db.query(RequirementFile.filename, RequirementFile.extracted_content).filter(
+                        RequirementFile.module_id == module_id,
+                        RequirementFile.is_extracted == True
+                    ).all()
+                
+                requirement_files = await self._run_db(load_requirement_files)
                 
                 if requirement_files:
                     content_parts = []
-                    for file in requirement_files:
-                        if file.extracted_content:
-                            content_parts.append(f"【需求文档：{file.filename}】\n{file.extracted_content}")
+                    for filename, extracted_content in requirement_files:
+                        if extracted_content:
+                            content_parts.append(f"【需求文档：{filename}】\n{extracted_content}")
                     requirement_content = "\n\n---\n\n".join(content_parts)
-                    print(f"📄 已加载 {len(requirement_files)} 个需求文档作为上下文")
+                    logger.info(f"📄 已加载 {len(requirement_files)} 个需求文档作为上下文")
                 else:
-                    print(f"⚠️ 模块 {module_id} 没有找到需求文档")
+                    logger.warning(f"⚠️ 模块 {module_id} 没有找到需求文档")
             except Exception as e:
-                print(f"⚠️ 查询需求文档失败: {e}")
+                logger.warning(f"⚠️ 查询需求文档失败: {e}")
         
         try:
             all_cases = []
@@ -689,84 +751,82 @@ class AgentServiceReal:
                 for i in range(0, len(test_points), BATCH_SIZE)
             ]
             
-            print(f"📦 智能分组: {len(test_points)} 个测试点 → {len(batches)} 个批次（每批最多{BATCH_SIZE}个）")
+            logger.info(f"📦 智能分组: {len(test_points)} 个测试点 → {len(batches)} 个批次（每批最多{BATCH_SIZE}个）")
             
             async def process_batch(batch, batch_idx):
                 nonlocal completed, total_saved
-                async with semaphore:
-                    try:
-                        batch_size = len(batch)
-                        print(f"\n🔄 批次 {batch_idx+1}/{len(batches)}: 处理 {batch_size} 个测试点")
+                with log_context(batch_id=batch_idx + 1), trace_span("test_case_batch", batch_id=batch_idx + 1):
+                    async with traced_semaphore(semaphore):
+                        try:
+                            batch_size = len(batch)
+                            logger.info(f"🔄 批次 {batch_idx+1}/{len(batches)}: 处理 {batch_size} 个测试点")
                         
-                        # 批量调用AI（一次生成多个）
-                        cases = await self.design_test_cases_batch(
-                            agent_id=agent_id,
-                            test_points=batch,
-                            requirement_content=requirement_content
-                        )
+                            # 批量调用AI（一次生成多个）
+                            cases = await self.design_test_cases_batch(
+                                agent_id=agent_id,
+                                test_points=batch,
+                                requirement_content=requirement_content
+                            )
                         
-                        # 继承测试点的属性
-                        for i, case in enumerate(cases):
-                            if i < len(batch):
-                                tp = batch[i]
-                                case["test_point_id"] = tp.get('id')
-                                case["test_type"] = tp.get('test_type', 'functional')
-                                case["design_method"] = tp.get('design_method')
-                                case["priority"] = tp.get('priority', 'medium')
-                                case["created_by_ai"] = True
+                            # 继承测试点的属性
+                            for i, case in enumerate(cases):
+                                if i < len(batch):
+                                    tp = batch[i]
+                                    case["test_point_id"] = tp.get('id')
+                                    case["test_type"] = tp.get('test_type', 'functional')
+                                    case["design_method"] = tp.get('design_method')
+                                    case["priority"] = tp.get('priority', 'medium')
+                                    case["created_by_ai"] = True
                                 
-                                if batch_size <= 3:  # 小批次显示详细信息
-                                    print(f"   📝 用例: {case.get('title', '')[:30]}... (继承: {case['test_type']}/{case['design_method']}/{case['priority']})")
+                                    log_sampled(
+                                        logger, logging.DEBUG, "design_case",
+                                        f"   📝 用例: {case.get('title', '')[:30]}... (继承: {case['test_type']}/{case['design_method']}/{case['priority']})"
+                                    )
                         
-                        # 保存到数据库
-                        saved_count = 0
-                        if on_batch_complete and cases:
-                            try:
-                                saved_count = on_batch_complete(cases)
-                                print(f"💾 批次 {batch_idx+1}: 已保存 {saved_count} 个用例到数据库")
-                            except Exception as save_err:
-                                print(f"⚠️ 批次 {batch_idx+1}: 保存失败 - {save_err}")
+                            # 保存到数据库
+                            saved_count = 0
+                            if on_batch_complete and cases:
+                                try:
+                                    saved_count = on_batch_complete(cases)
+                                    if inspect.isawaitable(saved_count):
+                                        saved_count = await saved_count
+                                    logger.info(f"💾 批次 {batch_idx+1}: 已保存 {saved_count} 个用例到数据库")
+                                except Exception as save_err:
+                                    logger.warning(f"⚠️ 批次 {batch_idx+1}: 保存失败 - {save_err}")
                         
-                        async with lock:
-                            completed += batch_size
-                            total_saved += saved_count
-                            all_cases.extend(cases)
-                            if task_id:
-                                # 计算带偏移的进度
-                                raw_progress = (completed / len(test_points)) * 100
-                                scaled_progress = progress_offset + raw_progress * progress_scale
-                                task_manager.update_progress(task_id, int(scaled_progress))
+                            async with lock:
+                                completed += batch_size
+                                total_saved += saved_count
+                                all_cases.extend(cases)
+                                if task_id:
+                                    # 计算带偏移的进度
+                                    raw_progress = (completed / len(test_points)) * 100
+                                    scaled_progress = progress_offset + raw_progress * progress_scale
+                                    task_manager.update_progress(task_id, int(scaled_progress))
                         
-                        print(f"✅ 批次 {batch_idx+1}/{len(batches)}: 完成，生成 {len(cases)} 个用例")
-                        return cases
+                            logger.info(f"✅ 批次 {batch_idx+1}/{len(batches)}: 完成，生成 {len(cases)} 个用例")
+                            return cases
                         
-                    except Exception as e:
-                        import traceback
-                        print(f"\n{'='*80}")
-                        print(f"❌ 批次 {batch_idx+1}/{len(batches)}: 失败")
-                        print(f"{'='*80}")
-                        print(f"错误类型: {type(e).__name__}")
-                        print(f"错误信息: {str(e)}")
-                        print(f"测试点数量: {len(batch)}")
-                        print(f"测试点内容:")
-                        for i, tp in enumerate(batch):
-                            print(f"  {i+1}. {tp.get('content', 'N/A')[:50]}... (方法: {tp.get('design_method', 'N/A')})")
-                        print(f"\n完整堆栈:")
-                        traceback.print_exc()
-                        print(f"{'='*80}\n")
-                        # 标记批次失败，但继续处理其他批次
-                        async with lock:
-                            completed += len(batch)
-                            if task_id:
-                                raw_progress = (completed / len(test_points)) * 100
-                                scaled_progress = progress_offset + raw_progress * progress_scale
-                                task_manager.update_progress(task_id, int(scaled_progress))
-                        return []
+                        except Exception as e:
+                            logger.exception(
+                                f"❌ 批次 {batch_idx+1}/{len(batches)}: 失败 ({type(e).__name__}: {e})，测试点数量: {len(batch)}"
+                            )
+                            if logger.isEnabledFor(logging.DEBUG):
+                                for i, tp in enumerate(batch):
+                                    logger.debug(f"  {i+1}. {tp.get('content', 'N/A')[:50]}... (方法: {tp.get('design_method', 'N/A')})")
+                            # 标记批次失败，但继续处理其他批次
+                            async with lock:
+                                completed += len(batch)
+                                if task_id:
+                                    raw_progress = (completed / len(test_points)) * 100
+                                    scaled_progress = progress_offset + raw_progress * progress_scale
+                                    task_manager.update_progress(task_id, int(scaled_progress))
+                            return []
             
             # 并发处理所有批次
             await asyncio.gather(*[process_batch(batch, i) for i, batch in enumerate(batches)])
             
-            print(f"🎉 完成, 共 {len(all_cases)} 个用例, 已保存 {total_saved} 个")
+            logger.info(f"🎉 完成, 共 {len(all_cases)} 个用例, 已保存 {total_saved} 个")
             return {
                 "success": True, 
                 "data": {
@@ -849,9 +909,7 @@ class AgentServiceReal:
             progress_scale: 进度缩放比例（用于多阶段任务）
         """
         from app.services.async_task_manager import task_manager
-        if self.db:
-            task_manager.load_config_from_db(self.db)
-            self._load_config()  # 同步加载配置
+        await self._ensure_config()
         
         BATCH_SIZE = 3  # 每批次最多3个用例（减小批次大小，避免超时）
         concurrency = task_manager.max_concurrent_tasks  # 使用系统设置的并发数
@@ -860,8 +918,8 @@ class AgentServiceReal:
         batches = [original_test_cases[i:i+BATCH_SIZE] for i in range(0, len(original_test_cases), BATCH_SIZE)]
         total_batches = len(batches)
         
-        print(f"\n🚀 批量测试用例优化: {len(original_test_cases)} 个用例, 分 {total_batches} 批处理")
-        print(f"🔧 配置: 并发={concurrency}, 重试={self._retry_count}次, 超时={self._task_timeout}s")
+        logger.info(f"🚀 批量测试用例优化: {len(original_test_cases)} 个用例, 分 {total_batches} 批处理")
+        logger.info(f"🔧 配置: 并发={concurrency}, 重试={self._retry_count}次, 超时={self._task_timeout}s")
         
         try:
             all_results = []
@@ -873,90 +931,91 @@ class AgentServiceReal:
                 """处理单个批次"""
                 nonlocal completed
                 
-                async with semaphore:  # 控制并发
-                    # 简化传给AI的数据
-                    simplified_batch = [self._simplify_test_case(tc) for tc in batch]
+                with log_context(batch_id=batch_idx + 1), trace_span("optimize_batch", batch_id=batch_idx + 1):
+                    async with traced_semaphore(semaphore):  # 控制并发
+                        # 简化传给AI的数据
+                        simplified_batch = [self._simplify_test_case(tc) for tc in batch]
                     
-                    print(f"📦 处理第 {batch_idx+1}/{total_batches} 批，共 {len(batch)} 个用例")
+                        logger.info(f"📦 处理第 {batch_idx+1}/{total_batches} 批，共 {len(batch)} 个用例")
                     
-                    batch_results = []
+                        batch_results = []
                     
-                    try:
-                        # 一次AI调用处理整批
-                        result = await self.optimize_test_cases(agent_id, simplified_batch)
-                        optimized_cases = result.get("optimized_cases", [])
+                        try:
+                            # 一次AI调用处理整批
+                            result = await self.optimize_test_cases(agent_id, simplified_batch)
+                            optimized_cases = result.get("optimized_cases", [])
                         
-                        # 创建id到原始用例的映射
-                        original_map = {tc.get("id"): tc for tc in batch}
+                            # 创建id到原始用例的映射
+                            original_map = {tc.get("id"): tc for tc in batch}
                         
-                        # 处理返回的优化结果
-                        for opt in optimized_cases:
-                            tc_id = opt.get("id")
-                            original = original_map.get(tc_id)
-                            if original:
-                                normalized = self._normalize_test_case(opt)
-                                if normalized and normalized.get("title"):
-                                    normalized["id"] = tc_id
-                                    batch_results.append({
-                                        "original": original,
-                                        "optimized": normalized,
-                                        "success": True,
-                                        "improvements": []
-                                    })
-                                    print(f"   ✅ [{batch_idx+1}] 优化成功: {normalized.get('title', '')[:30]}...")
-                                else:
+                            # 处理返回的优化结果
+                            for opt in optimized_cases:
+                                tc_id = opt.get("id")
+                                original = original_map.get(tc_id)
+                                if original:
+                                    normalized = self._normalize_test_case(opt)
+                                    if normalized and normalized.get("title"):
+                                        normalized["id"] = tc_id
+                                        batch_results.append({
+                                            "original": original,
+                                            "optimized": normalized,
+                                            "success": True,
+                                            "improvements": []
+                                        })
+                                        log_sampled(logger, logging.DEBUG, "optimize_case", f"   ✅ [{batch_idx+1}] 优化成功: {normalized.get('title', '')[:30]}...")
+                                    else:
+                                        batch_results.append({
+                                            "original": original,
+                                            "optimized": None,
+                                            "success": False,
+                                            "error": "优化结果无效"
+                                        })
+                        
+                            # 检查是否有遗漏的用例
+                            returned_ids = {opt.get("id") for opt in optimized_cases}
+                            for tc in batch:
+                                if tc.get("id") not in returned_ids:
                                     batch_results.append({
-                                        "original": original,
+                                        "original": tc,
                                         "optimized": None,
                                         "success": False,
-                                        "error": "优化结果无效"
+                                        "error": "AI未返回该用例的优化结果"
                                     })
+                                    logger.warning(f"   ⚠️ [{batch_idx+1}] 用例 {tc.get('id')} 未被优化")
                         
-                        # 检查是否有遗漏的用例
-                        returned_ids = {opt.get("id") for opt in optimized_cases}
-                        for tc in batch:
-                            if tc.get("id") not in returned_ids:
+                        except Exception as e:
+                            logger.error(f"❌ 第 {batch_idx+1} 批处理失败: {e}")
+                            for tc in batch:
                                 batch_results.append({
                                     "original": tc,
                                     "optimized": None,
                                     "success": False,
-                                    "error": "AI未返回该用例的优化结果"
+                                    "error": str(e)
                                 })
-                                print(f"   ⚠️ [{batch_idx+1}] 用例 {tc.get('id')} 未被优化")
-                        
-                    except Exception as e:
-                        print(f"❌ 第 {batch_idx+1} 批处理失败: {e}")
-                        for tc in batch:
-                            batch_results.append({
-                                "original": tc,
-                                "optimized": None,
-                                "success": False,
-                                "error": str(e)
-                            })
                     
-                    # 更新进度（线程安全）
-                    async with lock:
-                        completed += 1
-                        all_results.extend(batch_results)
-                        if task_id:
-                            raw_progress = (completed / total_batches) * 100
-                            scaled_progress = progress_offset + raw_progress * progress_scale
-                            # 更新进度和消息
-                            success_in_batch = sum(1 for r in batch_results if r.get("success"))
-                            total_success = sum(1 for r in all_results if r.get("success"))
-                            task_manager.update_progress(
-                                task_id, 
-                                int(scaled_progress), 
-                                f"正在优化测试用例... ({total_success}/{len(original_test_cases)})"
-                            )
+                        # 更新进度（线程安全）
+                        async with lock:
+                            completed += 1
+                            all_results.extend(batch_results)
+                            if task_id:
+                                raw_progress = (completed / total_batches) * 100
+                                scaled_progress = progress_offset + raw_progress * progress_scale
+                                # 更新进度和消息
+                                success_in_batch = sum(1 for r in batch_results if r.get("success"))
+                                total_success = sum(1 for r in all_results if r.get("success"))
+                                task_manager.update_progress(
+                                    task_id, 
+                                    int(scaled_progress), 
+                                    f"正在优化测试用例... ({total_success}/{len(original_test_cases)})"
+                                )
                     
-                    return batch_results
+                        return batch_results
             
             # 并发处理所有批次
             await asyncio.gather(*[process_batch(i, batch) for i, batch in enumerate(batches)])
             
             success_count = sum(1 for r in all_results if r.get("success"))
-            print(f"🎉 优化完成, 成功 {success_count}/{len(original_test_cases)} 个")
+            logger.info(f"🎉 优化完成, 成功 {success_count}/{len(original_test_cases)} 个")
             
             return {"success": True, "data": {
                 "optimized_results": all_results,
@@ -994,152 +1053,154 @@ class AgentServiceReal:
         from app.models.requirement import RequirementPoint
         from app.models.testcase import TestPoint, TestCase
         
-        if self.db:
-            task_manager.load_config_from_db(self.db)
-            self._load_config()
+        await self._ensure_config()
         
         try:
             # ========== 阶段1：生成需求点 (0-25%) ==========
             if task_id:
                 task_manager.update_progress(task_id, 0, "正在分析需求文档...")
             
-            print("\n" + "="*60)
-            print("🚀 开始完整生成流程")
-            print("="*60)
-            print(f"📄 需求文件ID: {file_id}")
-            print(f"📦 模块ID: {module_id}")
-            print(f"👤 用户ID: {user_id}")
+            logger.info("🚀 开始完整生成流程")
+            logger.info(f"📄 需求文件ID: {file_id}")
+            logger.info(f"📦 模块ID: {module_id}")
+            logger.info(f"👤 用户ID: {user_id}")
             
             # ========== 清空现有数据 ==========
             # 清空该需求文件相关的所有需求点（级联删除会自动删除关联的测试点和测试用例）
-            existing_points = self.db.query(RequirementPoint).filter(
-                RequirementPoint.requirement_file_id == file_id
-            ).all()
-            
-            if existing_points:
-                print(f"\n🗑️  清空现有数据: {len(existing_points)} 个需求点（及其关联的测试点和测试用例）")
+            # 所有写操作经由写入队列立即提交，不在 AI 调用期间持有写锁
+            def clear_existing_points(db: Session) -> int:
+                existing_points = db.query(RequirementPoint).filter(
+                    RequirementPoint.requirement_file_id == file_id
+                ).all()
                 for point in existing_points:
-                    self.db.delete(point)
-                self.db.flush()
+                    db.delete(point)
+                return len(existing_points)
+            
+            with trace_span("db.clear_existing"):
+                cleared_count = await db_write_queue.run(clear_existing_points)
+            if cleared_count:
+                logger.info(f"🗑️  清空现有数据: {cleared_count} 个需求点（及其关联的测试点和测试用例）")
             
             # 生成需求点
-            req_result = await self.analyze_requirements(
-                agent_id=agent_ids.get("requirement"),
-                content=requirement_content,
-                image_paths=image_paths
-            )
+            with trace_span("stage.requirement_analysis", images=len(image_paths or [])):
+                req_result = await self.analyze_requirements(
+                    agent_id=agent_ids.get("requirement"),
+                    content=requirement_content,
+                    image_paths=image_paths
+                )
             
             requirement_points_data = req_result.get("requirement_points", [])
-            print(f"\n✅ [1/4] 需求点生成完成: {len(requirement_points_data)} 个")
+            logger.info(f"✅ [1/4] 需求点生成完成: {len(requirement_points_data)} 个")
             
             # 调试：输出前3个需求点的原始数据
             if requirement_points_data:
-                print(f"\n📊 [调试] 前3个需求点的原始数据:")
+                logger.debug(f"📊 [调试] 前3个需求点的原始数据:")
                 for i, rp in enumerate(requirement_points_data[:3]):
-                    print(f"  需求点 {i+1}: priority={rp.get('priority')}, content={rp.get('content', '')[:50]}...")
+                    logger.debug(f"  需求点 {i+1}: priority={rp.get('priority')}, content={rp.get('content', '')[:50]}...")
             
             if not requirement_points_data:
                 raise Exception("未生成任何需求点")
             
             # 保存需求点到数据库
-            requirement_points = []
-            for idx, rp_data in enumerate(requirement_points_data):
-                # 标准化优先级
-                raw_priority = rp_data.get("priority", "medium")
-                normalized_priority = self._normalize_priority(raw_priority)
-                
-                rp = RequirementPoint(
-                    requirement_file_id=file_id,
-                    module_id=module_id,
-                    content=rp_data.get("content", ""),
-                    order_num=rp_data.get("order_index", idx),
-                    priority=normalized_priority,
-                    source="ai_generated",
-                    created_by_ai=True,
-                    created_by=user_id
-                )
-                self.db.add(rp)
-                requirement_points.append(rp)
+            def save_requirement_points(db: Session) -> List[Dict[str, Any]]:
+                objects = []
+                for idx, rp_data in enumerate(requirement_points_data):
+                    # 标准化优先级
+                    raw_priority = rp_data.get("priority", "medium")
+                    normalized_priority = self._normalize_priority(raw_priority)
+                    
+                    rp = RequirementPoint(
+                        requirement_file_id=file_id,
+                        module_id=module_id,
+                        content=rp_data.get("content", ""),
+                        order_num=rp_data.get("order_index", idx),
+                        priority=normalized_priority,
+                        source="ai_generated",
+                        created_by_ai=True,
+                        created_by=user_id
+                    )
+                    db.add(rp)
+                    objects.append(rp)
+                db.flush()
+                return [{"id": rp.id, "content": rp.content} for rp in objects]
             
-            self.db.flush()
-            for rp in requirement_points:
-                self.db.refresh(rp)
+            with trace_span("db.save_requirement_points", count=len(requirement_points_data)):
+                requirement_points = await db_write_queue.run(save_requirement_points)
             
             if task_id:
                 task_manager.update_progress(task_id, 25, f"需求点生成完成，共 {len(requirement_points)} 个")
             
             # ========== 阶段2：生成测试点 (25-50%) ==========
-            print(f"\n🔄 [2/4] 开始生成测试点...")
+            logger.info(f"🔄 [2/4] 开始生成测试点...")
             
-            req_points_for_generation = [{"id": rp.id, "content": rp.content} for rp in requirement_points]
+            req_points_for_generation = requirement_points
             
-            tp_result = await self.execute_test_point_generation(
-                requirement_points=req_points_for_generation,
-                user_id=user_id,
-                agent_id=agent_ids.get("test_point"),
-                task_id=task_id,  # 传入task_id以支持批次级进度更新
-                progress_offset=25,  # 从25%开始
-                progress_scale=0.25  # 占25%进度
-            )
+            with trace_span("stage.test_point_generation", requirement_points=len(req_points_for_generation)):
+                tp_result = await self.execute_test_point_generation(
+                    requirement_points=req_points_for_generation,
+                    user_id=user_id,
+                    agent_id=agent_ids.get("test_point"),
+                    task_id=task_id,  # 传入task_id以支持批次级进度更新
+                    progress_offset=25,  # 从25%开始
+                    progress_scale=0.25  # 占25%进度
+                )
             
             if not tp_result.get("success"):
                 raise Exception(f"测试点生成失败: {tp_result.get('error')}")
             
             test_points_data = tp_result.get("data", {}).get("test_points", [])
-            print(f"✅ [2/4] 测试点生成完成: {len(test_points_data)} 个")
+            logger.info(f"✅ [2/4] 测试点生成完成: {len(test_points_data)} 个")
             
             # 保存测试点到数据库
-            test_points = []
-            for tp_data in test_points_data:
-                # 标准化优先级
-                raw_priority = tp_data.get("priority", "medium")
-                normalized_priority = self._normalize_priority(raw_priority)
-                
-                tp = TestPoint(
-                    requirement_point_id=tp_data.get("requirement_point_id"),
-                    module_id=module_id,
-                    content=tp_data.get("content", ""),
-                    test_type=tp_data.get("test_type", "functional"),
-                    design_method=tp_data.get("design_method"),  # 测试设计方法
-                    priority=normalized_priority,
-                    created_by_ai=True,
-                    created_by=user_id
-                )
-                self.db.add(tp)
-                test_points.append(tp)
+            def save_test_points(db: Session) -> List[Dict[str, Any]]:
+                objects = []
+                for tp_data in test_points_data:
+                    # 标准化优先级
+                    raw_priority = tp_data.get("priority", "medium")
+                    normalized_priority = self._normalize_priority(raw_priority)
+                    
+                    tp = TestPoint(
+                        requirement_point_id=tp_data.get("requirement_point_id"),
+                        module_id=module_id,
+                        content=tp_data.get("content", ""),
+                        test_type=tp_data.get("test_type", "functional"),
+                        design_method=tp_data.get("design_method"),  # 测试设计方法
+                        priority=normalized_priority,
+                        created_by_ai=True,
+                        created_by=user_id
+                    )
+                    db.add(tp)
+                    objects.append(tp)
+                db.flush()
+                return [{
+                    "id": tp.id,
+                    "content": tp.content,
+                    "test_type": tp.test_type,
+                    "design_method": tp.design_method,
+                    "priority": tp.priority,
+                    "requirement_point_id": tp.requirement_point_id
+                } for tp in objects]
             
-            self.db.flush()
-            for tp in test_points:
-                self.db.refresh(tp)
+            with trace_span("db.save_test_points", count=len(test_points_data)):
+                test_points = await db_write_queue.run(save_test_points)
             
             if task_id:
                 task_manager.update_progress(task_id, 50, f"测试点生成完成，共 {len(test_points)} 个")
             
             # ========== 阶段3：生成测试用例 (50-85%) ==========
-            print(f"\n🔄 [3/4] 开始生成测试用例...")
+            logger.info(f"🔄 [3/4] 开始生成测试用例...")
             
             # 传递完整的测试点数据（包含所有必要字段）
-            test_points_for_generation = [{
-                "id": tp.id, 
-                "content": tp.content,
-                "test_type": tp.test_type,
-                "design_method": tp.design_method,
-                "priority": tp.priority,
-                "requirement_point_id": tp.requirement_point_id
-            } for tp in test_points]
+            test_points_for_generation = test_points
             
             # 用于收集所有保存的测试用例（字典格式，用于优化）
             saved_test_cases_for_optimization = []
             
             # 定义保存回调
-            def save_test_cases(cases: List[dict]) -> int:
-                """保存测试用例到数据库，并收集数据用于优化"""
-                nonlocal saved_test_cases_for_optimization
-                saved_count = 0
+            def insert_test_cases(db: Session, cases: List[dict]) -> List[Dict[str, Any]]:
+                """在写入队列中插入一批测试用例，返回用于优化的字典数据"""
                 batch_objects = []  # 当前批次的对象
                 
-                print(f"   📥 收到 {len(cases)} 个用例待保存")
-                
                 for case_data in cases:
                     try:
                         tc = TestCase(
@@ -1156,66 +1217,67 @@ class AgentServiceReal:
                             created_by_ai=True,
                             created_by=user_id
                         )
-                        self.db.add(tc)
+                        db.add(tc)
                         batch_objects.append(tc)
-                        saved_count += 1
                     except Exception as e:
-                        print(f"   ⚠️ 创建测试用例对象失败: {e}")
+                        logger.warning(f"   ⚠️ 创建测试用例对象失败: {e}")
                         continue
                 
-                # 立即flush并commit当前批次
+                db.flush()
+                # 保存为字典格式（与直接生成测试用例的方式一致）
+                return [{
+                    "id": tc.id,
+                    "title": tc.title,
+                    "description": tc.description,
+                    "preconditions": tc.preconditions,
+                    "test_steps": tc.test_steps,
+                    "expected_result": tc.expected_result
+                } for tc in batch_objects]
+            
+            async def save_test_cases(cases: List[dict]) -> int:
+                """保存测试用例到数据库（每批次独立提交），并收集数据用于优化"""
+                logger.info(f"   📥 收到 {len(cases)} 个用例待保存")
+                
                 try:
-                    self.db.flush()
-                    for tc in batch_objects:
-                        self.db.refresh(tc)
-                        # 保存为字典格式（与直接生成测试用例的方式一致）
-                        saved_test_cases_for_optimization.append({
-                            "id": tc.id,
-                            "title": tc.title,
-                            "description": tc.description,
-                            "preconditions": tc.preconditions,
-                            "test_steps": tc.test_steps,
-                            "expected_result": tc.expected_result
-                        })
-                    # 每批次提交，确保数据持久化
-                    self.db.commit()
-                    print(f"   💾 批次保存成功: {saved_count} 个用例，总计: {len(saved_test_cases_for_optimization)} 个")
+                    with trace_span("db.save_test_cases", count=len(cases)):
+                        saved = await db_write_queue.run(insert_test_cases, cases)
                 except Exception as e:
-                    print(f"   ❌ 批次提交失败: {e}")
-                    self.db.rollback()
+                    logger.error(f"   ❌ 批次提交失败: {e}")
                     return 0
                 
-                return saved_count
+                saved_test_cases_for_optimization.extend(saved)
+                logger.info(f"   💾 批次保存成功: {len(saved)} 个用例，总计: {len(saved_test_cases_for_optimization)} 个")
+                return len(saved)
             
-            tc_result = await self.execute_test_case_design_batch(
-                test_points=test_points_for_generation,
-                module_id=module_id,
-                user_id=user_id,
-                agent_id=agent_ids.get("test_case"),
-                task_id=task_id,
-                on_batch_complete=save_test_cases,
-                progress_offset=50,
-                progress_scale=0.25  # 改为占25%进度（原来是0.35）
-            )
+            with trace_span("stage.test_case_design", test_points=len(test_points_for_generation)):
+                tc_result = await self.execute_test_case_design_batch(
+                    test_points=test_points_for_generation,
+                    module_id=module_id,
+                    user_id=user_id,
+                    agent_id=agent_ids.get("test_case"),
+                    task_id=task_id,
+                    on_batch_complete=save_test_cases,
+                    progress_offset=50,
+                    progress_scale=0.25  # 改为占25%进度（原来是0.35）
+                )
             
             if not tc_result.get("success"):
                 raise Exception(f"测试用例生成失败: {tc_result.get('error')}")
             
             generated_cases = tc_result.get("data", {}).get("test_cases", [])
-            print(f"✅ [3/4] 测试用例生成完成: {len(generated_cases)} 个")
-            print(f"💾 已保存到数据库: {len(saved_test_cases_for_optimization)} 个测试用例")
+            logger.info(f"✅ [3/4] 测试用例生成完成: {len(generated_cases)} 个")
+            logger.info(f"💾 已保存到数据库: {len(saved_test_cases_for_optimization)} 个测试用例")
             
             if task_id:
                 task_manager.update_progress(task_id, 75, f"测试用例生成完成，共 {len(generated_cases)} 个")
             
             # ========== 阶段4：优化测试用例 (75-100%) ==========
-            print(f"\n🔄 [4/4] 开始优化测试用例...")
+            logger.info(f"🔄 [4/4] 开始优化测试用例...")
             
             # 检查是否有测试用例需要优化
             if not saved_test_cases_for_optimization:
-                print(f"⚠️ 没有找到已保存的测试用例，跳过优化阶段")
-                # 直接提交并完成
-                self.db.commit()
+                logger.warning(f"⚠️ 没有找到已保存的测试用例，跳过优化阶段")
+                # 数据已由写入队列逐批提交，直接完成
                 if task_id:
                     task_manager.update_progress(task_id, 100, "生成完成！")
                     task_manager.complete_task(task_id, {
@@ -1232,57 +1294,60 @@ class AgentServiceReal:
                     }
                 }
             
-            print(f"📋 准备优化 {len(saved_test_cases_for_optimization)} 个测试用例")
+            logger.info(f"📋 准备优化 {len(saved_test_cases_for_optimization)} 个测试用例")
             
             # 更新进度消息，进入优化阶段
             if task_id:
                 task_manager.update_progress(task_id, 75, f"正在优化测试用例...")
             
-            opt_result = await self.execute_test_case_optimization(
-                original_test_cases=saved_test_cases_for_optimization,
-                user_id=user_id,
-                agent_id=agent_ids.get("optimizer"),
-                batch_mode=True,
-                task_id=task_id,
-                progress_offset=75,
-                progress_scale=0.25
-            )
+            with trace_span("stage.test_case_optimization", test_cases=len(saved_test_cases_for_optimization)):
+                opt_result = await self.execute_test_case_optimization(
+                    original_test_cases=saved_test_cases_for_optimization,
+                    user_id=user_id,
+                    agent_id=agent_ids.get("optimizer"),
+                    batch_mode=True,
+                    task_id=task_id,
+                    progress_offset=75,
+                    progress_scale=0.25
+                )
             
             # 应用优化结果到数据库
             optimized_count = 0
             if opt_result.get("success"):
                 optimized_results = opt_result.get("data", {}).get("optimized_results", [])
-                print(f"📝 收到 {len(optimized_results)} 个优化结果")
+                logger.info(f"📝 收到 {len(optimized_results)} 个优化结果")
                 
-                for opt_result_item in optimized_results:
-                    if opt_result_item.get("success") and opt_result_item.get("optimized"):
-                        original_id = opt_result_item.get("original", {}).get("id")
-                        if original_id:
-                            try:
-                                optimized = opt_result_item["optimized"]
-                                tc = self.db.query(TestCase).filter(TestCase.id == original_id).first()
-                                if tc:
-                                    tc.title = optimized.get("title", tc.title)
-                                    tc.description = optimized.get("description", tc.description)
-                                    tc.preconditions = optimized.get("preconditions", tc.preconditions)
-                                    tc.test_steps = optimized.get("test_steps", tc.test_steps)
-                                    tc.expected_result = optimized.get("expected_result", tc.expected_result)
-                                    optimized_count += 1
-                            except Exception as e:
-                                print(f"⚠️ 更新优化结果失败 (ID={original_id}): {e}")
+                def apply_optimized_results(db: Session) -> int:
+                    applied = 0
+                    for opt_result_item in optimized_results:
+                        if opt_result_item.get("success") and opt_result_item.get("optimized"):
+                            original_id = opt_result_item.get("original", {}).get("id")
+                            if original_id:
+                                try:
+                                    optimized = opt_result_item["optimized"]
+                                    tc = db.query(TestCase).filter(TestCase.id == original_id).first()
+                                    if tc:
+                                        tc.title = optimized.get("title", tc.title)
+                                        tc.description = optimized.get("description", tc.description)
+                                        tc.preconditions = optimized.get("preconditions", tc.preconditions)
+                                        tc.test_steps = optimized.get("test_steps", tc.test_steps)
+                                        tc.expected_result = optimized.get("expected_result", tc.expected_result)
+                                        applied += 1
+                                except Exception as e:
+                                    logger.warning(f"⚠️ 更新优化结果失败 (ID={original_id}): {e}")
+                    return applied
                 
-                print(f"✅ [4/4] 测试用例优化完成: 成功优化 {optimized_count} 个用例")
+                with trace_span("db.apply_optimized_results", count=len(optimized_results)):
+                    optimized_count = await db_write_queue.run(apply_optimized_results)
+                logger.info(f"✅ [4/4] 测试用例优化完成: 成功优化 {optimized_count} 个用例")
             else:
-                print(f"⚠️ [4/4] 测试用例优化失败，跳过此步骤")
+                logger.warning(f"⚠️ [4/4] 测试用例优化失败，跳过此步骤")
             
-            # 先提交所有数据库更改
-            print(f"\n💾 正在提交所有数据到数据库...")
-            self.db.commit()
-            print(f"✅ 数据库提交成功")
-            
-            # 验证数据是否真的保存了
-            saved_count = self.db.query(TestCase).filter(TestCase.module_id == module_id).count()
-            print(f"📊 数据库验证: 模块 {module_id} 共有 {saved_count} 个测试用例")
+            # 验证数据是否真的保存了（写入已由写入队列逐批提交）
+            saved_count = await self._run_db(
+                lambda db: db.query(TestCase).filter(TestCase.module_id == module_id).count()
+            )
+            logger.info(f"📊 数据库验证: 模块 {module_id} 共有 {saved_count} 个测试用例")
             
             # 然后标记任务完成
             if task_id:
@@ -1294,21 +1359,19 @@ class AgentServiceReal:
                     "optimized_count": optimized_count
                 }
                 task_manager.complete_task(task_id, result_data)
-                print(f"✅ 任务状态已更新为完成")
-                print(f"📋 任务结果: {result_data}")
+                logger.info(f"✅ 任务状态已更新为完成")
+                logger.debug(f"📋 任务结果: {result_data}")
                 
                 # 验证任务状态
                 task_status = task_manager.get_task_status(task_id)
-                print(f"🔍 任务状态验证: {task_status}")
+                logger.debug(f"🔍 任务状态验证: {task_status}")
             
-            print("\n" + "="*60)
-            print("🎉 完整生成流程执行成功！")
-            print(f"   需求点: {len(requirement_points)} 个")
-            print(f"   测试点: {len(test_points)} 个")
-            print(f"   测试用例: {len(saved_test_cases_for_optimization)} 个（已保存到数据库）")
+            logger.info("🎉 完整生成流程执行成功！")
+            logger.info(f"   需求点: {len(requirement_points)} 个")
+            logger.info(f"   测试点: {len(test_points)} 个")
+            logger.info(f"   测试用例: {len(saved_test_cases_for_optimization)} 个（已保存到数据库）")
             if optimized_count > 0:
-                print(f"   优化用例: {optimized_count} 个")
-            print("="*60)
+                logger.info(f"   优化用例: {optimized_count} 个")
             
             return {
                 "success": True,
@@ -1321,14 +1384,10 @@ class AgentServiceReal:
             }
             
         except Exception as e:
-            print(f"\n❌ 完整生成流程失败: {e}")
+            logger.error(f"❌ 完整生成流程失败: {e}")
             if task_id:
                 task_manager.fail_task(task_id, str(e))
-            # 即使失败也提交已保存的数据
-            try:
-                self.db.commit()
-            except:
-                self.db.rollback()
+            # 已完成的批次已由写入队列提交，失败时无需额外处理
             return {
                 "success": False,
                 "error": str(e)
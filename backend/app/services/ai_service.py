@@ -3,12 +3,21 @@ AI服务 - 调用大语言模型
 只支持 OpenAI 兼容格式的 API 调用
 支持流式生成，避免长时间连接超时
 """
+import asyncio
 import json
+import logging
 import os
 import re
 import base64
+import time
 from typing import Dict, Any, List, Optional
-import httpx
+
+from app.config import settings
+from app.core.metrics import LLM_REQUEST_DURATION, LLM_REQUESTS, LLM_TOKENS, LLM_TTFT, current_agent
+from app.core.tracing import set_span_attributes
+from app.services.image_service import image_service
+
+logger = logging.getLogger(__name__)
 
 
 class AIService:
@@ -76,17 +85,28 @@ class AIService:
             "max_tokens": max_tokens,
             "stream": True  # 启用流式输出
         }
+        if settings.ai_stream_include_usage:
+            # 要求在最后一个数据块中返回 token 用量
+            data["stream_options"] = {"include_usage": True}
+        
+        logger.debug(f"🤖 AI流式调用: model={model}, url={url}")
         
-        print(f"🤖 AI流式调用: model={model}, url={url}")
+        # httpx 只在调用模型时加载，不计入应用启动耗时
+        import httpx
         
         collected_content = []
+        agent = current_agent.get()
+        started = time.perf_counter()
+        first_token_at = None
+        usage = None
+        status = "error"
         
         try:
             async with httpx.AsyncClient(timeout=300.0) as client:  # 增加超时时间
                 async with client.stream("POST", url, headers=headers, json=data) as response:
                     if response.status_code != 200:
                         error_text = await response.aread()
-                        print(f"❌ API调用失败: {response.status_code} - {error_text.decode()}")
+                        logger.error(f"❌ API调用失败: {response.status_code} - {error_text.decode()}")
                         raise Exception(f"API返回错误: {response.status_code}")
                     
                     async for line in response.aiter_lines():
@@ -102,24 +122,46 @@ class AIService:
                             
                             try:
                                 chunk = json.loads(data_str)
+                                if chunk.get("usage"):
+                                    usage = chunk["usage"]
                                 if "choices" in chunk and chunk["choices"]:
                                     delta = chunk["choices"][0].get("delta", {})
                                     content = delta.get("content", "")
                                     if content:
+                                        if first_token_at is None:
+                                            first_token_at = time.perf_counter()
                                         collected_content.append(content)
                             except json.JSONDecodeError:
                                 continue
             
             full_content = "".join(collected_content)
-            print(f"✅ AI流式响应完成，内容长度: {len(full_content)}")
+            status = "success"
+            logger.debug(f"✅ AI流式响应完成，内容长度: {len(full_content)}")
             return full_content
                     
         except httpx.TimeoutException:
-            print("❌ API调用超时")
+            status = "timeout"
+            logger.error("❌ API调用超时")
             raise Exception("API调用超时，请稍后重试")
+        except asyncio.CancelledError:
+            # 外层超时或任务取消
+            status = "cancelled"
+            raise
         except Exception as e:
-            print(f"❌ AI流式调用异常: {e}")
+            logger.error(f"❌ AI流式调用异常: {e}")
             raise
+        finally:
+            LLM_REQUESTS.inc(model=model, agent=agent, status=status)
+            LLM_REQUEST_DURATION.observe(time.perf_counter() - started, model=model, agent=agent)
+            # 同时记录到当前追踪的 AI 调用 span 上
+            set_span_attributes(model=model, chunks=len(collected_content))
+            if first_token_at is not None:
+                LLM_TTFT.observe(first_token_at - started, model=model, agent=agent)
+                set_span_attributes(ttft_ms=round((first_token_at - started) * 1000, 1))
+            if usage:
+                LLM_TOKENS.inc(usage.get("prompt_tokens") or 0, model=model, agent=agent, direction="prompt")
+                LLM_TOKENS.inc(usage.get("completion_tokens") or 0, model=model, agent=agent, direction="completion")
+                set_span_attributes(prompt_tokens=usage.get("prompt_tokens"), completion_tokens=usage.get("completion_tokens"))
     
     async def call_ai(
         self,
@@ -181,25 +223,9 @@ class AIService:
         Returns:
             AI响应内容
         """
-        # 构建多模态消息内容
+        # 构建多模态消息内容（图片编码结果有缓存，重试时直接复用）
         content = [{"type": "text", "text": text_content}]
-        
-        # 添加图片
-        for image_path in image_paths:
-            try:
-                image_data = self.encode_image_to_base64(image_path)
-                mime_type = self.get_image_mime_type(image_path)
-                
-                content.append({
-                    "type": "image_url",
-                    "image_url": {
-                        "url": f"data:{mime_type};base64,{image_data}",
-                        "detail": "high"
-                    }
-                })
-            except Exception as e:
-                print(f"⚠️ 无法加载图片 {image_path}: {e}")
-                continue
+        content.extend(await image_service.build_image_parts_async(image_paths))
         
         # 构建消息
         messages = []
@@ -4,15 +4,23 @@
 支持从系统设置加载并发配置
 """
 import asyncio
+import logging
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, Optional, List, Callable, TYPE_CHECKING
 from datetime import datetime
 from enum import Enum
 from dataclasses import dataclass, field
 
+from app.config import settings
+from app.core.metrics import TASK_DURATION, TASK_QUEUE_DEPTH, TASKS_FINISHED, TASKS_RUNNING
+from app.services.task_result_store import summarize_result, task_result_store
+
 if TYPE_CHECKING:
     from sqlalchemy.orm import Session
 
+logger = logging.getLogger(__name__)
+
 
 class AsyncTaskStatus(str, Enum):
     """异步任务状态"""
@@ -33,7 +41,8 @@ class AsyncTask:
     progress: int = 0
     total_batches: int = 0
     completed_batches: int = 0
-    result: Optional[Any] = None
+    result: Optional[Any] = None  # 结果写入文件时为结果摘要
+    result_file: Optional[str] = None  # 较大的结果压缩保存的文件路径
     error: Optional[str] = None
     message: Optional[str] = None  # 进度消息
     created_at: datetime = field(default_factory=datetime.utcnow)
@@ -49,6 +58,7 @@ class AsyncTask:
             "total_batches": self.total_batches,
             "completed_batches": self.completed_batches,
             "result": self.result,
+            "result_spilled": self.result_file is not None,
             "error": self.error,
             "message": self.message,
             "created_at": self.created_at.isoformat() if self.created_at else None,
@@ -77,6 +87,8 @@ class AsyncTaskManager:
         self._tasks: Dict[str, AsyncTask] = {}
         self._running_tasks: Dict[str, asyncio.Task] = {}
         self._pending_queue: List[str] = []  # 等待执行的任务队列
+        # 序列化和写入较大结果的工作线程，避免阻塞事件循环（线程在首次提交时才创建）
+        self._spill_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="task-result-spill")
         
         # 并发配置（从系统设置加载）
         self._max_concurrent_tasks: int = self.DEFAULT_MAX_CONCURRENT_TASKS
@@ -103,13 +115,13 @@ class AsyncTaskManager:
             self._queue_size = config.queue_size
             self._config_loaded = True
             
-            print(f"[AsyncTaskManager] 已加载并发配置: "
-                  f"max_concurrent_tasks={self._max_concurrent_tasks}, "
-                  f"task_timeout={self._task_timeout}s, "
-                  f"retry_count={self._retry_count}, "
-                  f"queue_size={self._queue_size}")
+            logger.info(f"[AsyncTaskManager] 已加载并发配置: "
+                        f"max_concurrent_tasks={self._max_concurrent_tasks}, "
+                        f"task_timeout={self._task_timeout}s, "
+                        f"retry_count={self._retry_count}, "
+                        f"queue_size={self._queue_size}")
         except Exception as e:
-            print(f"[AsyncTaskManager] 加载并发配置失败，使用默认值: {e}")
+            logger.warning(f"[AsyncTaskManager] 加载并发配置失败，使用默认值: {e}")
             self._config_loaded = False
     
     def reload_config(self, db: "Session") -> None:
@@ -204,8 +216,8 @@ class AsyncTaskManager:
         # 如果达到并发限制，加入等待队列
         if not self.can_start_new_task():
             self._pending_queue.append(task_id)
-            print(f"[AsyncTaskManager] 任务 {task_id} 已加入等待队列 "
-                  f"(当前运行: {self.get_running_task_count()}/{self._max_concurrent_tasks})")
+            logger.info(f"[AsyncTaskManager] 任务 {task_id} 已加入等待队列 "
+                        f"(当前运行: {self.get_running_task_count()}/{self._max_concurrent_tasks})")
         
         return task_id
     
@@ -224,6 +236,17 @@ class AsyncTaskManager:
             return status_dict
         return None
     
+    def get_task_result(self, task_id: str) -> Optional[Any]:
+        """获取任务的完整结果（结果已写入文件时从文件读取，应在线程池中调用）"""
+        task = self._tasks.get(task_id)
+        if task is None:
+            return None
+        # 先读结果再读文件路径：写入线程先设置路径再替换为摘要，读到摘要时路径一定已设置
+        result = task.result
+        if task.result_file:
+            return task_result_store.load(task.result_file)
+        return result
+    
     def update_task_progress(self, task_id: str, completed_batches: int):
         """更新任务进度（基于批次数）"""
         task = self._tasks.get(task_id)
@@ -283,7 +306,11 @@ class AsyncTaskManager:
             task.status = AsyncTaskStatus.COMPLETED
             task.progress = 100
             task.result = result
+            if result is not None:
+                # 较大的结果在工作线程中写入文件，写入后内存中只保留摘要
+                self._spill_executor.submit(self._spill_result, task, result)
             task.completed_at = datetime.utcnow()
+            self._record_finished(task)
         
         # 清理运行中的任务
         if task_id in self._running_tasks:
@@ -292,6 +319,23 @@ class AsyncTaskManager:
         # 尝试启动等待队列中的下一个任务
         self._process_pending_queue()
     
+    def _spill_result(self, task: AsyncTask, result: Any) -> None:
+        """在工作线程中执行：结果超过阈值时写入文件，并把内存中的结果替换为摘要"""
+        try:
+            path = task_result_store.put(task.task_id, result)
+        except Exception as e:
+            logger.warning(f"⚠️ [AsyncTaskManager] 保存任务结果失败，保留在内存中 {task.task_id}: {e}")
+            return
+        if path is None:
+            return
+        if self._tasks.get(task.task_id) is not task:
+            # 写入期间任务已被清理
+            task_result_store.delete(path)
+            return
+        # 先设置文件路径再替换结果，读取方任何时刻都能取到完整结果
+        task.result_file = path
+        task.result = summarize_result(result)
+    
     def fail_task(self, task_id: str, error: str):
         """标记任务失败"""
         task = self._tasks.get(task_id)
@@ -299,6 +343,7 @@ class AsyncTaskManager:
             task.status = AsyncTaskStatus.FAILED
             task.error = error
             task.completed_at = datetime.utcnow()
+            self._record_finished(task)
         
         # 清理运行中的任务
         if task_id in self._running_tasks:
@@ -320,6 +365,7 @@ class AsyncTaskManager:
             task.status = AsyncTaskStatus.TIMEOUT
             task.error = f"任务执行超时（超过{self._task_timeout}秒）"
             task.completed_at = datetime.utcnow()
+            self._record_finished(task)
         
         # 取消正在运行的asyncio任务
         if task_id in self._running_tasks:
@@ -335,6 +381,7 @@ class AsyncTaskManager:
         if task:
             task.status = AsyncTaskStatus.CANCELLED
             task.completed_at = datetime.utcnow()
+            self._record_finished(task)
         
         # 从等待队列中移除
         if task_id in self._pending_queue:
@@ -348,6 +395,14 @@ class AsyncTaskManager:
         # 尝试启动等待队列中的下一个任务
         self._process_pending_queue()
     
+    @staticmethod
+    def _record_finished(task: AsyncTask) -> None:
+        """记录任务结束的指标（未开始就结束的任务不计入耗时）"""
+        TASKS_FINISHED.inc(task_type=task.task_type, status=task.status.value)
+        if task.started_at and task.completed_at:
+            duration = (task.completed_at - task.started_at).total_seconds()
+            TASK_DURATION.observe(duration, task_type=task.task_type, status=task.status.value)
+    
     def register_running_task(self, task_id: str, asyncio_task: asyncio.Task):
         """注册正在运行的asyncio任务"""
         self._running_tasks[task_id] = asyncio_task
@@ -383,7 +438,7 @@ class AsyncTaskManager:
             if task and task.status == AsyncTaskStatus.PENDING:
                 # 任务仍在等待，可以启动
                 self._pending_queue.pop(0)
-                print(f"[AsyncTaskManager] 从队列启动任务 {next_task_id}")
+                logger.info(f"[AsyncTaskManager] 从队列启动任务 {next_task_id}")
                 # 注意：实际启动需要外部调用者处理
                 break
             else:
@@ -407,22 +462,53 @@ class AsyncTaskManager:
         
         return None
     
-    def cleanup_old_tasks(self, max_age_hours: int = 24):
-        """清理旧任务"""
+    def cleanup_old_tasks(self, max_age_hours: int = 24, max_finished_tasks: Optional[int] = None) -> int:
+        """清理旧任务
+        
+        删除结束超过 max_age_hours 的任务；已结束的任务超过 max_finished_tasks 个时，
+        按结束时间从早到晚继续删除。任务的结果文件一并删除。
+        
+        Returns:
+            删除的任务数
+        """
         now = datetime.utcnow()
-        to_delete = []
-        for task_id, task in self._tasks.items():
-            if task.completed_at:
-                age = (now - task.completed_at).total_seconds() / 3600
-                if age > max_age_hours:
-                    to_delete.append(task_id)
+        finished = sorted(
+            (task for task in self._tasks.values() if task.completed_at),
+            key=lambda task: task.completed_at
+        )
+        to_delete = [
+            task.task_id for task in finished
+            if (now - task.completed_at).total_seconds() / 3600 > max_age_hours
+        ]
+        if max_finished_tasks is not None and len(finished) - len(to_delete) > max_finished_tasks:
+            remaining = finished[len(to_delete):]
+            to_delete.extend(task.task_id for task in remaining[:len(remaining) - max_finished_tasks])
         
         for task_id in to_delete:
-            del self._tasks[task_id]
+            task = self._tasks.pop(task_id)
+            task_result_store.delete(task.result_file)
             if task_id in self._running_tasks:
                 del self._running_tasks[task_id]
             if task_id in self._pending_queue:
                 self._pending_queue.remove(task_id)
+        return len(to_delete)
+    
+    async def run_cleanup_loop(self, interval_seconds: Optional[int] = None) -> None:
+        """定期清理已结束的任务和过期的结果文件（在应用生命周期内运行）"""
+        from starlette.concurrency import run_in_threadpool
+        
+        interval = interval_seconds or settings.task_cleanup_interval_seconds
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                removed = self.cleanup_old_tasks(settings.task_result_ttl_hours, settings.task_result_max_finished)
+                removed_files = await run_in_threadpool(
+                    task_result_store.cleanup_expired, settings.task_result_ttl_hours * 3600
+                )
+                if removed or removed_files:
+                    logger.info(f"🧹 [AsyncTaskManager] 已清理 {removed} 个已结束任务，{removed_files} 个过期结果文件")
+            except Exception as e:
+                logger.warning(f"⚠️ [AsyncTaskManager] 清理任务失败: {e}")
     
     def get_config_info(self) -> Dict[str, Any]:
         """获取当前配置信息
@@ -443,3 +529,7 @@ class AsyncTaskManager:
 
 # 全局任务管理器实例
 task_manager = AsyncTaskManager()
+
+# 队列深度和运行数在输出指标时读取
+TASK_QUEUE_DEPTH.set_function(task_manager.get_pending_task_count)
+TASKS_RUNNING.set_function(task_manager.get_running_task_count)
@@ -0,0 +1,246 @@
+"""
+导出任务服务
+导出在后台任务中执行，生成的文件按（导出对象、筛选条件、格式、数据版本）缓存在磁盘上，
+数据未变化时重复导出直接复用已有文件
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Set
+from urllib.parse import unquote
+
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import StreamingResponse
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.core.logger import log_context
+from app.database import SessionLocal
+from app.services.async_task_manager import task_manager
+
+logger = logging.getLogger(__name__)
+
+
+# 导出文件缓存目录
+EXPORT_DIR = Path(settings.upload_dir) / "exports"
+
+
+class ExportService:
+    """导出任务服务
+
+    导出接口原有的生成函数返回 ``StreamingResponse``，后台任务在线程池中调用生成函数，
+    再把响应内容逐块写入缓存文件。缓存键由导出对象、筛选条件、格式和数据版本计算得出，
+    数据变化后版本随之变化，旧文件在超过保留时间后清理。
+    """
+
+    def __init__(self, export_dir: Path, ttl_hours: int):
+        self._export_dir = export_dir
+        self._ttl_seconds = ttl_hours * 3600
+        self._tasks: Set[asyncio.Task] = set()
+        self._inflight: Dict[str, str] = {}  # 缓存键 -> 正在生成该文件的任务ID
+
+    @staticmethod
+    def content_version(query, batch_size: int = 1000) -> str:
+        """按查询结果的全部内容计算数据版本（逐批读取，不整体加载）
+
+        updated_at 只精确到秒，同一秒内的修改不会改变数量、最大ID和最后更新时间，
+        因此以行内容的哈希作为版本；查询应带有确定的排序。
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        for row in query.yield_per(batch_size):
+            digest.update(repr(tuple(row)).encode("utf-8"))
+            digest.update(b"\n")
+        return digest.hexdigest()
+
+    @staticmethod
+    def build_key(scope: str, scope_id: int, params: Dict[str, Any], fmt: str, version: Any) -> str:
+        """计算导出缓存键"""
+        payload = json.dumps(
+            {"scope": scope, "id": scope_id, "params": params, "format": fmt, "version": version},
+            sort_keys=True, ensure_ascii=False, default=str
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _data_path(self, key: str) -> Path:
+        return self._export_dir / f"{key}.bin"
+
+    def _meta_path(self, key: str) -> Path:
+        return self._export_dir / f"{key}.json"
+
+    def get_artifact(self, key: str, scope: Optional[str] = None, scope_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """获取已缓存的导出文件信息，不存在或不属于指定导出对象时返回 None"""
+        if not re.fullmatch(r"[0-9a-f]{64}", key):
+            return None
+        meta_path = self._meta_path(key)
+        data_path = self._data_path(key)
+        if not meta_path.exists() or not data_path.exists():
+            return None
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if scope is not None and (meta.get("scope") != scope or meta.get("scope_id") != scope_id):
+            return None
+        meta["path"] = str(data_path)
+        return meta
+
+    @staticmethod
+    def _filename_from_response(response: StreamingResponse) -> str:
+        disposition = response.headers.get("content-disposition", "")
+        marker = "filename*=UTF-8''"
+        if marker in disposition:
+            return unquote(disposition.split(marker, 1)[1])
+        return "export"
+
+    async def _store(self, key: str, scope: str, scope_id: int, response: StreamingResponse) -> Dict[str, Any]:
+        """把导出响应的内容写入缓存文件（先写临时文件，完成后原子替换）"""
+        self._export_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self._export_dir / f".{key}.{uuid.uuid4().hex}.part"
+        size = 0
+        try:
+            fp = await run_in_threadpool(open, tmp_path, "wb")
+            try:
+                async for chunk in response.body_iterator:
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode(response.charset)
+                    size += len(chunk)
+                    await run_in_threadpool(fp.write, chunk)
+            finally:
+                await run_in_threadpool(fp.close)
+            os.replace(tmp_path, self._data_path(key))
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+        meta = {
+            "key": key,
+            "scope": scope,
+            "scope_id": scope_id,
+            "filename": self._filename_from_response(response),
+            "media_type": response.media_type or "application/octet-stream",
+            "size": size,
+            "created_at": time.time()
+        }
+        with open(self._meta_path(key), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        meta["path"] = str(self._data_path(key))
+        return meta
+
+    def cleanup_expired(self) -> int:
+        """删除超过保留时间的导出文件，返回删除的文件数"""
+        if not self._export_dir.exists():
+            return 0
+        deadline = time.time() - self._ttl_seconds
+        removed = 0
+        for path in self._export_dir.iterdir():
+            try:
+                if path.stat().st_mtime < deadline:
+                    path.unlink()
+                    removed += 1
+            except OSError:
+                continue
+        return removed
+
+    def start_job(
+        self,
+        key: str,
+        scope: str,
+        scope_id: int,
+        build_response: Callable[[Session], StreamingResponse],
+        download_url: str,
+        task_type: str = "export"
+    ) -> Dict[str, Any]:
+        """启动导出任务（需在事件循环中调用）
+
+        Args:
+            key: 导出缓存键
+            scope: 导出对象类型（project / archive）
+            scope_id: 导出对象ID
+            build_response: 生成导出响应的函数，在线程池中以独立会话调用
+            download_url: 导出完成后的下载地址
+            task_type: 任务类型
+
+        Returns:
+            包含 task_id、status、cached 及下载信息的字典
+        """
+        artifact = self.get_artifact(key, scope, scope_id)
+        if artifact:
+            # 数据未变化，直接复用已生成的文件
+            try:
+                task_id = task_manager.create_task(task_type)
+            except ValueError as e:
+                raise HTTPException(status_code=429, detail=str(e))
+            result = self._result(artifact, download_url, cached=True)
+            task_manager.complete_task(task_id, result)
+            return {"task_id": task_id, "status": "completed", **result}
+
+        # 相同的导出正在进行中，复用该任务
+        inflight_task_id = self._inflight.get(key)
+        if inflight_task_id and task_manager.get_task(inflight_task_id):
+            return {"task_id": inflight_task_id, "status": "running", "cached": False}
+
+        try:
+            task_id = task_manager.create_task(task_type)
+        except ValueError as e:
+            raise HTTPException(status_code=429, detail=str(e))
+        self._inflight[key] = task_id
+        with log_context(task_id=task_id):
+            task = asyncio.create_task(self._run_job(task_id, key, scope, scope_id, build_response, download_url))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        task_manager.register_running_task(task_id, task)
+        return {"task_id": task_id, "status": "running", "cached": False}
+
+    async def _run_job(
+        self,
+        task_id: str,
+        key: str,
+        scope: str,
+        scope_id: int,
+        build_response: Callable[[Session], StreamingResponse],
+        download_url: str
+    ) -> None:
+        task_manager.start_task(task_id)
+        db = SessionLocal()
+        try:
+            task_manager.update_progress(task_id, 10, "正在生成导出文件...")
+            response = await run_in_threadpool(build_response, db)
+            task_manager.update_progress(task_id, 50, "正在写入导出文件...")
+            artifact = await self._store(key, scope, scope_id, response)
+            task_manager.complete_task(task_id, self._result(artifact, download_url, cached=False))
+            logger.info(f"✅ [导出] 任务 {task_id} 完成: {artifact['filename']} ({artifact['size']} 字节)")
+
+            removed = await run_in_threadpool(self.cleanup_expired)
+            if removed:
+                logger.info(f"🧹 [导出] 已清理 {removed} 个过期导出文件")
+        except HTTPException as e:
+            task_manager.fail_task(task_id, str(e.detail))
+        except Exception as e:
+            logger.error(f"❌ [导出] 任务 {task_id} 失败: {e}")
+            task_manager.fail_task(task_id, f"导出失败: {str(e)}")
+        finally:
+            db.close()
+            if self._inflight.get(key) == task_id:
+                del self._inflight[key]
+
+    @staticmethod
+    def _result(artifact: Dict[str, Any], download_url: str, cached: bool) -> Dict[str, Any]:
+        return {
+            "cached": cached,
+            "key": artifact["key"],
+            "filename": artifact["filename"],
+            "size": artifact["size"],
+            "download_url": download_url
+        }
+
+
+# 全局导出服务实例
+export_service = ExportService(EXPORT_DIR, ttl_hours=settings.export_cache_ttl_hours)
@@ -0,0 +1,404 @@
+"""
+需求文档解析服务
+在独立的进程池中解析上传的文档，避免 python-docx 解析和图片探测阻塞事件循环；
+解析结果按文件内容哈希复用，相同内容的文件不会重复解析
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import shutil
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import db_write_queue
+from app.utils.file_extractor import extract_document, extract_pdf_pages, get_pdf_page_count, merge_pdf_pages
+
+logger = logging.getLogger(__name__)
+
+
+# PDF 逐页解析结果缓存目录
+PAGE_CACHE_DIR = Path(settings.upload_dir) / "extraction_cache"
+
+
+class DocumentExtractionService:
+    """文档解析服务
+
+    上传接口保存文件后立即返回（``is_extracted=False``），解析任务提交到有界进程池，
+    多个上传可以在多个 CPU 核上并行解析。解析结果经由写入队列保存到数据库，
+    每个文件对应一个完成事件，可通过 :meth:`wait` 等待。
+
+    相同内容哈希的文件共用解析结果：已解析过的内容通过 :meth:`find_cached` 直接复用，
+    正在解析中的内容由后续上传等待同一次解析，图片文件在多条记录之间共享。
+
+    页数较多的 PDF 按页分块提交到进程池并行解析，已完成的连续页文本随解析进度写入
+    ``extracted_content``；每页结果缓存在磁盘上，解析中断后重新解析只需处理剩余页。
+    """
+
+    # 自动设置进程数时的上限
+    MAX_AUTO_WORKERS = 4
+
+    def __init__(self, max_workers: int = 0):
+        if max_workers <= 0:
+            max_workers = min(self.MAX_AUTO_WORKERS, os.cpu_count() or 1)
+        self._max_workers = max_workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._events: Dict[int, asyncio.Event] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._inflight: Dict[str, asyncio.Future] = {}  # 内容哈希 -> 正在进行的解析
+        self._progress: Dict[int, Tuple[int, int]] = {}  # 文件ID -> (已解析页数, 总页数)
+
+    @property
+    def max_workers(self) -> int:
+        """解析进程数"""
+        return self._max_workers
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # 使用 spawn 启动子进程，避免在多线程进程中 fork
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self._max_workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def _reset_executor(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def submit(
+        self,
+        file_id: int,
+        file_path: str,
+        file_type: str,
+        image_output_dir: Optional[str] = None,
+        content_hash: Optional[str] = None
+    ) -> asyncio.Event:
+        """提交解析任务（需在事件循环中调用），返回完成事件"""
+        event = self._events.get(file_id)
+        if event is None:
+            event = asyncio.Event()
+            self._events[file_id] = event
+        task = asyncio.create_task(
+            self._run(file_id, file_path, file_type, image_output_dir, content_hash, event)
+        )
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return event
+
+    def is_pending(self, file_id: int) -> bool:
+        """文件是否仍在解析中"""
+        return file_id in self._events
+
+    def get_progress(self, file_id: int) -> Optional[Dict[str, int]]:
+        """分页解析中的文件返回已解析页数和总页数，其余返回 None"""
+        progress = self._progress.get(file_id)
+        if progress is None:
+            return None
+        return {"extracted_pages": progress[0], "total_pages": progress[1]}
+
+    async def wait(self, file_id: int, timeout: Optional[float] = None) -> bool:
+        """等待文件解析完成，返回是否已完成"""
+        event = self._events.get(file_id)
+        if event is None:
+            return True
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def _run(
+        self,
+        file_id: int,
+        file_path: str,
+        file_type: str,
+        image_output_dir: Optional[str],
+        content_hash: Optional[str],
+        event: asyncio.Event
+    ) -> None:
+        try:
+            inflight = self._inflight.get(content_hash) if content_hash else None
+            if inflight is not None:
+                # 相同内容正在解析，直接复用其结果；该解析被取消或出错时自行解析
+                result = await self._wait_inflight(inflight)
+                if result is None:
+                    result = await self._extract(file_id, file_path, file_type, image_output_dir, content_hash)
+            elif content_hash:
+                future = asyncio.get_running_loop().create_future()
+                # 没有等待者时也标记异常已读取，避免事件循环输出未读取异常的警告
+                future.add_done_callback(lambda f: f.cancelled() or f.exception())
+                self._inflight[content_hash] = future
+                try:
+                    result = await self._extract(file_id, file_path, file_type, image_output_dir, content_hash)
+                    future.set_result(result)
+                except BaseException as e:
+                    # 解析被取消或出错时结束 future，等待相同内容的任务不会一直挂起
+                    if not future.done():
+                        if isinstance(e, asyncio.CancelledError):
+                            future.cancel()
+                        else:
+                            future.set_exception(e)
+                    raise
+                finally:
+                    self._inflight.pop(content_hash, None)
+            else:
+                result = await self._extract(file_id, file_path, file_type, image_output_dir, content_hash)
+
+            await db_write_queue.run(self._save_result, file_id, result)
+
+            if result["error"]:
+                logger.warning(f"⚠️ [文档解析] 文件 {file_id} 解析失败: {result['error']}")
+            else:
+                logger.info(f"✅ [文档解析] 文件 {file_id} 解析完成，图片 {len(result['images'])} 张")
+        except Exception as e:
+            logger.error(f"❌ [文档解析] 保存文件 {file_id} 的解析结果失败: {e}")
+        finally:
+            self._events.pop(file_id, None)
+            self._progress.pop(file_id, None)
+            event.set()
+
+    @staticmethod
+    async def _wait_inflight(inflight: "asyncio.Future") -> Optional[Dict[str, Any]]:
+        """等待相同内容的解析结果，该解析被取消或出错时返回 None"""
+        try:
+            return await asyncio.shield(inflight)
+        except asyncio.CancelledError:
+            if inflight.cancelled():
+                return None
+            # 当前任务自身被取消
+            raise
+        except Exception:
+            return None
+
+    async def _extract(
+        self,
+        file_id: int,
+        file_path: str,
+        file_type: str,
+        image_output_dir: Optional[str],
+        content_hash: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """在进程池中解析文档，异常转换为解析错误"""
+        loop = asyncio.get_running_loop()
+        try:
+            if file_type == 'pdf':
+                page_count = await loop.run_in_executor(self._get_executor(), get_pdf_page_count, file_path)
+                if page_count >= settings.pdf_parallel_min_pages:
+                    return await self._extract_pdf_parallel(
+                        file_id, file_path, page_count, image_output_dir, content_hash
+                    )
+            return await loop.run_in_executor(
+                self._get_executor(),
+                extract_document,
+                file_path,
+                file_type,
+                image_output_dir,
+                settings.image_max_edge,
+                settings.image_jpeg_quality
+            )
+        except BrokenProcessPool as e:
+            # 子进程异常退出后进程池不可再用，下次提交时重建
+            self._reset_executor()
+            return {"content": "", "error": f"提取失败: 解析进程异常退出 ({e})", "images": [], "image_error": None}
+        except Exception as e:
+            return {"content": "", "error": f"提取失败: {str(e)}", "images": [], "image_error": None}
+
+    async def _extract_pdf_parallel(
+        self,
+        file_id: int,
+        file_path: str,
+        page_count: int,
+        image_output_dir: Optional[str],
+        content_hash: Optional[str]
+    ) -> Dict[str, Any]:
+        """按页分块并行解析 PDF
+
+        分块完成顺序不固定，每当从第一页开始连续完成的页数增加时，
+        把这部分文本写入文件记录，用户可以在解析结束前查看已解析的内容。
+        """
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        cache_dir = str(PAGE_CACHE_DIR / content_hash) if content_hash else None
+        chunk_size = max(1, settings.pdf_pages_per_chunk)
+
+        futures = [
+            loop.run_in_executor(
+                executor,
+                extract_pdf_pages,
+                file_path,
+                start,
+                min(start + chunk_size, page_count),
+                image_output_dir,
+                settings.image_max_edge,
+                settings.image_jpeg_quality,
+                cache_dir
+            )
+            for start in range(0, page_count, chunk_size)
+        ]
+
+        pages: Dict[int, Dict[str, Any]] = {}
+        streamed = 0  # 已写入文件记录的连续页数
+        self._progress[file_id] = (0, page_count)
+        try:
+            for future in asyncio.as_completed(futures):
+                for page in await future:
+                    pages[page["index"]] = page
+                self._progress[file_id] = (len(pages), page_count)
+
+                ready = streamed
+                while ready in pages:
+                    ready += 1
+                if ready > streamed and ready < page_count:
+                    streamed = ready
+                    partial = merge_pdf_pages([pages[i] for i in range(streamed)])
+                    await db_write_queue.run(self._save_partial, file_id, partial["content"])
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+
+        result = merge_pdf_pages(list(pages.values()))
+        if cache_dir and not result["error"]:
+            # 完整结果保存后按内容哈希复用，逐页缓存不再需要
+            shutil.rmtree(cache_dir, ignore_errors=True)
+        return result
+
+    @staticmethod
+    def _save_partial(db: Session, file_id: int, content: str) -> None:
+        """保存已解析部分的文本（在写入队列中执行），解析完成前 is_extracted 保持为 False"""
+        from app.models.requirement import RequirementFile
+
+        db.query(RequirementFile).filter(
+            RequirementFile.id == file_id,
+            RequirementFile.is_extracted == False
+        ).update({RequirementFile.extracted_content: content}, synchronize_session=False)
+
+    @staticmethod
+    def find_cached(db: Session, content_hash: Optional[str]) -> Optional[Dict[str, Any]]:
+        """查找相同内容哈希的已解析文件，返回可复用的解析结果
+
+        返回值与解析进程的结果格式相同（content/error/images/image_error），
+        图片文件缺失时视为未命中，需要重新解析。
+        """
+        from app.models.requirement import RequirementFile
+        from app.models.requirement_image import RequirementImage
+
+        if not content_hash:
+            return None
+
+        source = db.query(RequirementFile.id, RequirementFile.extracted_content).filter(
+            RequirementFile.content_hash == content_hash,
+            RequirementFile.is_extracted == True
+        ).order_by(RequirementFile.id.desc()).first()
+        if not source:
+            return None
+
+        images = db.query(RequirementImage).filter(
+            RequirementImage.requirement_file_id == source.id
+        ).order_by(RequirementImage.position_index).all()
+        if any(not os.path.exists(img.image_path) for img in images):
+            return None
+
+        return {
+            "content": source.extracted_content,
+            "error": None,
+            "images": [
+                {
+                    "path": img.image_path,
+                    "format": img.image_format,
+                    "size": img.image_size,
+                    "position_index": img.position_index,
+                    "width": img.width,
+                    "height": img.height
+                }
+                for img in images
+            ],
+            "image_error": None
+        }
+
+    @staticmethod
+    def _save_result(db: Session, file_id: int, result: Dict[str, Any]) -> None:
+        """保存解析结果（在写入队列中执行）"""
+        from app.models.requirement import RequirementFile
+
+        db_file = db.query(RequirementFile).filter(RequirementFile.id == file_id).first()
+        if not db_file:
+            # 解析期间文件已被删除
+            return
+        DocumentExtractionService.apply_result(db, db_file, result)
+
+    @staticmethod
+    def apply_result(db: Session, db_file: Any, result: Dict[str, Any]) -> None:
+        """将解析结果写入文件记录，并为其创建图片记录（图片文件可被多条记录共享）"""
+        from app.models.requirement_image import RequirementImage
+
+        file_id = db_file.id
+        error = result["error"]
+        db_file.extracted_content = result["content"] if not error else None
+        db_file.is_extracted = not bool(error)
+        db_file.extract_error = error
+
+        images = result["images"]
+        if images and not result["image_error"]:
+            for img_info in images:
+                db.add(RequirementImage(
+                    requirement_file_id=file_id,
+                    image_path=img_info['path'],
+                    image_format=img_info['format'],
+                    image_size=img_info['size'],
+                    position_index=img_info['position_index'],
+                    width=img_info.get('width'),
+                    height=img_info.get('height')
+                ))
+            db_file.has_images = True
+            db_file.image_count = len(images)
+
+    @staticmethod
+    def release_images(db: Session, image_paths: List[str]) -> int:
+        """删除已不再被任何图片记录引用的图片文件，返回删除的文件数
+
+        图片文件按内容哈希目录在多条文件记录之间共享，以图片记录的引用数作为引用计数。
+        需在删除图片记录并提交之后，在写入队列中调用。
+        """
+        from app.models.requirement_image import RequirementImage
+
+        removed = 0
+        for image_path in set(image_paths):
+            referenced = db.query(RequirementImage.id).filter(
+                RequirementImage.image_path == image_path
+            ).first()
+            if referenced:
+                continue
+            try:
+                path = Path(image_path)
+                if path.exists():
+                    path.unlink()
+                    removed += 1
+                # 目录为空时一并删除
+                if path.parent.exists() and not any(path.parent.iterdir()):
+                    path.parent.rmdir()
+            except OSError as e:
+                logger.warning(f"⚠️ [文档解析] 删除图片文件失败 {image_path}: {e}")
+        return removed
+
+    def shutdown(self) -> None:
+        """关闭进程池，取消尚未开始的解析任务"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+# 全局文档解析服务实例
+extraction_service = DocumentExtractionService(max_workers=settings.extraction_max_workers)
@@ -0,0 +1,174 @@
+"""
+多模态图片服务
+将需求文档图片编码为 data URL 并缓存，AI 调用重试或多次调用同一批图片时不再重复读取和编码；
+按 token 预算限制单次调用携带的图片数量
+"""
+import base64
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.utils.image_processing import estimate_image_tokens, normalize_image_bytes, read_image_size
+
+logger = logging.getLogger(__name__)
+
+
+# 图片格式对应的 MIME 类型
+MIME_TYPES = {
+    "png": "image/png",
+    "jpg": "image/jpeg",
+    "jpeg": "image/jpeg",
+    "gif": "image/gif",
+    "webp": "image/webp",
+}
+
+
+class EncodedImage:
+    """已编码的图片"""
+
+    __slots__ = ("url", "width", "height")
+
+    def __init__(self, url: str, width: Optional[int], height: Optional[int]):
+        self.url = url
+        self.width = width
+        self.height = height
+
+
+class ImageEncodingCache:
+    """图片编码缓存
+
+    以（路径, 修改时间, 文件大小）为键缓存编码后的 data URL，按编码结果总字节数做 LRU 淘汰。
+    规范化之前上传的超大图片在编码时按配置的最大边长缩小，不修改磁盘上的文件；
+    未超过最大边长的图片原样编码。
+    """
+
+    def __init__(self, max_bytes: int, max_edge: int, quality: int):
+        self._max_bytes = max_bytes
+        self._max_edge = max_edge
+        self._quality = quality
+        self._entries: "OrderedDict[Tuple[str, int, int], EncodedImage]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, image_path: str) -> EncodedImage:
+        """获取图片的编码结果，未命中时读取并编码
+
+        Raises:
+            OSError: 图片文件不存在或无法读取
+        """
+        stat = os.stat(image_path)
+        key = (image_path, stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            encoded = self._entries.get(key)
+            if encoded is not None:
+                self._entries.move_to_end(key)
+                return encoded
+
+        encoded = self._encode(image_path)
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = encoded
+                self._total_bytes += len(encoded.url)
+                while self._total_bytes > self._max_bytes and len(self._entries) > 1:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._total_bytes -= len(evicted.url)
+        return encoded
+
+    def _encode(self, image_path: str) -> EncodedImage:
+        with open(image_path, "rb") as f:
+            data = f.read()
+        image_format = image_path.lower().rsplit(".", 1)[-1]
+        # 上传时已规范化（或本身未超过最大边长）的图片只读取尺寸，不再完整解码和重新压缩
+        width, height = read_image_size(data)
+        within_edge = width is not None and (not self._max_edge or max(width, height) <= self._max_edge)
+        if not within_edge or image_format not in MIME_TYPES:
+            data, image_format, width, height = normalize_image_bytes(
+                data, image_format, self._max_edge, self._quality
+            )
+        mime_type = MIME_TYPES.get(image_format, "image/png")
+        url = f"data:{mime_type};base64,{base64.b64encode(data).decode('utf-8')}"
+        return EncodedImage(url, width, height)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._total_bytes}
+
+
+class MultimodalImageService:
+    """多模态调用的图片内容构建"""
+
+    def __init__(self, cache: ImageEncodingCache):
+        self.cache = cache
+
+    def build_image_parts(
+        self,
+        image_paths: List[str],
+        detail: Optional[str] = None,
+        token_budget: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """构建 OpenAI 兼容格式的图片消息内容
+
+        按顺序加入图片，累计估算 token 超出预算时跳过剩余图片（第一张图片总会加入）。
+
+        Args:
+            image_paths: 图片文件路径列表（按文档中的顺序）
+            detail: 图片精度，默认使用配置
+            token_budget: 图片 token 预算，默认使用配置，0 表示不限制
+        """
+        detail = detail or settings.multimodal_image_detail
+        if token_budget is None:
+            token_budget = settings.multimodal_image_token_budget
+
+        parts = []
+        used_tokens = 0
+        skipped = 0
+        for image_path in image_paths:
+            try:
+                encoded = self.cache.get(image_path)
+            except Exception as e:
+                logger.warning(f"⚠️ 无法加载图片 {image_path}: {e}")
+                continue
+
+            tokens = estimate_image_tokens(encoded.width, encoded.height, detail)
+            if token_budget and parts and used_tokens + tokens > token_budget:
+                skipped += 1
+                continue
+
+            used_tokens += tokens
+            parts.append({
+                "type": "image_url",
+                "image_url": {"url": encoded.url, "detail": detail}
+            })
+
+        if skipped:
+            logger.warning(f"⚠️ 图片超出 token 预算 ({token_budget})，已跳过 {skipped} 张，保留 {len(parts)} 张")
+        return parts
+
+    async def build_image_parts_async(
+        self,
+        image_paths: List[str],
+        detail: Optional[str] = None,
+        token_budget: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """在线程池中构建图片消息内容，避免读取和编码图片阻塞事件循环"""
+        return await run_in_threadpool(self.build_image_parts, image_paths, detail, token_budget)
+
+
+# 全局多模态图片服务实例
+image_service = MultimodalImageService(
+    ImageEncodingCache(
+        max_bytes=settings.multimodal_image_cache_mb * 1024 * 1024,
+        max_edge=settings.image_max_edge,
+        quality=settings.image_jpeg_quality
+    )
+)
@@ -0,0 +1,122 @@
+"""
+任务结果存储
+较小的任务结果保存在内存中；超过阈值的结果压缩写入磁盘，内存中只保留摘要（标量字段和列表长度），
+查询时再从文件读取，避免大量已完成任务的结果常驻内存
+"""
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+# 结果文件目录
+TASK_RESULT_DIR = Path(settings.upload_dir) / "task_results"
+
+# 最近读取的结果解码后缓存的个数：分页读取同一结果时不必每页都解压整个文件
+LOAD_CACHE_SIZE = 4
+
+
+def summarize_result(result: Any) -> Any:
+    """结果摘要：保留标量字段，列表和字典字段替换为元素个数"""
+    if not isinstance(result, dict):
+        return {"type": type(result).__name__}
+    summary = {}
+    for key, value in result.items():
+        if isinstance(value, (list, tuple, dict)):
+            summary[f"{key}_count"] = len(value)
+        elif value is None or isinstance(value, (str, int, float, bool)):
+            summary[key] = value
+    return summary
+
+
+class TaskResultStore:
+    """任务结果的内存 / 磁盘存储"""
+
+    def __init__(self, result_dir: Path, inline_max_bytes: int):
+        self._result_dir = result_dir
+        self._inline_max_bytes = inline_max_bytes
+        self._loaded: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, task_id: str) -> Path:
+        return self._result_dir / f"{task_id}.json.gz"
+
+    def put(self, task_id: str, result: Any) -> Optional[str]:
+        """保存结果，超过阈值时写入文件并返回文件路径，否则返回 None（结果留在内存中）
+
+        序列化和压缩写入是阻塞操作，应在工作线程中调用
+        """
+        if result is None:
+            return None
+        payload = json.dumps(result, ensure_ascii=False, default=str).encode("utf-8")
+        if len(payload) <= self._inline_max_bytes:
+            return None
+        self._result_dir.mkdir(parents=True, exist_ok=True)
+        path = self._path(task_id)
+        tmp_path = self._result_dir / f".{task_id}.{uuid.uuid4().hex}.part"
+        try:
+            # 压缩级别 1：结果多为重复度高的 JSON，速度优先
+            with gzip.open(tmp_path, "wb", compresslevel=1) as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            tmp_path.unlink(missing_ok=True)
+            logger.warning(f"⚠️ [任务结果] 写入结果文件失败，保留在内存中 {task_id}: {e}")
+            return None
+        logger.debug(f"[任务结果] 任务 {task_id} 的结果（{len(payload)} 字节）已写入 {path.name}")
+        return str(path)
+
+    def load(self, path: str) -> Optional[Any]:
+        """读取结果文件，文件已被清理时返回 None
+
+        最近读取的几个结果解码后缓存在内存中，调用方不应修改返回的对象
+        """
+        with self._lock:
+            if path in self._loaded:
+                self._loaded.move_to_end(path)
+                return self._loaded[path]
+        try:
+            with gzip.open(path, "rb") as f:
+                result = json.loads(f.read())
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            self._loaded[path] = result
+            while len(self._loaded) > LOAD_CACHE_SIZE:
+                self._loaded.popitem(last=False)
+        return result
+
+    def delete(self, path: Optional[str]) -> None:
+        if path:
+            with self._lock:
+                self._loaded.pop(path, None)
+            Path(path).unlink(missing_ok=True)
+
+    def cleanup_expired(self, max_age_seconds: float) -> int:
+        """删除超过保留时间的结果文件（包括进程重启前遗留的文件），返回删除的文件数"""
+        if not self._result_dir.exists():
+            return 0
+        deadline = time.time() - max_age_seconds
+        removed = 0
+        for path in self._result_dir.iterdir():
+            try:
+                if path.stat().st_mtime < deadline:
+                    self.delete(str(path))
+                    removed += 1
+            except OSError:
+                continue
+        return removed
+
+
+# 全局任务结果存储实例
+task_result_store = TaskResultStore(TASK_RESULT_DIR, inline_max_bytes=settings.task_result_inline_kb * 1024)
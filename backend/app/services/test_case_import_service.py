@@ -0,0 +1,201 @@
+"""
+测试用例导入服务
+预先加载项目内已有用例的（模块ID, 标题）索引，将导入数据划分为新增和覆盖两部分，
+再按批次批量写入，避免逐行查询是否存在同名用例
+"""
+import re
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+
+from app.models.module import Module
+from app.models.testcase import TestCase, TestCaseStatus
+
+
+# 每批写入的用例数
+IMPORT_CHUNK_SIZE = 500
+
+# 优先级映射
+PRIORITY_MAP = {"高": "high", "中": "medium", "低": "low"}
+
+# 步骤编号（如 "1. "）
+STEP_PATTERN = re.compile(r'(\d+)\.\s*')
+
+# 默认模块名称
+DEFAULT_MODULE_NAME = "未分类"
+
+
+def merge_import_rows(rows: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """合并模块路径和标题一致的用例（模块路径去除首尾空白，为空时使用默认模块）
+
+    Args:
+        rows: 解析出的导入数据，每项包含 path、title 及步骤等字段
+
+    Returns:
+        合并后的导入数据（保持首次出现的顺序）
+    """
+    merged_map: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for item in rows:
+        # 先规范化模块路径再合并，仅首尾空白不同的路径视为同一模块
+        item["path"] = (item.get("path") or "").strip() or DEFAULT_MODULE_NAME
+        key = (item["path"], item["title"])
+        if key not in merged_map:
+            merged_map[key] = item
+            continue
+
+        target = merged_map[key]
+        # 合并前置条件
+        if item.get("preconditions") and item["preconditions"] not in target["preconditions"]:
+            target["preconditions"] += "\n" + item["preconditions"]
+
+        # 合并步骤
+        if "test_steps" in item:
+            target.setdefault("test_steps", []).extend(item["test_steps"])
+        else:
+            # Excel 导入的 raw 字段合并
+            target["steps_raw"] = (target.get("steps_raw", "") + "\n" + item.get("steps_raw", "")).strip()
+            target["expected_raw"] = (target.get("expected_raw", "") + "\n" + item.get("expected_raw", "")).strip()
+    return list(merged_map.values())
+
+
+def _split_numbered(text: str) -> Dict[str, str]:
+    parts = STEP_PATTERN.split(text)
+    numbered = {}
+    for i in range(1, len(parts) - 1, 2):
+        numbered[parts[i]] = parts[i + 1].strip()
+    return numbered
+
+
+def parse_test_steps(steps_text: str, expected_text: str) -> List[Dict[str, str]]:
+    """将 "1. xxx 2. xxx" 形式的步骤和预期结果文本解析为结构化步骤"""
+    step_dict = _split_numbered(steps_text)
+    if not step_dict:
+        return [{"action": steps_text, "expected": expected_text}]
+
+    expected_dict = _split_numbered(expected_text)
+    return [
+        {"action": step_dict[num], "expected": expected_dict.get(num, "")}
+        for num in sorted(step_dict.keys(), key=int)
+    ]
+
+
+class TestCaseImporter:
+    """测试用例批量导入器
+
+    同一项目中（模块ID, 标题）相同的用例会被覆盖并重置为草稿，其余用例批量新增。
+    导入器只执行写入而不提交，调用方负责提交或回滚，整个导入在一个事务中完成。
+    """
+
+    def __init__(
+        self,
+        db: Session,
+        project_id: int,
+        user_id: int,
+        chunk_size: int = IMPORT_CHUNK_SIZE,
+        progress_callback: Optional[Callable[[int, int], None]] = None
+    ):
+        """
+        Args:
+            db: 数据库会话
+            project_id: 项目ID
+            user_id: 导入用户ID（作为新增用例的创建者）
+            chunk_size: 每批写入的用例数
+            progress_callback: 进度回调 ``callback(已处理数, 总数)``，每批写入后调用
+        """
+        self.db = db
+        self.project_id = project_id
+        self.user_id = user_id
+        self.chunk_size = chunk_size
+        self.progress_callback = progress_callback
+
+    def _load_module_map(self, names: Iterable[str]) -> Dict[str, int]:
+        """加载模块名称到ID的映射，缺失的模块一次性创建"""
+        module_map = {
+            name: module_id
+            for module_id, name in self.db.query(Module.id, Module.name).filter(
+                Module.project_id == self.project_id
+            ).order_by(Module.id)
+        }
+
+        missing = [name for name in dict.fromkeys(names) if name not in module_map]
+        if missing:
+            new_modules = [Module(name=name, project_id=self.project_id) for name in missing]
+            self.db.add_all(new_modules)
+            self.db.flush()  # 获取 ID
+            module_map.update((m.name, m.id) for m in new_modules)
+        return module_map
+
+    def _load_existing_cases(self) -> Dict[Tuple[int, str], int]:
+        """加载项目内已有用例的（模块ID, 标题）-> 用例ID 索引"""
+        existing: Dict[Tuple[int, str], int] = {}
+        rows = self.db.query(TestCase.id, TestCase.module_id, TestCase.title).filter(
+            TestCase.project_id == self.project_id
+        ).order_by(TestCase.id).yield_per(self.chunk_size)
+        for case_id, module_id, title in rows:
+            existing.setdefault((module_id, title), case_id)
+        return existing
+
+    @staticmethod
+    def _build_values(data: Dict[str, Any]) -> Dict[str, Any]:
+        test_steps = data.get("test_steps") or []
+        if not test_steps and data.get("steps_raw"):
+            test_steps = parse_test_steps(str(data["steps_raw"]), str(data.get("expected_raw", "")))
+        return {
+            "preconditions": data.get("preconditions"),
+            "test_steps": test_steps,
+            "priority": PRIORITY_MAP.get(data.get("priority"), "medium"),
+            "design_method": data.get("design_method"),
+            "test_category": data.get("test_category"),
+            "status": TestCaseStatus.DRAFT  # 覆盖后重置为草稿
+        }
+
+    def run(self, rows: List[Dict[str, Any]]) -> Dict[str, int]:
+        """导入已合并的用例数据
+
+        Args:
+            rows: :func:`merge_import_rows` 合并后的导入数据
+
+        Returns:
+            包含 imported_count、created_count、updated_count 的字典
+        """
+        module_map = self._load_module_map(data["path"] for data in rows)
+        existing = self._load_existing_cases()
+
+        total = len(rows)
+        created_count = 0
+        updated_count = 0
+        for start in range(0, total, self.chunk_size):
+            inserts = []
+            updates = []
+            for data in rows[start:start + self.chunk_size]:
+                module_id = module_map[data["path"]]
+                values = self._build_values(data)
+                case_id = existing.get((module_id, data["title"]))
+                if case_id is not None:
+                    values["id"] = case_id
+                    updates.append(values)
+                else:
+                    values.update(
+                        title=data["title"],
+                        module_id=module_id,
+                        project_id=self.project_id,
+                        created_by=self.user_id
+                    )
+                    inserts.append(values)
+
+            if inserts:
+                self.db.execute(insert(TestCase), inserts)
+                created_count += len(inserts)
+            if updates:
+                self.db.execute(update(TestCase), updates)
+                updated_count += len(updates)
+
+            if self.progress_callback:
+                self.progress_callback(min(start + self.chunk_size, total), total)
+
+        return {
+            "imported_count": created_count + updated_count,
+            "created_count": created_count,
+            "updated_count": updated_count
+        }
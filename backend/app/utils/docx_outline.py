@@ -0,0 +1,327 @@
+"""
+DOCX 文档结构解析工具
+直接流式读取 word/document.xml，按文档顺序产出标题、段落、表格和图片锚点组成的大纲，
+每个块带有所属章节编号；不依赖 python-docx 的完整对象模型
+"""
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+from typing import Any, Dict, Iterator, List, Optional
+
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+R_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+A_NS = "http://schemas.openxmlformats.org/drawingml/2006/main"
+V_NS = "urn:schemas-microsoft-com:vml"
+
+_W = "{%s}" % W_NS
+TAG_BODY = _W + "body"
+TAG_P = _W + "p"
+TAG_TBL = _W + "tbl"
+TAG_TR = _W + "tr"
+TAG_TC = _W + "tc"
+TAG_T = _W + "t"
+TAG_TAB = _W + "tab"
+TAG_BR = _W + "br"
+TAG_CR = _W + "cr"
+TAG_PPR = _W + "pPr"
+TAG_PSTYLE = _W + "pStyle"
+TAG_OUTLINE_LVL = _W + "outlineLvl"
+TAG_BLIP = "{%s}blip" % A_NS
+TAG_IMAGEDATA = "{%s}imagedata" % V_NS
+ATTR_VAL = _W + "val"
+ATTR_EMBED = "{%s}embed" % R_NS
+ATTR_RID = "{%s}id" % R_NS
+
+# 样式名称中的标题级别（英文及中文版 Word）
+HEADING_NAME_PATTERN = re.compile(r"^(?:heading|标题)\s*(\d)$", re.IGNORECASE)
+
+# 正文之前内容所属的章节编号
+PREAMBLE_SECTION_ID = "0"
+
+
+def _load_heading_levels(docx: zipfile.ZipFile) -> Dict[str, int]:
+    """读取 styles.xml，返回段落样式ID到标题级别（1-9）的映射
+
+    级别取自样式的大纲级别，未设置时根据样式名称（Heading N / 标题 N / Title）判断，
+    基于其他样式的样式继承其大纲级别。
+    """
+    try:
+        root = ET.fromstring(docx.read("word/styles.xml"))
+    except KeyError:
+        return {}
+
+    levels: Dict[str, int] = {}
+    based_on: Dict[str, str] = {}
+    for style in root.iter(_W + "style"):
+        if style.get(_W + "type") != "paragraph":
+            continue
+        style_id = style.get(_W + "styleId")
+        if not style_id:
+            continue
+
+        outline = style.find(f"{TAG_PPR}/{TAG_OUTLINE_LVL}")
+        name = style.find(_W + "name")
+        name_val = (name.get(ATTR_VAL) if name is not None else "") or ""
+        match = HEADING_NAME_PATTERN.match(name_val.strip())
+        if outline is not None and outline.get(ATTR_VAL, "").isdigit():
+            level = int(outline.get(ATTR_VAL)) + 1
+            if level <= 9:
+                levels[style_id] = level
+        elif match:
+            levels[style_id] = int(match.group(1))
+        elif name_val.strip().lower() == "title":
+            levels[style_id] = 1
+        else:
+            parent = style.find(_W + "basedOn")
+            if parent is not None and parent.get(ATTR_VAL):
+                based_on[style_id] = parent.get(ATTR_VAL)
+
+    for style_id, parent_id in based_on.items():
+        seen = {style_id}
+        while parent_id and parent_id not in levels and parent_id not in seen:
+            seen.add(parent_id)
+            parent_id = based_on.get(parent_id)
+        if parent_id in levels:
+            levels[style_id] = levels[parent_id]
+    return levels
+
+
+def load_image_targets(docx: zipfile.ZipFile) -> Dict[str, str]:
+    """读取正文的关系文件，返回图片关系ID到压缩包内路径的映射"""
+    try:
+        root = ET.fromstring(docx.read("word/_rels/document.xml.rels"))
+    except KeyError:
+        return {}
+
+    targets = {}
+    for rel in root.iter("{%s}Relationship" % PKG_REL_NS):
+        if not rel.get("Type", "").endswith("/image") or rel.get("TargetMode") == "External":
+            continue
+        target = rel.get("Target", "")
+        if target.startswith("/"):
+            target = target[1:]
+        elif not target.startswith("word/"):
+            target = "word/" + target
+        targets[rel.get("Id")] = target
+    return targets
+
+
+def _paragraph_text(elem: ET.Element) -> str:
+    parts = []
+    for node in elem.iter():
+        if node.tag == TAG_T:
+            parts.append(node.text or "")
+        elif node.tag == TAG_TAB:
+            parts.append("\t")
+        elif node.tag in (TAG_BR, TAG_CR):
+            parts.append("\n")
+    return "".join(parts).strip()
+
+
+def _paragraph_level(elem: ET.Element, heading_levels: Dict[str, int]) -> Optional[int]:
+    ppr = elem.find(TAG_PPR)
+    if ppr is None:
+        return None
+    outline = ppr.find(TAG_OUTLINE_LVL)
+    if outline is not None and outline.get(ATTR_VAL, "").isdigit():
+        level = int(outline.get(ATTR_VAL)) + 1
+        return level if level <= 9 else None
+    style = ppr.find(TAG_PSTYLE)
+    if style is not None:
+        return heading_levels.get(style.get(ATTR_VAL))
+    return None
+
+
+def _image_rel_ids(elem: ET.Element) -> List[str]:
+    rel_ids = []
+    for node in elem.iter():
+        if node.tag == TAG_BLIP:
+            rel_id = node.get(ATTR_EMBED)
+        elif node.tag == TAG_IMAGEDATA:
+            rel_id = node.get(ATTR_RID)
+        else:
+            continue
+        if rel_id:
+            rel_ids.append(rel_id)
+    return rel_ids
+
+
+def _table_rows(elem: ET.Element) -> List[List[str]]:
+    """提取表格各行非空单元格的文本，嵌套表格的内容并入所在单元格"""
+    rows = []
+    for tr in elem.findall(TAG_TR):
+        cells = []
+        for tc in tr.findall(TAG_TC):
+            text = "\n".join(filter(None, (_paragraph_text(p) for p in tc.iter(TAG_P))))
+            if text:
+                cells.append(text)
+        if cells:
+            rows.append(cells)
+    return rows
+
+
+class _SectionCounter:
+    """根据标题级别生成多级章节编号（如 1、1.2、1.2.3）"""
+
+    def __init__(self):
+        self._counters: List[int] = []
+
+    def next(self, level: int) -> str:
+        del self._counters[level:]
+        while len(self._counters) < level:
+            self._counters.append(0)
+        self._counters[level - 1] += 1
+        return ".".join(str(c) for c in self._counters)
+
+
+def iter_docx_outline(docx: zipfile.ZipFile, image_targets: Optional[Dict[str, str]] = None) -> Iterator[Dict[str, Any]]:
+    """按文档顺序产出 DOCX 正文的大纲块
+
+    正文 XML 以流式方式解析，每个顶层段落或表格处理完后即释放。块的类型：
+
+    - ``heading``：标题，包含 level（1-9）和 text
+    - ``paragraph``：正文段落，包含 text
+    - ``table``：表格，包含 rows（各行非空单元格文本）
+    - ``image``：图片锚点，包含 rel_id（图片关系ID）和 target（压缩包内路径）
+
+    每个块都带有 section_id，即所属章节的编号；第一个标题之前的内容属于章节 "0"。
+
+    Args:
+        docx: 已打开的 DOCX 压缩包
+        image_targets: :func:`load_image_targets` 的结果，为空时自动读取
+
+    Raises:
+        KeyError: 缺少 word/document.xml
+        xml.etree.ElementTree.ParseError: 正文 XML 无效
+    """
+    heading_levels = _load_heading_levels(docx)
+    if image_targets is None:
+        image_targets = load_image_targets(docx)
+    counter = _SectionCounter()
+    section_id = PREAMBLE_SECTION_ID
+
+    table_depth = 0
+    paragraph_depth = 0
+    with docx.open("word/document.xml") as stream:
+        for event, elem in ET.iterparse(stream, events=("start", "end")):
+            if event == "start":
+                if elem.tag == TAG_TBL:
+                    table_depth += 1
+                elif elem.tag == TAG_P:
+                    paragraph_depth += 1
+                continue
+
+            if elem.tag == TAG_P:
+                paragraph_depth -= 1
+                if table_depth or paragraph_depth:
+                    # 表格内和文本框内的段落随外层块一起处理
+                    continue
+                text = _paragraph_text(elem)
+                level = _paragraph_level(elem, heading_levels) if text else None
+                if level:
+                    section_id = counter.next(level)
+                    yield {"type": "heading", "section_id": section_id, "level": level, "text": text}
+                elif text:
+                    yield {"type": "paragraph", "section_id": section_id, "text": text}
+                for rel_id in _image_rel_ids(elem):
+                    if rel_id in image_targets:
+                        yield {"type": "image", "section_id": section_id,
+                               "rel_id": rel_id, "target": image_targets[rel_id]}
+                elem.clear()
+            elif elem.tag == TAG_TBL:
+                table_depth -= 1
+                if table_depth or paragraph_depth:
+                    continue
+                rows = _table_rows(elem)
+                if rows:
+                    yield {"type": "table", "section_id": section_id, "rows": rows}
+                for rel_id in _image_rel_ids(elem):
+                    if rel_id in image_targets:
+                        yield {"type": "image", "section_id": section_id,
+                               "rel_id": rel_id, "target": image_targets[rel_id]}
+                elem.clear()
+            elif elem.tag == TAG_BODY:
+                elem.clear()
+
+
+def render_block(block: Dict[str, Any], image_numbers: Optional[Dict[str, int]] = None) -> str:
+    """将大纲块渲染为文本
+
+    标题渲染为 Markdown 标题，表格每行单元格以 | 分隔，
+    图片渲染为 ``[图片N]`` 锚点（N 为图片在文档中的序号，从1开始）。
+    """
+    block_type = block["type"]
+    if block_type == "heading":
+        return "#" * block["level"] + " " + block["text"]
+    if block_type == "table":
+        return "\n".join(" | ".join(cells) for cells in block["rows"])
+    if block_type == "image":
+        number = (image_numbers or {}).get(block["rel_id"])
+        return f"[图片{number}]" if number else ""
+    return block["text"]
+
+
+def number_images(blocks: List[Dict[str, Any]]) -> Dict[str, int]:
+    """按首次出现的顺序为图片关系编号（从1开始），同一图片多次出现时共用编号"""
+    numbers: Dict[str, int] = {}
+    for block in blocks:
+        if block["type"] == "image" and block["rel_id"] not in numbers:
+            numbers[block["rel_id"]] = len(numbers) + 1
+    return numbers
+
+
+def render_outline(blocks: List[Dict[str, Any]]) -> str:
+    """将大纲按文档顺序渲染为文本，块之间以空行分隔"""
+    image_numbers = number_images(blocks)
+    return "\n\n".join(filter(None, (render_block(block, image_numbers) for block in blocks)))
+
+
+def build_outline_sections(blocks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """将大纲块按章节分组
+
+    Returns:
+        按文档顺序排列的章节列表，每项包含 section_id、title、level、content
+        （本章节直属块渲染的文本，不含子章节）和 image_numbers（本章节引用的图片序号）
+    """
+    image_numbers = number_images(blocks)
+    sections: List[Dict[str, Any]] = []
+    current: Optional[Dict[str, Any]] = None
+    parts: List[str] = []
+
+    def close() -> None:
+        if current is not None:
+            current["content"] = "\n\n".join(parts)
+            sections.append(current)
+
+    for block in blocks:
+        if block["type"] == "heading" or current is None:
+            close()
+            parts = []
+            if block["type"] == "heading":
+                current = {"section_id": block["section_id"], "title": block["text"],
+                           "level": block["level"], "content": "", "image_numbers": []}
+                continue
+            current = {"section_id": PREAMBLE_SECTION_ID, "title": "", "level": 0,
+                       "content": "", "image_numbers": []}
+
+        text = render_block(block, image_numbers)
+        if text:
+            parts.append(text)
+        if block["type"] == "image":
+            number = image_numbers.get(block["rel_id"])
+            if number and number not in current["image_numbers"]:
+                current["image_numbers"].append(number)
+    close()
+    return sections
+
+
+def read_docx_outline(file_path: str) -> List[Dict[str, Any]]:
+    """读取 DOCX 文件的完整大纲
+
+    Raises:
+        zipfile.BadZipFile: 文件不是有效的 DOCX 文件
+    """
+    with zipfile.ZipFile(file_path) as docx:
+        return list(iter_docx_outline(docx))
@@ -2,10 +2,18 @@
 文件内容提取工具
 支持从不同格式的文件中提取文本内容和图片
 """
+import json
+import logging
 import os
+import zipfile
 from typing import Optional, List, Dict, Any
 from pathlib import Path
 
+from app.utils.docx_outline import iter_docx_outline, load_image_targets, number_images, render_outline
+from app.utils.image_processing import save_normalized_image
+
+logger = logging.getLogger(__name__)
+
 
 def extract_text_from_file(file_path: str, file_type: str) -> tuple[str, Optional[str]]:
     """
@@ -13,7 +21,7 @@ def extract_text_from_file(file_path: str, file_type: str) -> tuple[str, Optiona
     
     Args:
         file_path: 文件路径
-        file_type: 文件类型 (txt/docx/md)
+        file_type: 文件类型 (txt/docx/md/pdf/xlsx)
         
     Returns:
         tuple[content, error]: (提取的内容, 错误信息)
@@ -25,12 +33,52 @@ def extract_text_from_file(file_path: str, file_type: str) -> tuple[str, Optiona
             return extract_from_docx(file_path)
         elif file_type == 'md':
             return extract_from_md(file_path)
+        elif file_type == 'pdf':
+            return extract_from_pdf(file_path)
+        elif file_type == 'xlsx':
+            return extract_from_xlsx(file_path)
         else:
             return "", f"不支持的文件类型: {file_type}"
     except Exception as e:
         return "", f"提取失败: {str(e)}"
 
 
+def extract_document(
+    file_path: str,
+    file_type: str,
+    image_output_dir: Optional[str] = None,
+    image_max_edge: int = 0,
+    image_quality: int = 85
+) -> Dict[str, Any]:
+    """
+    提取文档的文本和图片（解析进程池的入口函数）
+    
+    该函数会在子进程中执行，参数和返回值都必须是可序列化的普通数据。
+    
+    Args:
+        file_path: 文件路径
+        file_type: 文件类型 (txt/docx/md/pdf/xlsx)
+        image_output_dir: 图片输出目录，DOCX和PDF文件使用
+        image_max_edge: 图片最大边长（像素），0 表示不缩放
+        image_quality: 图片重新压缩的 JPEG 质量
+        
+    Returns:
+        dict: content/error 为文本提取结果，images/image_error 为图片提取结果
+    """
+    if file_type == 'pdf':
+        return extract_pdf_document(file_path, image_output_dir, image_max_edge, image_quality)
+    if file_type == 'docx':
+        return extract_docx_document(file_path, image_output_dir, image_max_edge, image_quality)
+    
+    content, error = extract_text_from_file(file_path, file_type)
+    return {
+        "content": content,
+        "error": error,
+        "images": [],
+        "image_error": None
+    }
+
+
 def extract_from_txt(file_path: str) -> tuple[str, Optional[str]]:
     """
     从TXT文件提取内容
@@ -55,38 +103,17 @@ def extract_from_txt(file_path: str) -> tuple[str, Optional[str]]:
 def extract_from_docx(file_path: str) -> tuple[str, Optional[str]]:
     """
     从DOCX文件提取内容
+    
+    按文档顺序输出标题（Markdown 标题格式）、段落、表格和图片锚点（[图片N]）。
     """
     try:
-        from docx import Document
-        
-        doc = Document(file_path)
-        
-        # 提取所有段落
-        paragraphs = []
-        for paragraph in doc.paragraphs:
-            text = paragraph.text.strip()
-            if text:  # 忽略空段落
-                paragraphs.append(text)
-        
-        # 提取表格内容
-        for table in doc.tables:
-            for row in table.rows:
-                row_data = []
-                for cell in row.cells:
-                    cell_text = cell.text.strip()
-                    if cell_text:
-                        row_data.append(cell_text)
-                if row_data:
-                    paragraphs.append(' | '.join(row_data))
-        
-        content = '\n\n'.join(paragraphs)
+        with zipfile.ZipFile(file_path) as docx:
+            content = render_outline(list(iter_docx_outline(docx)))
         
         if not content:
             return "", "文档为空或无法提取内容"
         
         return content, None
-    except ImportError:
-        return "", "缺少python-docx库，请安装: pip install python-docx"
     except Exception as e:
         return "", f"读取DOCX文件失败: {str(e)}"
 
@@ -112,6 +139,202 @@ def extract_from_md(file_path: str) -> tuple[str, Optional[str]]:
         return "", f"读取Markdown文件失败: {str(e)}"
 
 
+def extract_from_pdf(file_path: str) -> tuple[str, Optional[str]]:
+    """
+    从PDF文件提取文本内容（逐页提取，页之间以空行分隔）
+    """
+    result = extract_pdf_document(file_path)
+    return result["content"], result["error"]
+
+
+def extract_from_xlsx(file_path: str) -> tuple[str, Optional[str]]:
+    """
+    从XLSX文件提取内容
+    
+    按工作表输出，每个工作表以标题行开头，每行单元格以 | 分隔，空行和空单元格被忽略。
+    """
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        return "", "缺少openpyxl库，请安装: pip install openpyxl"
+    
+    try:
+        from app.utils.spreadsheet_reader import cell_to_text
+        
+        workbook = load_workbook(file_path, read_only=True, data_only=True)
+        sections = []
+        try:
+            for worksheet in workbook.worksheets:
+                lines = []
+                for row in worksheet.iter_rows(values_only=True):
+                    cells = [cell_to_text(value).strip() for value in row]
+                    cells = [cell for cell in cells if cell]
+                    if cells:
+                        lines.append(' | '.join(cells))
+                if lines:
+                    sections.append(f"【工作表: {worksheet.title}】\n" + '\n'.join(lines))
+        finally:
+            workbook.close()
+        
+        content = '\n\n'.join(sections)
+        if not content:
+            return "", "工作簿为空或无法提取内容"
+        
+        return content, None
+    except Exception as e:
+        return "", f"读取XLSX文件失败: {str(e)}"
+
+
+def get_pdf_page_count(file_path: str) -> int:
+    """
+    获取PDF文件的页数
+    """
+    from PyPDF2 import PdfReader
+    
+    return len(PdfReader(file_path).pages)
+
+
+def extract_pdf_pages(
+    file_path: str,
+    start: int,
+    end: int,
+    image_output_dir: Optional[str] = None,
+    max_edge: int = 0,
+    quality: int = 85,
+    cache_dir: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    提取PDF文件中 [start, end) 范围内各页的文本和图片（解析进程池的入口函数）
+    
+    指定 cache_dir 时每页的提取结果保存为 page_<页码>.json，再次提取同一页时直接读取，
+    解析中断（如服务重启）后重新解析只需处理剩余页。
+    
+    Args:
+        file_path: PDF文件路径
+        start: 起始页（从0开始，包含）
+        end: 结束页（不包含）
+        image_output_dir: 图片输出目录，为空时不提取图片
+        max_edge: 图片最大边长（像素），0 表示不缩放
+        quality: 重新压缩的 JPEG 质量
+        cache_dir: 逐页提取结果缓存目录
+        
+    Returns:
+        list: 每页一个字典，包含 index（页码）、text（文本）、images（图片信息列表，不含 position_index）
+    """
+    from PyPDF2 import PdfReader
+    
+    reader = None
+    pages = []
+    for index in range(start, end):
+        cache_path = Path(cache_dir) / f"page_{index:05d}.json" if cache_dir else None
+        page = _load_cached_page(cache_path, bool(image_output_dir))
+        if page is None:
+            if reader is None:
+                reader = PdfReader(file_path)
+            page = _extract_pdf_page(reader.pages[index], index, image_output_dir, max_edge, quality)
+            if cache_path is not None:
+                cache_path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = cache_path.with_suffix('.tmp')
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(page, f, ensure_ascii=False)
+                os.replace(tmp_path, cache_path)
+        pages.append(page)
+    return pages
+
+
+def _load_cached_page(cache_path: Optional[Path], with_images: bool) -> Optional[Dict[str, Any]]:
+    """读取逐页缓存，缓存不存在、损坏或引用的图片已被删除时返回 None"""
+    if cache_path is None or not cache_path.exists():
+        return None
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            page = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if with_images and not page.get('with_images'):
+        return None
+    if any(not os.path.exists(img['path']) for img in page['images']):
+        return None
+    return page
+
+
+def _extract_pdf_page(
+    page: Any,
+    index: int,
+    image_output_dir: Optional[str],
+    max_edge: int,
+    quality: int
+) -> Dict[str, Any]:
+    """提取单页的文本和图片，单张图片提取失败不影响其他内容"""
+    text = (page.extract_text() or '').strip()
+    
+    images: List[Dict[str, Any]] = []
+    if image_output_dir:
+        output_path = Path(image_output_dir)
+        output_path.mkdir(parents=True, exist_ok=True)
+        try:
+            page_images = page.images
+        except Exception as e:
+            logger.warning(f"提取图片失败 (page={index + 1}): {e}")
+            page_images = []
+        for image in page_images:
+            try:
+                image_ext = image.name.rsplit('.', 1)[-1].lower() if '.' in image.name else 'png'
+                if image_ext == 'jpeg':
+                    image_ext = 'jpg'
+                saved = save_normalized_image(image.data, image_ext, output_path, max_edge, quality)
+                images.append(saved)
+            except Exception as e:
+                logger.warning(f"提取图片失败 (page={index + 1}, name={image.name}): {e}")
+                continue
+    
+    return {'index': index, 'text': text, 'images': images, 'with_images': bool(image_output_dir)}
+
+
+def merge_pdf_pages(pages: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    按页码顺序合并逐页提取结果，返回与 extract_document 相同格式的结果
+    
+    图片按出现顺序重新编号 position_index。
+    """
+    pages = sorted(pages, key=lambda p: p['index'])
+    content = '\n\n'.join(page['text'] for page in pages if page['text'])
+    images = []
+    for page in pages:
+        for img in page['images']:
+            images.append({**img, 'position_index': len(images)})
+    
+    return {
+        "content": content,
+        "error": None if content or images else "PDF中没有可提取的文本（可能是扫描件）",
+        "images": images,
+        "image_error": None
+    }
+
+
+def extract_pdf_document(
+    file_path: str,
+    image_output_dir: Optional[str] = None,
+    max_edge: int = 0,
+    quality: int = 85
+) -> Dict[str, Any]:
+    """
+    在当前进程中逐页提取整个PDF文件，返回与 extract_document 相同格式的结果
+    """
+    try:
+        from PyPDF2 import PdfReader  # noqa: F401
+    except ImportError:
+        error = "缺少PyPDF2库，请安装: pip install PyPDF2"
+        return {"content": "", "error": error, "images": [], "image_error": None}
+    
+    try:
+        page_count = get_pdf_page_count(file_path)
+        pages = extract_pdf_pages(file_path, 0, page_count, image_output_dir, max_edge, quality)
+    except Exception as e:
+        return {"content": "", "error": f"读取PDF文件失败: {str(e)}", "images": [], "image_error": None}
+    return merge_pdf_pages(pages)
+
+
 def validate_file_type(filename: str) -> tuple[bool, str]:
     """
     验证文件类型
@@ -127,7 +350,9 @@ def validate_file_type(filename: str) -> tuple[bool, str]:
     allowed_extensions = {
         '.txt': 'txt',
         '.docx': 'docx',
-        '.md': 'md'
+        '.md': 'md',
+        '.pdf': 'pdf',
+        '.xlsx': 'xlsx'
     }
     
     if ext in allowed_extensions:
@@ -150,13 +375,24 @@ def validate_file_size(file_size: int, max_size: int = 10 * 1024 * 1024) -> bool
     return file_size <= max_size
 
 
-def extract_images_from_docx(file_path: str, output_dir: str) -> tuple[List[Dict[str, Any]], Optional[str]]:
+def extract_images_from_docx(
+    file_path: str,
+    output_dir: str,
+    max_edge: int = 0,
+    quality: int = 85
+) -> tuple[List[Dict[str, Any]], Optional[str]]:
     """
     从DOCX文件中提取所有嵌入图片
     
+    图片按在正文中首次出现的顺序编号，未在正文中引用的图片排在最后。
+    图片在保存时规范化（缩放到最大边长并重新压缩），并以内容哈希命名，
+    文档中重复出现的相同图片只保存一份。
+    
     Args:
         file_path: DOCX文件路径
         output_dir: 图片输出目录路径
+        max_edge: 图片最大边长（像素），0 表示不缩放
+        quality: 重新压缩的 JPEG 质量
         
     Returns:
         tuple[images, error]: (图片信息列表, 错误信息)
@@ -170,65 +406,106 @@ def extract_images_from_docx(file_path: str, output_dir: str) -> tuple[List[Dict
         - height: 图片高度（如果可获取）
     """
     try:
-        from docx import Document
-        from docx.opc.constants import RELATIONSHIP_TYPE as RT
-    except ImportError:
-        return [], "缺少python-docx库，请安装: pip install python-docx"
-    
+        with zipfile.ZipFile(file_path) as docx:
+            image_targets = load_image_targets(docx)
+            blocks = list(iter_docx_outline(docx, image_targets))
+            return _save_docx_images(docx, blocks, image_targets, output_dir, max_edge, quality), None
+    except Exception as e:
+        return [], f"提取DOCX图片失败: {str(e)}"
+
+
+def extract_docx_document(
+    file_path: str,
+    image_output_dir: Optional[str] = None,
+    max_edge: int = 0,
+    quality: int = 85
+) -> Dict[str, Any]:
+    """
+    一次遍历DOCX正文，同时提取文本和图片，返回与 extract_document 相同格式的结果
+    """
+    result: Dict[str, Any] = {"content": "", "error": None, "images": [], "image_error": None}
     try:
-        # 确保输出目录存在
-        output_path = Path(output_dir)
-        output_path.mkdir(parents=True, exist_ok=True)
-        
-        doc = Document(file_path)
-        images: List[Dict[str, Any]] = []
-        
-        # 遍历文档中的所有关系，找到图片
-        for rel_id, rel in doc.part.rels.items():
-            # 检查是否是图片关系
-            if "image" in rel.target_ref.lower():
-                try:
-                    image_data = rel.target_part.blob
-                    
-                    # 从target_ref中提取文件扩展名
-                    target_ref = rel.target_ref
-                    image_ext = target_ref.split('.')[-1].lower() if '.' in target_ref else 'png'
-                    
-                    # 标准化扩展名
-                    if image_ext == 'jpeg':
-                        image_ext = 'jpg'
-                    elif image_ext not in ['png', 'jpg', 'gif', 'bmp', 'tiff', 'webp']:
-                        image_ext = 'png'  # 默认使用png
-                    
-                    # 生成唯一文件名
-                    position_index = len(images)
-                    image_filename = f"image_{position_index:03d}.{image_ext}"
-                    image_path = output_path / image_filename
-                    
-                    # 保存图片
-                    with open(image_path, 'wb') as f:
-                        f.write(image_data)
-                    
-                    # 尝试获取图片尺寸
-                    width, height = _get_image_dimensions(str(image_path))
-                    
-                    images.append({
-                        'path': str(image_path),
-                        'format': image_ext,
-                        'size': len(image_data),
-                        'position_index': position_index,
-                        'width': width,
-                        'height': height
-                    })
-                except Exception as e:
-                    # 单个图片提取失败不影响其他图片
-                    print(f"提取图片失败 (rel_id={rel_id}): {str(e)}")
-                    continue
+        docx = zipfile.ZipFile(file_path)
+    except Exception as e:
+        result["error"] = f"读取DOCX文件失败: {str(e)}"
+        return result
+    
+    with docx:
+        image_targets = load_image_targets(docx)
+        try:
+            blocks = list(iter_docx_outline(docx, image_targets))
+        except Exception as e:
+            result["error"] = f"读取DOCX文件失败: {str(e)}"
+            return result
         
-        return images, None
+        result["content"] = render_outline(blocks)
+        if not result["content"]:
+            result["error"] = "文档为空或无法提取内容"
         
-    except Exception as e:
-        return [], f"提取DOCX图片失败: {str(e)}"
+        if image_output_dir:
+            try:
+                result["images"] = _save_docx_images(
+                    docx, blocks, image_targets, image_output_dir, max_edge, quality
+                )
+            except Exception as e:
+                result["image_error"] = f"提取DOCX图片失败: {str(e)}"
+    return result
+
+
+def _save_docx_images(
+    docx: zipfile.ZipFile,
+    blocks: List[Dict[str, Any]],
+    image_targets: Dict[str, str],
+    output_dir: str,
+    max_edge: int,
+    quality: int
+) -> List[Dict[str, Any]]:
+    """按图片编号顺序保存DOCX中的图片，position_index 与正文中的 [图片N] 锚点对应（N = position_index + 1）"""
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+    
+    # 正文引用的图片按锚点编号定位，未被引用的图片排在其后；
+    # 位置在保存前确定，单个图片失败不会使后续图片与锚点错位
+    numbers = number_images(blocks)
+    positions = {rel_id: number - 1 for rel_id, number in numbers.items()}
+    unreferenced = [rel_id for rel_id in image_targets if rel_id not in numbers]
+    positions.update((rel_id, len(numbers) + i) for i, rel_id in enumerate(unreferenced))
+    
+    images: List[Dict[str, Any]] = []
+    for rel_id, position_index in positions.items():
+        try:
+            target = image_targets[rel_id]
+            image_data = docx.read(target)
+            
+            # 从路径中提取文件扩展名并标准化
+            image_ext = target.rsplit('.', 1)[-1].lower() if '.' in target else 'png'
+            if image_ext == 'jpeg':
+                image_ext = 'jpg'
+            elif image_ext not in ['png', 'jpg', 'gif', 'bmp', 'tiff', 'webp']:
+                image_ext = 'png'  # 默认使用png
+            
+            # 规范化并按内容哈希保存
+            saved = save_normalized_image(image_data, image_ext, output_path, max_edge, quality)
+            
+            # 未能通过 Pillow 获取尺寸时读取文件头
+            width, height = saved['width'], saved['height']
+            if width is None or height is None:
+                width, height = _get_image_dimensions(saved['path'])
+            
+            images.append({
+                'path': saved['path'],
+                'format': saved['format'],
+                'size': saved['size'],
+                'position_index': position_index,
+                'width': width,
+                'height': height
+            })
+        except Exception as e:
+            # 单个图片提取失败不影响其他图片
+            logger.warning(f"提取图片失败 (rel_id={rel_id}): {e}")
+            continue
+    
+    return images
 
 
 def _get_image_dimensions(image_path: str) -> tuple[Optional[int], Optional[int]]:
@@ -0,0 +1,118 @@
+"""
+文件存储工具
+以流式方式保存上传文件，边写入边计算 SHA-256，并按内容哈希存储实现去重
+"""
+import hashlib
+import logging
+import os
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Optional
+
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+
+
+logger = logging.getLogger(__name__)
+
+# 每次读取的块大小
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB
+
+
+class FileTooLargeError(Exception):
+    """上传文件超过大小限制"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        super().__init__(f"文件大小超过限制（最大 {max_size // 1024 // 1024}MB）")
+
+
+@dataclass
+class StoredFile:
+    """已保存文件的信息"""
+    path: Path
+    size: int
+    content_hash: str
+    deduplicated: bool  # 是否复用了已存在的相同内容文件
+
+
+def _write_chunk(fp: BinaryIO, chunk: bytes) -> None:
+    fp.write(chunk)
+
+
+def _finalize(tmp_path: Path, target_path: Path) -> bool:
+    """将临时文件移动到目标位置，返回是否去重（目标已存在）
+
+    目标已存在时同样以临时文件覆盖（内容相同，rename 为原子操作），
+    不依赖 exists() 的检查结果：并发的删除可能正在移除该文件，覆盖保证返回时文件存在
+    """
+    deduplicated = target_path.exists()
+    os.replace(tmp_path, target_path)
+    return deduplicated
+
+
+def remove_stored_file(path: Path) -> bool:
+    """删除按内容哈希存储的文件（调用方需先确认没有记录引用该文件），返回是否已删除"""
+    try:
+        path.unlink()
+        return True
+    except FileNotFoundError:
+        return False
+    except OSError as e:
+        logger.warning(f"删除物理文件失败 {path}: {e}")
+        return False
+
+
+async def save_upload_file(
+    upload: UploadFile,
+    dest_dir: Path,
+    suffix: str,
+    max_size: Optional[int] = None,
+    chunk_size: int = UPLOAD_CHUNK_SIZE
+) -> StoredFile:
+    """
+    分块保存上传文件，存储文件名为内容的 SHA-256
+
+    整个文件不会同时读入内存；超过 max_size 时立即中止并删除临时文件。
+
+    Args:
+        upload: 上传文件
+        dest_dir: 存储目录
+        suffix: 文件扩展名（包含点号）
+        max_size: 最大允许大小（字节），None 表示不限制
+        chunk_size: 每次读取的块大小
+
+    Returns:
+        StoredFile: 保存后的文件信息
+
+    Raises:
+        FileTooLargeError: 文件超过大小限制
+    """
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    tmp_path = dest_dir / f".upload-{uuid.uuid4().hex}.part"
+    hasher = hashlib.sha256()
+    size = 0
+
+    try:
+        fp = await run_in_threadpool(open, tmp_path, "wb")
+        try:
+            while True:
+                chunk = await upload.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_size is not None and size > max_size:
+                    raise FileTooLargeError(max_size)
+                hasher.update(chunk)
+                await run_in_threadpool(_write_chunk, fp, chunk)
+        finally:
+            await run_in_threadpool(fp.close)
+
+        content_hash = hasher.hexdigest()
+        target_path = dest_dir / f"{content_hash}{suffix}"
+        deduplicated = await run_in_threadpool(_finalize, tmp_path, target_path)
+        return StoredFile(target_path, size, content_hash, deduplicated)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
@@ -0,0 +1,151 @@
+"""
+图片处理工具
+上传时对需求文档图片做一次性规范化（缩放到最大边长、重新压缩、按内容哈希去重），
+并估算多模态调用中图片占用的 token 数
+"""
+import hashlib
+import io
+import logging
+import math
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+# 重新压缩时保持原格式的图片类型，其余格式统一转换
+LOSSLESS_FORMATS = {"png", "gif"}
+
+# 多模态接口可直接识别的图片格式
+SUPPORTED_FORMATS = {"png", "jpg", "gif", "webp"}
+
+
+@lru_cache(maxsize=None)
+def _pil_image():
+    """返回 PIL.Image 模块，未安装 Pillow 时只记录一次警告并返回 None"""
+    try:
+        from PIL import Image
+    except ImportError:
+        logger.warning("⚠️ 未安装 Pillow，图片不会被缩放和重新压缩，尺寸只能从文件头解析")
+        return None
+    return Image
+
+
+def read_image_size(data: bytes) -> Tuple[Optional[int], Optional[int]]:
+    """只解析图片头获取宽高（不解码像素数据），未安装 Pillow 或图片无法解析时返回 (None, None)"""
+    Image = _pil_image()
+    if Image is None:
+        return None, None
+
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            return img.size
+    except Exception:
+        return None, None
+
+
+def normalize_image_bytes(
+    data: bytes,
+    image_format: str,
+    max_edge: int = 0,
+    quality: int = 85
+) -> Tuple[bytes, str, Optional[int], Optional[int]]:
+    """
+    规范化图片数据：长边超过 max_edge 时等比缩小，并重新压缩
+
+    带透明通道或原本为 PNG/GIF 的图片输出为 PNG，其余输出为 JPEG；
+    未缩放的图片只有在重新压缩后体积变小或原格式不被多模态接口支持时才使用处理结果。
+    未安装 Pillow 或图片无法解析时原样返回。
+
+    Args:
+        data: 原始图片数据
+        image_format: 原始图片格式（扩展名，不含点号）
+        max_edge: 最大边长（像素），0 表示不缩放
+        quality: JPEG 压缩质量
+
+    Returns:
+        tuple[data, format, width, height]: 处理后的数据、格式及尺寸（无法获取时为 None）
+    """
+    Image = _pil_image()
+    if Image is None:
+        return data, image_format, None, None
+
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            img.load()
+            width, height = img.size
+            resized = bool(max_edge) and max(width, height) > max_edge
+
+            has_alpha = img.mode in ("RGBA", "LA", "P") and (
+                img.mode != "P" or "transparency" in img.info
+            )
+            if resized:
+                img.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+
+            output = io.BytesIO()
+            if has_alpha or image_format in LOSSLESS_FORMATS:
+                out_format = "png"
+                img.save(output, format="PNG", optimize=True)
+            else:
+                out_format = "jpg"
+                img.convert("RGB").save(output, format="JPEG", quality=quality, optimize=True)
+            out_data = output.getvalue()
+            out_width, out_height = img.size
+    except Exception:
+        return data, image_format, None, None
+
+    if not resized and image_format in SUPPORTED_FORMATS and len(out_data) >= len(data):
+        # 重新压缩没有收益，保留原图
+        return data, image_format, width, height
+    return out_data, out_format, out_width, out_height
+
+
+def save_normalized_image(
+    data: bytes,
+    image_format: str,
+    output_dir: Path,
+    max_edge: int = 0,
+    quality: int = 85
+) -> Dict[str, Any]:
+    """
+    规范化图片并以内容哈希命名保存，相同内容的图片只保存一份
+
+    Returns:
+        dict: path/format/size/width/height
+    """
+    data, image_format, width, height = normalize_image_bytes(data, image_format, max_edge, quality)
+    content_hash = hashlib.sha256(data).hexdigest()
+    image_path = output_dir / f"{content_hash[:32]}.{image_format}"
+    if not image_path.exists():
+        with open(image_path, "wb") as f:
+            f.write(data)
+
+    return {
+        "path": str(image_path),
+        "format": image_format,
+        "size": len(data),
+        "width": width,
+        "height": height
+    }
+
+
+def estimate_image_tokens(width: Optional[int], height: Optional[int], detail: str = "high") -> int:
+    """
+    估算一张图片在多模态调用中占用的 token 数（按 OpenAI 的分块计费规则）
+
+    low 模式固定 85；high 模式先缩放到 2048 以内、短边缩放到 768，再按 512 像素分块，
+    每块 170 再加 85。尺寸未知时按最大值估算。
+    """
+    base_tokens, tile_tokens = 85, 170
+    if detail == "low":
+        return base_tokens
+    if not width or not height:
+        return base_tokens + tile_tokens * 8
+
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    tiles = math.ceil(width / 512) * math.ceil(height / 512)
+    return base_tokens + tile_tokens * tiles
@@ -0,0 +1,83 @@
+"""
+Excel 表格读取工具
+基于 openpyxl 只读模式逐行读取工作表，直接产出以表头为键的行字典，
+不需要把整个表格加载为 DataFrame
+"""
+from datetime import datetime
+from typing import IO, Any, Dict, Iterator, List, Optional, Sequence, Union
+
+
+class SpreadsheetError(Exception):
+    """表格无法读取或格式不符合要求"""
+
+
+class MissingColumnsError(SpreadsheetError):
+    """表头缺少必要列"""
+
+    def __init__(self, missing: List[str]):
+        self.missing = missing
+        super().__init__(f"文件缺少必要列: {', '.join(missing)}")
+
+
+def cell_to_text(value: Any) -> str:
+    """将单元格值转换为文本，空单元格返回空字符串
+
+    整数值的浮点数（如 ``3.0``）转换为 ``"3"``，日期时间去掉零时分秒。
+    """
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, datetime) and not (value.hour or value.minute or value.second):
+        return value.date().isoformat()
+    return str(value)
+
+
+def iter_sheet_rows(
+    source: Union[str, IO[bytes]],
+    required_columns: Sequence[str] = (),
+    sheet_name: Optional[str] = None
+) -> Iterator[Dict[str, Any]]:
+    """逐行读取工作表，产出 ``{表头: 单元格值}`` 字典
+
+    第一行作为表头，必要列只在表头中校验；空单元格的值为 None，完全空白的行会被跳过。
+    工作簿以只读模式打开，内存占用与行数无关。
+
+    Args:
+        source: 文件路径或二进制文件对象
+        required_columns: 必须存在的列名
+        sheet_name: 工作表名称，默认读取第一个工作表
+
+    Yields:
+        以表头为键的行字典（不含无表头的列）
+
+    Raises:
+        MissingColumnsError: 表头缺少必要列
+        SpreadsheetError: 文件不是有效的 xlsx 工作簿
+    """
+    # openpyxl 导入较慢，只在读取表格时加载（启动预热会提前导入）
+    from openpyxl import load_workbook
+
+    try:
+        workbook = load_workbook(source, read_only=True, data_only=True)
+    except Exception as e:
+        raise SpreadsheetError(f"无法读取 Excel 文件: {e}") from e
+
+    try:
+        worksheet = workbook[sheet_name] if sheet_name else workbook.worksheets[0]
+        rows = worksheet.iter_rows(values_only=True)
+
+        header_row = next(rows, None) or ()
+        headers = [str(h).strip() if h is not None else None for h in header_row]
+        missing = [col for col in required_columns if col not in headers]
+        if missing:
+            raise MissingColumnsError(missing)
+
+        columns = [(index, name) for index, name in enumerate(headers) if name]
+        for row in rows:
+            if not any(value is not None and value != "" for value in row):
+                continue
+            width = len(row)
+            yield {name: row[index] if index < width else None for index, name in columns}
+    finally:
+        workbook.close()
@@ -0,0 +1,139 @@
+"""
+Excel 导入读取基准测试
+
+生成指定行数的导入文件，对比 pandas（read_excel + iterrows）与
+openpyxl 只读流式读取两种方式解析导入数据的耗时与峰值内存。
+
+用法（在 backend 目录下）：
+    python -m benchmarks.excel_import_rows --rows 20000
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Excel 导入读取基准测试")
+    parser.add_argument("--rows", type=int, default=20000, help="导入文件的数据行数")
+    parser.add_argument("--repeat", type=int, default=3, help="每种方式重复次数（取最快一次）")
+    return parser.parse_args()
+
+
+def build_workbook(path: str, rows: int) -> None:
+    from openpyxl import Workbook
+
+    from app.api.project_test_cases import IMPORT_TEMPLATE_HEADERS
+
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet("导入模板")
+    worksheet.append(IMPORT_TEMPLATE_HEADERS)
+    for i in range(rows):
+        worksheet.append([
+            f"模块{i % 50}",
+            f"用例{i}",
+            "用户已登录" if i % 3 else None,
+            "1. 打开页面\n2. 输入数据\n3. 点击提交",
+            "1. 页面打开\n2. 输入成功\n3. 提交成功",
+            "高中低"[i % 3],
+            "等价类划分",
+            "功能测试",
+        ])
+    workbook.save(path)
+
+
+def read_with_pandas(path: str) -> list:
+    """导入接口原有的 pandas 解析方式"""
+    import pandas as pd
+
+    df = pd.read_excel(path)
+    imported_data = []
+    for _, row in df.iterrows():
+        title = str(row.get("用例标题", "")).strip()
+        if not title or title == "nan":
+            continue
+        path_name = str(row.get("所属模块", "未分类")).strip()
+        if path_name == "nan":
+            path_name = "未分类"
+        imported_data.append({
+            "path": path_name,
+            "title": title,
+            "preconditions": str(row.get("前置条件", "")) if str(row.get("前置条件", "")) != "nan" else "",
+            "steps_raw": str(row.get("测试步骤", "")),
+            "expected_raw": str(row.get("预期结果", "")),
+            "priority": str(row.get("优先级(高/中/低)", "中")).strip(),
+            "design_method": str(row.get("设计方法", "")) if str(row.get("设计方法", "")) != "nan" else "",
+            "test_category": str(row.get("测试分类", "")) if str(row.get("测试分类", "")) != "nan" else ""
+        })
+    return imported_data
+
+
+def read_with_reader(path: str) -> list:
+    """openpyxl 只读流式读取"""
+    from app.api.project_test_cases import read_excel_import_rows
+
+    return read_excel_import_rows(path)
+
+
+def measure(fn, path: str, repeat: int) -> dict:
+    best = None
+    rows = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        rows = len(fn(path))
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    fn(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"rows": rows, "elapsed": best, "peak_mb": peak / 1024 / 1024}
+
+
+def measure_import_time(module: str) -> float:
+    """在新进程中测量导入模块的耗时（秒）"""
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return float(output.stdout.strip())
+
+
+def print_result(name: str, result: dict) -> None:
+    print(f"\n📊 {name}")
+    print(f"   解析 {result['rows']} 行: {result['elapsed']:.2f}s（{result['rows'] / result['elapsed']:.0f} 行/秒）")
+    print(f"   峰值内存: {result['peak_mb']:.1f}MB")
+
+
+def main():
+    args = parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix="excel-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}"
+    path = os.path.join(tmp_dir, "import.xlsx")
+
+    build_workbook(path, args.rows)
+    print(f"📄 导入文件: {path}（{os.path.getsize(path) / 1024 / 1024:.1f}MB，{args.rows} 行）")
+
+    reader_result = measure(read_with_reader, path, args.repeat)
+    print_result("openpyxl 只读流式读取", reader_result)
+    print(f"   openpyxl 导入耗时: {measure_import_time('openpyxl') * 1000:.0f}ms")
+
+    try:
+        import pandas  # noqa: F401
+    except ImportError:
+        print("\n⚠️ 未安装 pandas，跳过对比")
+        return
+
+    pandas_result = measure(read_with_pandas, path, args.repeat)
+    print_result("pandas read_excel + iterrows", pandas_result)
+    print(f"   pandas 导入耗时: {measure_import_time('pandas') * 1000:.0f}ms")
+    print(f"\n🚀 加速比: {pandas_result['elapsed'] / reader_result['elapsed']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""
+生成流水线端到端基准测试
+
+在进程内启动离线模拟 LLM 服务（benchmarks.mock_llm_server），使用临时数据库，
+按不同的需求文档规模和并发数运行完整生成流水线（需求点 → 测试点 → 测试用例 → 优化），
+统计总耗时、LLM 并发槽位利用率、数据库写入耗时和关键路径上的耗时分布。
+
+结果可保存为 JSON，之后以 --baseline 对比，用于评估每次流水线性能改动的效果。
+
+用法（在 backend 目录下）：
+    python -m benchmarks.generation_pipeline --sizes 5,20 --concurrency 1,3,8
+    python -m benchmarks.generation_pipeline --output before.json
+    python -m benchmarks.generation_pipeline --baseline before.json --ttft 0.2 --tokens-per-sec 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.mock_llm_server import MockLLMServer, add_config_arguments, config_from_args
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="生成流水线端到端基准测试")
+    parser.add_argument("--sizes", default="5,20", help="需求文档的章节数（逗号分隔），每个章节生成一个需求点")
+    parser.add_argument("--concurrency", default="1,3,8", help="最大并发数（逗号分隔，1-10）")
+    parser.add_argument("--retry-delay", type=float, default=0.2, help="重试退避的基数（秒）")
+    parser.add_argument("--output", help="结果保存路径（JSON）")
+    parser.add_argument("--baseline", help="对比的基线结果（JSON）")
+    add_config_arguments(parser)
+    return parser.parse_args()
+
+
+def build_document(sections: int) -> str:
+    parts = []
+    for i in range(sections):
+        parts.append(
+            f"## 需求 {i + 1}：记录查询与导出\n"
+            f"用户可以按时间范围、状态和关键字组合查询记录，结果分页展示，每页 20 条，支持按创建时间排序。"
+            f"查询结果可以导出为 Excel，单次导出不超过 10000 条。"
+        )
+    return "\n\n".join(parts)
+
+
+def setup_data(base_url: str) -> dict:
+    """创建基准测试使用的用户、模型、智能体、项目、模块和需求文件"""
+    from app.database import SessionLocal
+    from app.models.ai_config import Agent, AgentType, AIModel
+    from app.models.module import Module
+    from app.models.project import Project
+    from app.models.requirement import RequirementFile
+    from app.models.user import User
+    from app.prompts import (
+        REQUIREMENT_SPLITTER_SYSTEM,
+        TEST_POINT_GENERATOR_SYSTEM,
+        TEST_CASE_DESIGNER_SYSTEM,
+        TEST_CASE_OPTIMIZER_SYSTEM,
+    )
+    from app.services.settings_service import SettingsService
+
+    db = SessionLocal()
+    try:
+        SettingsService.initialize_defaults(db)
+        user = User(username="bench", email="bench@example.com", password_hash="x")
+        db.add(user)
+        db.flush()
+        model = AIModel(name="mock", provider="openai", model_id="mock-llm", api_key="mock",
+                        base_url=base_url, created_by=user.id)
+        db.add(model)
+        db.flush()
+        agent_ids = {}
+        for key, agent_type, prompt in (
+            ("requirement", AgentType.REQUIREMENT_SPLITTER, REQUIREMENT_SPLITTER_SYSTEM),
+            ("test_point", AgentType.TEST_POINT_GENERATOR, TEST_POINT_GENERATOR_SYSTEM),
+            ("test_case", AgentType.TEST_CASE_DESIGNER, TEST_CASE_DESIGNER_SYSTEM),
+            ("optimizer", AgentType.TEST_CASE_OPTIMIZER, TEST_CASE_OPTIMIZER_SYSTEM),
+        ):
+            agent = Agent(name=f"bench-{key}", type=agent_type, ai_model_id=model.id, system_prompt=prompt,
+                          temperature=0.1, max_tokens=4000, created_by=user.id)
+            db.add(agent)
+            db.flush()
+            agent_ids[key] = agent.id
+        project = Project(name="bench", owner_id=user.id)
+        db.add(project)
+        db.flush()
+        module = Module(project_id=project.id, name="bench")
+        db.add(module)
+        db.flush()
+        requirement_file = RequirementFile(project_id=project.id, module_id=module.id, filename="bench.docx",
+                                           file_path="bench.docx", file_size=0, file_type="docx",
+                                           uploaded_by=user.id)
+        db.add(requirement_file)
+        db.commit()
+        return {"user_id": user.id, "module_id": module.id, "file_id": requirement_file.id, "agent_ids": agent_ids}
+    finally:
+        db.close()
+
+
+def set_concurrency(concurrency: int) -> None:
+    from app.database import SessionLocal
+    from app.services.settings_service import SettingsService
+
+    db = SessionLocal()
+    try:
+        config = SettingsService.get_concurrency_config(db)
+        SettingsService.update_concurrency_config(db, config.model_copy(update={"max_concurrent_tasks": concurrency}))
+    finally:
+        db.close()
+
+
+async def run_scenario(server: MockLLMServer, data: dict, sections: int, concurrency: int) -> dict:
+    from app.core.tracing import build_waterfall, load_trace, start_trace
+    from app.database import SessionLocal
+    from app.services.agent_service_real import AgentServiceReal
+
+    set_concurrency(concurrency)
+    stats = server.stats
+    baseline = {"requests": stats.requests, "busy_seconds": stats.busy_seconds,
+                "errors": stats.errors, "rate_limited": stats.rate_limited, "malformed": stats.malformed}
+    stats.peak_in_flight = 0
+
+    trace_id = f"bench-{sections}-{concurrency}-{int(time.time() * 1000)}"
+    db = SessionLocal()
+    try:
+        service = AgentServiceReal(db=db)
+        started = time.perf_counter()
+        with start_trace(trace_id, "benchmark", sections=sections, concurrency=concurrency):
+            result = await service.execute_full_generation_pipeline(
+                requirement_content=build_document(sections),
+                file_id=data["file_id"],
+                module_id=data["module_id"],
+                user_id=data["user_id"],
+                agent_ids=data["agent_ids"],
+            )
+        elapsed = time.perf_counter() - started
+    finally:
+        db.close()
+
+    waterfall = build_waterfall(load_trace(trace_id))
+    span_seconds = {}
+    for span in waterfall["waterfall"]:
+        name = "db" if span["name"].startswith("db.") else span["name"]
+        span_seconds[name] = span_seconds.get(name, 0.0) + span["duration_ms"] / 1000
+
+    busy = stats.busy_seconds - baseline["busy_seconds"]
+    counts = result.get("data", {})
+    return {
+        "sections": sections,
+        "concurrency": concurrency,
+        "success": result.get("success", False),
+        "error": result.get("error"),
+        "elapsed": elapsed,
+        "llm_calls": stats.requests - baseline["requests"],
+        "llm_errors": stats.errors - baseline["errors"],
+        "llm_rate_limited": stats.rate_limited - baseline["rate_limited"],
+        "llm_malformed": stats.malformed - baseline["malformed"],
+        "llm_busy": busy,
+        "llm_peak_in_flight": stats.peak_in_flight,
+        # 并发槽位利用率：模拟服务上各请求耗时之和 / (总耗时 × 并发数)
+        "llm_utilization": busy / (elapsed * concurrency) if elapsed else 0.0,
+        "db_time": span_seconds.get("db", 0.0),
+        "semaphore_wait": span_seconds.get("semaphore_wait", 0.0),
+        "retry_backoff": span_seconds.get("retry_backoff", 0.0),
+        "stages": {name: round(seconds, 3) for name, seconds in span_seconds.items() if name.startswith("stage.")},
+        "critical_path_top": [
+            {"name": item["name"], "seconds": round(item["critical_ms"] / 1000, 3)}
+            for item in waterfall["summary"][:3]
+        ],
+        "requirement_points": counts.get("requirement_points_count", 0),
+        "test_points": counts.get("test_points_count", 0),
+        "test_cases": counts.get("test_cases_count", 0),
+    }
+
+
+def print_result(result: dict, baseline: dict = None) -> None:
+    status = "✅" if result["success"] else f"❌ {result['error']}"
+    print(f"\n📊 文档章节: {result['sections']}，并发: {result['concurrency']} {status}")
+    line = f"   耗时: {result['elapsed']:.2f}s"
+    if baseline:
+        delta = (result["elapsed"] - baseline["elapsed"]) / baseline["elapsed"] * 100 if baseline["elapsed"] else 0.0
+        line += f"（基线 {baseline['elapsed']:.2f}s，{delta:+.1f}%）"
+    print(line)
+    print(f"   产出: 需求点 {result['requirement_points']}，测试点 {result['test_points']}，测试用例 {result['test_cases']}")
+    print(f"   LLM: {result['llm_calls']} 次调用，利用率 {result['llm_utilization'] * 100:.0f}%，"
+          f"峰值并发 {result['llm_peak_in_flight']}，错误 {result['llm_errors']}，"
+          f"429 {result['llm_rate_limited']}，格式错误 {result['llm_malformed']}")
+    print(f"   数据库写入: {result['db_time']:.2f}s，信号量等待: {result['semaphore_wait']:.2f}s，"
+          f"重试退避: {result['retry_backoff']:.2f}s")
+    print("   阶段: " + "，".join(f"{name[6:]} {seconds:.2f}s" for name, seconds in result["stages"].items()))
+    print("   关键路径: " + "，".join(f"{item['name']} {item['seconds']:.2f}s" for item in result["critical_path_top"]))
+
+
+def main():
+    args = parse_args()
+
+    # 使用临时数据库和上传目录，避免污染开发数据
+    tmp_dir = tempfile.mkdtemp(prefix="pipeline-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}"
+    os.environ["UPLOAD_DIR"] = os.path.join(tmp_dir, "uploads")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    from app.core.logger import setup_logging
+    from app.database import create_tables
+    from app.services.agent_service_real import AgentServiceReal
+    import app.models  # noqa: F401  注册所有模型
+
+    setup_logging()
+    create_tables()
+    AgentServiceReal.DEFAULT_RETRY_DELAY = args.retry_delay
+
+    server = MockLLMServer(config_from_args(args)).start()
+    print(f"🤖 模拟 LLM 服务: {server.base_url}（ttft={args.ttft}s，{args.tokens_per_sec:g} token/s）")
+    print(f"🗄️ 临时目录: {tmp_dir}")
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = {(r["sections"], r["concurrency"]): r for r in json.load(f)["results"]}
+
+    try:
+        data = setup_data(server.base_url)
+        results = []
+        for sections in [int(s) for s in args.sizes.split(",")]:
+            for concurrency in [int(c) for c in args.concurrency.split(",")]:
+                result = asyncio.run(run_scenario(server, data, sections, concurrency))
+                print_result(result, baseline.get((sections, concurrency)))
+                results.append(result)
+    finally:
+        server.stop()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 结果已保存: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
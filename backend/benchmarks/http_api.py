@@ -0,0 +1,266 @@
+"""
+HTTP 接口负载与回归基准测试
+
+使用临时数据库，按指定的用例规模生成合成项目（benchmarks.synthetic_data），
+通过进程内客户端调用真实的 FastAPI 应用，统计用例列表、层级树、模块列表、导出和导入等
+接口的 p50 / p95 延迟、每次请求的 SQL 查询数和峰值内存。
+
+结果可保存为 JSON，之后以 --baseline 对比；延迟、查询数或内存超过阈值时列出回退项并以非零状态退出，
+可直接用于 CI。
+
+用法（在 backend 目录下）：
+    python -m benchmarks.http_api --sizes 1000,5000 --output baseline.json
+    python -m benchmarks.http_api --sizes 1000,5000 --baseline baseline.json --max-regression 0.25
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic_data import ProjectShape, create_project
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="HTTP 接口负载与回归基准测试")
+    parser.add_argument("--sizes", default="1000,5000", help="项目的测试用例数（逗号分隔）")
+    parser.add_argument("--iterations", type=int, default=10, help="每个接口的计时请求次数")
+    parser.add_argument("--warmup", type=int, default=2, help="每个接口的预热请求次数")
+    parser.add_argument("--import-rows", type=int, default=500, help="导入接口使用的 Excel 行数")
+    parser.add_argument("--output", help="结果保存路径（JSON）")
+    parser.add_argument("--baseline", help="对比的基线结果（JSON）")
+    parser.add_argument("--max-regression", type=float, default=0.25,
+                        help="p50 / p95 延迟允许的最大增幅（0.25 表示 25%%）")
+    parser.add_argument("--max-memory-regression", type=float, default=0.5, help="峰值内存允许的最大增幅")
+    parser.add_argument("--min-latency-ms", type=float, default=5.0,
+                        help="延迟低于该值的接口不判定延迟回退，避免抖动误报")
+    return parser.parse_args()
+
+
+class QueryCounter:
+    """统计引擎上执行的 SQL 语句数"""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def build_import_workbook(path: str, rows: int) -> None:
+    from openpyxl import Workbook
+
+    from app.api.project_test_cases import IMPORT_TEMPLATE_HEADERS
+
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet("导入模板")
+    worksheet.append(IMPORT_TEMPLATE_HEADERS)
+    for i in range(rows):
+        worksheet.append([
+            f"导入模块{i % 20}",
+            f"导入用例{i}",
+            "用户已登录" if i % 3 else None,
+            "1. 打开页面\n2. 输入数据\n3. 点击提交",
+            "1. 页面打开\n2. 输入成功\n3. 提交成功",
+            "高中低"[i % 3],
+            "等价类划分",
+            "功能测试",
+        ])
+    workbook.save(path)
+
+
+def wait_for_task(client, task_id: str, timeout: float = 300) -> None:
+    """导入行数较多时转为后台任务，轮询到任务结束"""
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        status = client.get(f"/api/agents/tasks/{task_id}/status").json()
+        if status.get("status") in ("completed", "failed", "cancelled"):
+            if status["status"] != "completed":
+                raise RuntimeError(f"任务 {task_id} 未完成: {status}")
+            return
+        time.sleep(0.05)
+    raise TimeoutError(f"任务 {task_id} 超时")
+
+
+def request(client, method: str, url: str, **kwargs) -> None:
+    """发起请求并读完响应体（导出为流式响应）"""
+    response = client.request(method, url, **kwargs)
+    if response.status_code >= 400:
+        raise RuntimeError(f"{method} {url} -> {response.status_code}: {response.text[:200]}")
+    if response.headers.get("content-type", "").startswith("application/json"):
+        body = response.json()
+        if isinstance(body, dict) and body.get("task_id") and body.get("status") == "running":
+            wait_for_task(client, body["task_id"])
+
+
+def measure(call: Callable[[], None], counter: QueryCounter, iterations: int, warmup: int) -> Dict[str, float]:
+    for _ in range(warmup):
+        call()
+
+    durations = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        call()
+        durations.append((time.perf_counter() - started) * 1000)
+
+    # 查询数与峰值内存单独再请求一次统计，不计入延迟
+    counter.count = 0
+    tracemalloc.start()
+    call()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "p50_ms": round(percentile(durations, 50), 2),
+        "p95_ms": round(percentile(durations, 95), 2),
+        "mean_ms": round(statistics.mean(durations), 2),
+        "queries": counter.count,
+        "peak_mb": round(peak / 1024 / 1024, 2),
+    }
+
+
+def build_endpoints(project_id: int, import_project_id: int, import_path: str) -> Dict[str, Callable]:
+    def import_excel(client):
+        with open(import_path, "rb") as f:
+            request(client, "POST", f"/api/projects/{import_project_id}/test-cases/import",
+                    files={"file": ("import.xlsx", f, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")})
+
+    return {
+        "test_cases.hierarchy": lambda c: request(c, "GET", f"/api/projects/{project_id}/test-cases",
+                                                  params={"view_mode": "hierarchy"}),
+        "test_cases.flat": lambda c: request(c, "GET", f"/api/projects/{project_id}/test-cases",
+                                             params={"view_mode": "flat"}),
+        "test_hierarchy": lambda c: request(c, "GET", f"/api/test-data/projects/{project_id}/test-hierarchy"),
+        "modules": lambda c: request(c, "GET", f"/api/projects/{project_id}/modules"),
+        "export.csv": lambda c: request(c, "POST", f"/api/projects/{project_id}/test-cases/export",
+                                        json={"format": "csv"}),
+        "export.excel": lambda c: request(c, "POST", f"/api/projects/{project_id}/test-cases/export",
+                                          json={"format": "excel"}),
+        "import.excel": import_excel,
+    }
+
+
+def seed_project(owner_id: int, total_cases: int) -> Dict[str, int]:
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        result = create_project(db, owner_id, ProjectShape.for_case_count(total_cases))
+        db.commit()
+        return result
+    finally:
+        db.close()
+
+
+def compare(result: Dict, baseline: Dict, args: argparse.Namespace) -> List[str]:
+    """与基线对比，返回回退项说明"""
+    regressions = []
+    for metric in ("p50_ms", "p95_ms"):
+        before, after = baseline[metric], result[metric]
+        if max(before, after) >= args.min_latency_ms and after > before * (1 + args.max_regression):
+            regressions.append(f"{metric} {before:.1f} → {after:.1f}ms（+{(after / before - 1) * 100:.0f}%）")
+    if result["queries"] > baseline["queries"]:
+        regressions.append(f"查询数 {baseline['queries']} → {result['queries']}")
+    before, after = baseline["peak_mb"], result["peak_mb"]
+    if before and after > before * (1 + args.max_memory_regression):
+        regressions.append(f"峰值内存 {before:.1f} → {after:.1f}MB（+{(after / before - 1) * 100:.0f}%）")
+    return regressions
+
+
+def print_result(name: str, result: Dict, baseline: Optional[Dict], regressions: List[str]) -> None:
+    line = (f"   {name:<22} p50 {result['p50_ms']:>8.1f}ms  p95 {result['p95_ms']:>8.1f}ms  "
+            f"查询 {result['queries']:>4}  内存 {result['peak_mb']:>6.1f}MB")
+    if baseline:
+        delta = (result["p50_ms"] / baseline["p50_ms"] - 1) * 100 if baseline["p50_ms"] else 0.0
+        line += f"  （p50 {delta:+.0f}%）"
+    print(line)
+    for regression in regressions:
+        print(f"      ❌ {regression}")
+
+
+def main():
+    args = parse_args()
+
+    # 使用临时数据库和上传目录，避免污染开发数据
+    tmp_dir = tempfile.mkdtemp(prefix="http-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}"
+    os.environ["UPLOAD_DIR"] = os.path.join(tmp_dir, "uploads")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    from fastapi.testclient import TestClient
+
+    from app.database import engine
+    from app.main import app
+    from app.models.user import User, UserRole
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = {(r["size"], r["endpoint"]): r for r in json.load(f)["results"]}
+
+    import_path = os.path.join(tmp_dir, "import.xlsx")
+    build_import_workbook(import_path, args.import_rows)
+    print(f"🗄️ 临时目录: {tmp_dir}")
+
+    counter = QueryCounter(engine)
+    results, failures = [], []
+    with TestClient(app) as client:
+        response = client.post("/api/auth/login", json={"username": "admin", "password": "admin123"})
+        response.raise_for_status()
+        client.headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+
+        from app.database import SessionLocal
+        db = SessionLocal()
+        try:
+            admin_id = db.query(User.id).filter(User.role == UserRole.ADMIN).scalar()
+        finally:
+            db.close()
+
+        for size in [int(s) for s in args.sizes.split(",")]:
+            started = time.perf_counter()
+            seeded = seed_project(admin_id, size)
+            import_project = seed_project(admin_id, 0)
+            print(f"\n📊 用例规模: {seeded['test_cases']}（模块 {seeded['modules']}，"
+                  f"测试点 {seeded['test_points']}，生成耗时 {time.perf_counter() - started:.2f}s）")
+
+            endpoints = build_endpoints(seeded["project_id"], import_project["project_id"], import_path)
+            for name, call in endpoints.items():
+                result = measure(lambda: call(client), counter, args.iterations, args.warmup)
+                result.update({"size": size, "endpoint": name})
+                base = baseline.get((size, name))
+                regressions = compare(result, base, args) if base else []
+                print_result(name, result, base, regressions)
+                results.append(result)
+                failures.extend(f"[{size}] {name}: {r}" for r in regressions)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 结果已保存: {args.output}")
+
+    if failures:
+        print(f"\n❌ 性能回退 {len(failures)} 项（相对基线 {args.baseline}）:")
+        for failure in failures:
+            print(f"   {failure}")
+        sys.exit(1)
+    if baseline:
+        print("\n✅ 未发现性能回退")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+"""
+离线模拟 LLM 服务
+
+提供 OpenAI 兼容的 /v1/chat/completions 流式接口，按系统提示词识别智能体类型，
+返回符合各智能体输出格式的需求点 / 测试点 / 测试用例 / 优化结果。
+可配置响应延迟、首个 token 等待时间、生成速率，以及 5xx、429 和 JSON 格式错误的比例，
+用于在不调用付费模型的情况下测量生成流水线的吞吐。
+
+用法（在 backend 目录下）：
+    python -m benchmarks.mock_llm_server --port 8199 --ttft 0.5 --tokens-per-sec 80
+    # 然后把 AI 模型的 base_url 配置为 http://127.0.0.1:8199/v1
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import socket
+import sys
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+# 每个 token 约等于的字符数，用于把响应切成流式数据块
+CHARS_PER_TOKEN = 4
+
+# 需求文档中一个需求章节的标记，每个章节生成一个需求点
+SECTION_PATTERN = re.compile(r"^#{1,3}\s", re.MULTILINE)
+ID_PATTERN = re.compile(r'"id":\s*(\d+)')
+
+
+@dataclass
+class MockLLMConfig:
+    """模拟服务的行为配置"""
+    latency: float = 0.05  # 返回响应头之前的延迟（秒）
+    ttft: float = 0.5  # 响应头之后到首个内容块的等待（秒）
+    tokens_per_sec: float = 80.0  # 生成速率
+    chunk_tokens: int = 8  # 每个数据块包含的 token 数
+    error_rate: float = 0.0  # 返回 500 的比例
+    rate_limit_rate: float = 0.0  # 返回 429 的比例
+    malformed_rate: float = 0.0  # 返回截断 JSON 的比例
+    points_per_requirement: int = 3  # 每个需求点生成的测试点数
+    seed: Optional[int] = None
+
+
+@dataclass
+class MockLLMStats:
+    """请求统计，busy_seconds 为各请求耗时之和"""
+    requests: int = 0
+    completed: int = 0
+    errors: int = 0
+    rate_limited: int = 0
+    malformed: int = 0
+    in_flight: int = 0
+    peak_in_flight: int = 0
+    busy_seconds: float = 0.0
+    completion_tokens: int = 0
+    by_agent: Dict[str, int] = field(default_factory=dict)
+
+
+def _detect_agent(system_prompt: str) -> str:
+    """根据系统提示词中的输出格式判断智能体类型"""
+    for key, agent in (
+        ('"optimized_cases"', "optimizer"),
+        ('"test_cases"', "test_case"),
+        ('"test_points"', "test_point"),
+        ('"requirement_points"', "requirement"),
+    ):
+        if key in system_prompt:
+            return agent
+    return "unknown"
+
+
+def _message_text(message: Dict[str, Any]) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        return "\n".join(part.get("text", "") for part in content if part.get("type") == "text")
+    return content
+
+
+def _steps() -> List[Dict[str, Any]]:
+    return [
+        {"step": 1, "action": "打开查询页面", "expected": "页面正常打开"},
+        {"step": 2, "action": "输入组合查询条件并点击查询", "expected": "返回匹配的记录"},
+        {"step": 3, "action": "切换到第 2 页", "expected": "分页数据正确"},
+    ]
+
+
+def build_payload(agent: str, user_prompt: str, config: MockLLMConfig) -> Dict[str, Any]:
+    """按智能体类型生成符合输出格式的响应内容"""
+    if agent == "requirement":
+        count = max(1, len(SECTION_PATTERN.findall(user_prompt)))
+        return {"requirement_points": [{
+            "content": f"需求点 {i + 1}：用户可以按条件查询并导出记录，查询结果需分页展示且支持排序",
+            "module": f"模块{i % 5 + 1}",
+            "priority": ("high", "medium", "low")[i % 3],
+            "category": "functional",
+            "order_index": i + 1,
+        } for i in range(count)]}
+    if agent == "test_point":
+        return {"test_points": [{
+            "content": f"测试点 {i + 1}：验证查询条件组合与边界值下的返回结果",
+            "test_type": ("functional", "boundary", "exception")[i % 3],
+            "design_method": ("equivalence_class", "boundary_value", "error_guessing")[i % 3],
+            "priority": ("high", "medium", "low")[i % 3],
+        } for i in range(config.points_per_requirement)]}
+    if agent == "test_case":
+        # 提示词中的测试点 JSON 每项都带有 id，用例与测试点一一对应
+        point_ids = ID_PATTERN.findall(user_prompt) or ["0"]
+        return {"test_cases": [{
+            "test_point_id": int(point_id),
+            "title": f"用例 {i + 1}：按组合条件查询并校验分页结果",
+            "description": "验证查询功能在组合条件下的正确性",
+            "preconditions": "1. 用户已登录\n2. 系统中存在测试数据",
+            "test_steps": _steps(),
+        } for i, point_id in enumerate(point_ids)]}
+    if agent == "optimizer":
+        return {"optimized_cases": [{
+            "id": int(case_id),
+            "title": f"优化后的用例 {case_id}",
+            "description": "补充了前置条件和预期结果的细节",
+            "preconditions": "1. 用户已登录\n2. 系统中存在测试数据",
+            "test_steps": _steps(),
+            "test_data": "关键字=测试；状态=已完成",
+            "priority": "P1",
+            "design_method": "equivalence_class",
+            "test_type": "functional",
+        } for case_id in ID_PATTERN.findall(user_prompt)]}
+    return {"message": "ok"}
+
+
+def create_app(config: MockLLMConfig) -> Starlette:
+    """创建模拟服务应用，统计信息保存在 ``app.state.stats``"""
+    rng = random.Random(config.seed)
+    stats = MockLLMStats()
+
+    async def chat_completions(request: Request):
+        body = await request.json()
+        messages = body.get("messages", [])
+        system_prompt = next((_message_text(m) for m in messages if m.get("role") == "system"), "")
+        user_prompt = "\n".join(_message_text(m) for m in messages if m.get("role") == "user")
+        agent = _detect_agent(system_prompt)
+
+        stats.requests += 1
+        stats.by_agent[agent] = stats.by_agent.get(agent, 0) + 1
+        stats.in_flight += 1
+        stats.peak_in_flight = max(stats.peak_in_flight, stats.in_flight)
+        started = time.perf_counter()
+
+        def finish() -> None:
+            stats.in_flight -= 1
+            stats.busy_seconds += time.perf_counter() - started
+
+        try:
+            await asyncio.sleep(config.latency)
+            roll = rng.random()
+            if roll < config.rate_limit_rate:
+                stats.rate_limited += 1
+                finish()
+                return JSONResponse({"error": {"message": "Rate limit exceeded", "type": "rate_limit_error"}},
+                                    status_code=429, headers={"Retry-After": "1"})
+            if roll < config.rate_limit_rate + config.error_rate:
+                stats.errors += 1
+                finish()
+                return JSONResponse({"error": {"message": "Internal error", "type": "server_error"}}, status_code=500)
+        except BaseException:
+            finish()
+            raise
+
+        content = json.dumps(build_payload(agent, user_prompt, config), ensure_ascii=False)
+        if rng.random() < config.malformed_rate:
+            stats.malformed += 1
+            content = content[: len(content) // 2]
+        include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+        model = body.get("model", "mock")
+
+        async def stream():
+            try:
+                await asyncio.sleep(config.ttft)
+                chunk_chars = max(1, config.chunk_tokens * CHARS_PER_TOKEN)
+                delay = config.chunk_tokens / config.tokens_per_sec if config.tokens_per_sec > 0 else 0
+                for offset in range(0, len(content), chunk_chars):
+                    if offset and delay:
+                        await asyncio.sleep(delay)
+                    chunk = {"model": model, "choices": [{"index": 0, "delta": {"content": content[offset:offset + chunk_chars]}}]}
+                    yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+                completion_tokens = len(content) // CHARS_PER_TOKEN + 1
+                stats.completion_tokens += completion_tokens
+                if include_usage:
+                    usage = {"prompt_tokens": len(user_prompt) // CHARS_PER_TOKEN + 1, "completion_tokens": completion_tokens}
+                    yield f"data: {json.dumps({'model': model, 'choices': [], 'usage': usage})}\n\n"
+                yield "data: [DONE]\n\n"
+                stats.completed += 1
+            finally:
+                finish()
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    async def get_stats(request: Request):
+        return JSONResponse(asdict(stats))
+
+    async def reset_stats(request: Request):
+        in_flight = stats.in_flight
+        for name, value in asdict(MockLLMStats()).items():
+            setattr(stats, name, value)
+        stats.in_flight = in_flight
+        return JSONResponse({"ok": True})
+
+    app = Starlette(routes=[
+        Route("/v1/chat/completions", chat_completions, methods=["POST"]),
+        Route("/stats", get_stats, methods=["GET"]),
+        Route("/stats/reset", reset_stats, methods=["POST"]),
+    ])
+    app.state.stats = stats
+    return app
+
+
+class MockLLMServer:
+    """在后台线程中运行模拟服务，供基准测试在同一进程内使用"""
+
+    def __init__(self, config: MockLLMConfig, host: str = "127.0.0.1", port: int = 0):
+        self.config = config
+        self.host = host
+        self.port = port or _free_port(host)
+        self.app = create_app(config)
+        self._server = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
+
+    @property
+    def stats(self) -> MockLLMStats:
+        return self.app.state.stats
+
+    def start(self) -> "MockLLMServer":
+        import uvicorn
+
+        self._server = uvicorn.Server(uvicorn.Config(
+            self.app, host=self.host, port=self.port, log_level="warning", access_log=False
+        ))
+        self._thread = threading.Thread(target=self._server.run, name="mock-llm", daemon=True)
+        self._thread.start()
+        deadline = time.monotonic() + 10
+        while not self._server.started:
+            if time.monotonic() > deadline:
+                raise RuntimeError("模拟 LLM 服务启动超时")
+            time.sleep(0.01)
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.should_exit = True
+            self._thread.join(timeout=5)
+
+
+def _free_port(host: str) -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+def add_config_arguments(parser: argparse.ArgumentParser) -> None:
+    """添加模拟服务的行为参数（基准测试脚本共用）"""
+    defaults = MockLLMConfig()
+    parser.add_argument("--latency", type=float, default=defaults.latency, help="返回响应头之前的延迟（秒）")
+    parser.add_argument("--ttft", type=float, default=defaults.ttft, help="首个内容块的等待时间（秒）")
+    parser.add_argument("--tokens-per-sec", type=float, default=defaults.tokens_per_sec, help="生成速率（token/秒），0 表示不限速")
+    parser.add_argument("--chunk-tokens", type=int, default=defaults.chunk_tokens, help="每个数据块的 token 数")
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate, help="返回 500 的比例")
+    parser.add_argument("--rate-limit-rate", type=float, default=defaults.rate_limit_rate, help="返回 429 的比例")
+    parser.add_argument("--malformed-rate", type=float, default=defaults.malformed_rate, help="返回截断 JSON 的比例")
+    parser.add_argument("--points-per-requirement", type=int, default=defaults.points_per_requirement, help="每个需求点的测试点数")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+
+
+def config_from_args(args: argparse.Namespace) -> MockLLMConfig:
+    return MockLLMConfig(
+        latency=args.latency,
+        ttft=args.ttft,
+        tokens_per_sec=args.tokens_per_sec,
+        chunk_tokens=args.chunk_tokens,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        malformed_rate=args.malformed_rate,
+        points_per_requirement=args.points_per_requirement,
+        seed=args.seed,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线模拟 LLM 服务")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=8199, help="监听端口")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    print(f"🤖 模拟 LLM 服务: http://{args.host}:{args.port}/v1（统计信息: /stats）")
+    uvicorn.run(create_app(config_from_args(args)), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
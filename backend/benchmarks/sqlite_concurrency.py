@@ -0,0 +1,153 @@
+"""
+SQLite 并发基准测试
+
+模拟多个后台流水线批量写入测试用例，同时多个读者轮询任务/列表页面，
+对比「直接写入」与「单写线程队列」两种模式下的读延迟与锁冲突次数。
+
+用法（在 backend 目录下）：
+    python -m benchmarks.sqlite_concurrency --writers 4 --readers 8 --batches 50
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="SQLite 并发基准测试")
+    parser.add_argument("--writers", type=int, default=4, help="并发写者数量")
+    parser.add_argument("--readers", type=int, default=8, help="并发读者数量")
+    parser.add_argument("--batches", type=int, default=30, help="每个写者提交的批次数")
+    parser.add_argument("--batch-size", type=int, default=20, help="每批写入的行数")
+    parser.add_argument("--ai-latency", type=float, default=0.01, help="批次之间模拟的 AI 调用耗时（秒）")
+    parser.add_argument("--mode", choices=["direct", "queue", "both"], default="both", help="写入模式")
+    return parser.parse_args()
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run_scenario(args: argparse.Namespace, use_queue: bool) -> dict:
+    from sqlalchemy import func
+    from sqlalchemy.exc import OperationalError
+
+    from app.database import SessionLocal, DatabaseWriteQueue
+    from app.models import User, Project, Module, TestCase
+
+    queue = DatabaseWriteQueue(SessionLocal, enabled=use_queue)
+    stats = {"read_latencies": [], "write_latencies": [], "locked_errors": 0, "rows": 0}
+
+    setup_db = SessionLocal()
+    tag = f"{'queue' if use_queue else 'direct'}-{int(time.time() * 1000)}"
+    user = User(username=f"bench-{tag}", email=f"bench-{tag}@example.com", password_hash="x")
+    setup_db.add(user)
+    setup_db.flush()
+    user_id = user.id
+    project = Project(name=f"bench-{tag}", owner_id=user_id)
+    setup_db.add(project)
+    setup_db.flush()
+    modules = []
+    for i in range(args.writers):
+        module = Module(project_id=project.id, name=f"module-{i}")
+        setup_db.add(module)
+        modules.append(module)
+    setup_db.commit()
+    module_ids = [m.id for m in modules]
+    setup_db.close()
+
+    def insert_batch(db, module_id: int, index: int) -> int:
+        for n in range(args.batch_size):
+            db.add(TestCase(module_id=module_id, title=f"case-{index}-{n}", description="bench", created_by=user_id))
+        return args.batch_size
+
+    async def writer(module_id: int):
+        for index in range(args.batches):
+            await asyncio.sleep(args.ai_latency)
+            started = time.perf_counter()
+            try:
+                inserted = await queue.run(insert_batch, module_id, index)
+                stats["rows"] += inserted
+            except OperationalError:
+                stats["locked_errors"] += 1
+            stats["write_latencies"].append(time.perf_counter() - started)
+
+    stop = asyncio.Event()
+
+    async def reader():
+        while not stop.is_set():
+            started = time.perf_counter()
+            db = SessionLocal()
+            try:
+                db.query(func.count(TestCase.id)).filter(TestCase.module_id.in_(module_ids)).scalar()
+                db.query(TestCase).filter(TestCase.module_id == module_ids[0]).order_by(
+                    TestCase.id.desc()
+                ).limit(20).all()
+            except OperationalError:
+                stats["locked_errors"] += 1
+            finally:
+                db.close()
+            stats["read_latencies"].append(time.perf_counter() - started)
+            await asyncio.sleep(0.005)
+
+    started = time.perf_counter()
+    readers = [asyncio.create_task(reader()) for _ in range(args.readers)]
+    await asyncio.gather(*(writer(module_id) for module_id in module_ids))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await asyncio.gather(*readers)
+    queue.shutdown()
+
+    return {
+        "mode": "queue" if use_queue else "direct",
+        "elapsed": elapsed,
+        "rows": stats["rows"],
+        "rows_per_sec": stats["rows"] / elapsed if elapsed else 0.0,
+        "reads": len(stats["read_latencies"]),
+        "read_p50_ms": percentile(stats["read_latencies"], 50) * 1000,
+        "read_p95_ms": percentile(stats["read_latencies"], 95) * 1000,
+        "write_p95_ms": percentile(stats["write_latencies"], 95) * 1000,
+        "write_mean_ms": statistics.mean(stats["write_latencies"]) * 1000 if stats["write_latencies"] else 0.0,
+        "locked_errors": stats["locked_errors"],
+    }
+
+
+def print_result(result: dict) -> None:
+    print(f"\n📊 模式: {result['mode']}")
+    print(f"   耗时: {result['elapsed']:.2f}s，写入 {result['rows']} 行（{result['rows_per_sec']:.0f} 行/秒）")
+    print(f"   读请求: {result['reads']} 次，p50={result['read_p50_ms']:.2f}ms，p95={result['read_p95_ms']:.2f}ms")
+    print(f"   写批次: 平均 {result['write_mean_ms']:.2f}ms，p95={result['write_p95_ms']:.2f}ms")
+    print(f"   锁冲突: {result['locked_errors']}")
+
+
+def main():
+    args = parse_args()
+
+    # 使用临时数据库，避免污染开发数据
+    tmp_dir = tempfile.mkdtemp(prefix="sqlite-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}"
+
+    from app.database import create_tables, engine
+    import app.models  # noqa: F401  注册所有模型
+
+    create_tables()
+    with engine.connect() as conn:
+        journal_mode = conn.exec_driver_sql("PRAGMA journal_mode").scalar()
+    print(f"🗄️ 临时数据库: {tmp_dir}（journal_mode={journal_mode}）")
+
+    modes = ["direct", "queue"] if args.mode == "both" else [args.mode]
+    for mode in modes:
+        print_result(asyncio.run(run_scenario(args, use_queue=(mode == "queue"))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+应用启动耗时基准测试
+
+在独立的子进程中（避免模块缓存影响）测量：
+1. 导入 app.main 的耗时，并用 ``python -X importtime`` 列出累计耗时最多的模块；
+2. 从进程启动到生命周期初始化完成（可以处理请求）的耗时，取多次的中位数。
+
+超过 --budget-ms 时以非零状态退出，可直接用于 CI。
+
+用法（在 backend 目录下）：
+    python -m benchmarks.startup
+    python -m benchmarks.startup --runs 5 --top 30 --budget-ms 1000
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 子进程：执行应用的 lifespan 启动阶段后立即退出，输出各阶段耗时
+READY_SCRIPT = """
+import asyncio, json, time
+started = time.perf_counter()
+from app.main import app
+from app.core.startup import startup_timer
+imported = time.perf_counter()
+
+async def start():
+    async with app.router.lifespan_context(app):
+        return time.perf_counter()
+
+ready = asyncio.run(start())
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "ready_ms": (ready - started) * 1000,
+    "phases": startup_timer.phases,
+}))
+"""
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="应用启动耗时基准测试")
+    parser.add_argument("--runs", type=int, default=3, help="测量启动耗时的次数")
+    parser.add_argument("--top", type=int, default=25, help="列出累计导入耗时最多的模块数")
+    parser.add_argument("--budget-ms", type=float, default=1000, help="启动耗时预算（毫秒）")
+    return parser.parse_args()
+
+
+def run_python(args: List[str], env: Dict[str, str]) -> subprocess.CompletedProcess:
+    result = subprocess.run([sys.executable, *args], cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"子进程失败: {result.stderr[-2000:]}")
+    return result
+
+
+def import_profile(env: Dict[str, str]) -> List[Tuple[int, int, str]]:
+    """返回 (累计微秒, 自身微秒, 模块名) 列表，按累计耗时降序"""
+    result = run_python(["-X", "importtime", "-c", "import app.main"], env)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((int(cumulative_us), int(self_us), name.rstrip()))
+    return sorted(rows, reverse=True)
+
+
+def main():
+    args = parse_args()
+
+    # 使用临时数据库：首次运行包含建表和初始数据，之后的运行与已初始化的数据库一致
+    tmp_dir = tempfile.mkdtemp(prefix="startup-bench-")
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}",
+        "UPLOAD_DIR": os.path.join(tmp_dir, "uploads"),
+        "LOG_LEVEL": "WARNING",
+        "STARTUP_WARMUP": "false",
+    })
+    print(f"🗄️ 临时目录: {tmp_dir}")
+
+    first = json.loads(run_python(["-c", READY_SCRIPT], env).stdout.strip().splitlines()[-1])
+    print(f"\n🆕 首次启动（建表 + 初始数据）: {first['ready_ms']:.0f}ms")
+
+    runs = [json.loads(run_python(["-c", READY_SCRIPT], env).stdout.strip().splitlines()[-1])
+            for _ in range(args.runs)]
+    import_ms = statistics.median(r["import_ms"] for r in runs)
+    ready_ms = statistics.median(r["ready_ms"] for r in runs)
+    print(f"🚀 已初始化数据库启动（{args.runs} 次中位数）: 导入 {import_ms:.0f}ms，可处理请求 {ready_ms:.0f}ms")
+    for phase in runs[0]["phases"]:
+        print(f"   {phase:<16} {statistics.median(r['phases'][phase] for r in runs):>8.1f}ms")
+
+    rows = import_profile(env)
+    print(f"\n📦 累计导入耗时最多的 {args.top} 个模块:")
+    print(f"   {'累计(ms)':>9} {'自身(ms)':>9}  模块")
+    for cumulative_us, self_us, name in rows[:args.top]:
+        print(f"   {cumulative_us / 1000:>9.1f} {self_us / 1000:>9.1f}  {name}")
+
+    if ready_ms > args.budget_ms:
+        print(f"\n❌ 启动耗时 {ready_ms:.0f}ms 超过预算 {args.budget_ms:.0f}ms")
+        sys.exit(1)
+    print(f"\n✅ 启动耗时在预算 {args.budget_ms:.0f}ms 以内")
+
+
+if __name__ == "__main__":
+    main()
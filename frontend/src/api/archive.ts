@@ -1,4 +1,5 @@
 import api from './index'
+import { runExportJob } from './export'
 
 export interface ProjectArchive {
   id: number
@@ -63,11 +64,8 @@ export const archiveApi = {
     return api.put(`/archives/cases/${caseId}/execution`, data)
   },
 
-  // Export archive
+  // Export archive (generated by a background job, then downloaded)
   exportArchive: (archiveId: number, format: 'xmind' | 'csv'): Promise<Blob> => {
-    return api.post(`/archives/${archiveId}/export`, 
-        { format }, 
-        { responseType: 'blob' }
-    )
+    return runExportJob(() => api.post(`/archives/${archiveId}/export/jobs`, { format }))
   }
 }
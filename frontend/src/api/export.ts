@@ -0,0 +1,64 @@
+/**
+ * 后台导出任务
+ * 导出文件在后台任务中生成，创建任务后轮询任务状态，完成后下载生成的文件
+ */
+import api from './index'
+import { agentApi } from './agent'
+
+export interface ExportResult {
+  cached: boolean
+  key: string
+  filename: string
+  size: number
+  download_url: string
+}
+
+export interface ExportJobResponse extends Partial<ExportResult> {
+  task_id: string
+  status: string
+}
+
+// 轮询任务状态的间隔（毫秒）
+const POLL_INTERVAL = 1000
+
+// 下载导出文件的超时时间（5分钟）
+const DOWNLOAD_TIMEOUT = 300000
+
+const FAILED_STATUSES = ['failed', 'cancelled', 'timeout']
+
+/**
+ * 等待导出任务完成，返回任务结果（数据未变化时创建任务即已完成，直接返回）
+ */
+export async function waitForExportJob(job: ExportJobResponse): Promise<ExportResult> {
+  if (job.status === 'completed') {
+    return job as ExportResult
+  }
+  for (;;) {
+    await new Promise(resolve => setTimeout(resolve, POLL_INTERVAL))
+    const status = await agentApi.getTaskStatus(job.task_id)
+    if (status.status === 'completed') {
+      return status.result as ExportResult
+    }
+    if (FAILED_STATUSES.includes(status.status)) {
+      throw new Error(status.error || '导出失败')
+    }
+  }
+}
+
+/**
+ * 下载导出文件（download_url 为带 /api 前缀的接口路径）
+ */
+export function downloadExportFile(downloadUrl: string): Promise<Blob> {
+  return api.get(downloadUrl.replace(/^\/api/, ''), {
+    responseType: 'blob',
+    timeout: DOWNLOAD_TIMEOUT
+  })
+}
+
+/**
+ * 创建导出任务并等待完成，返回导出文件内容
+ */
+export async function runExportJob(createJob: () => Promise<ExportJobResponse>): Promise<Blob> {
+  const result = await waitForExportJob(await createJob())
+  return downloadExportFile(result.download_url)
+}
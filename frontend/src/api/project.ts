@@ -1,5 +1,6 @@
 import api from './index'
 import type { User } from './auth'
+import { runExportJob } from './export'
 
 // 项目相关接口类型定义
 export interface Project {
@@ -178,12 +179,9 @@ export const projectApi = {
     return api.delete(`/projects/${projectId}/test-cases/${caseId}`)
   },
 
-  // 导出测试用例（支持 excel 和 xmind 格式）
+  // 导出测试用例（支持 excel 和 xmind 格式），在后台任务中生成，完成后下载
   exportTestCases: (projectId: number, ids?: number[], format: string = 'excel'): Promise<Blob> => {
-    return api.post(`/projects/${projectId}/test-cases/export`,
-      { ids, format },
-      { responseType: 'blob' }
-    )
+    return runExportJob(() => api.post(`/projects/${projectId}/test-cases/export/jobs`, { ids, format }))
   },
 
   // 下载导入模板